@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 
 import error
+import hal
+import pca9685
+import recorder
+import telemetry
+import trajectory
 from component import Component
+from trajectory import Trajectory
+
+import collections
 
-import time
-import math
-from adafruit_servokit import ServoKit
 
 class Arm(Component):
     """A class for controlling the arm of the robot."""
 
 
+    # Methods and servo writes whose latencies are profiled.
+    PROFILED = ('executePlan', 'executePrimitives', 'shoulder', 'elbow', 'wrist', 'grabber')
+
     # The minimum angle in the input domain for any angle.
     MIN_ANGLE = 0
 
@@ -44,14 +52,37 @@ class Arm(Component):
     # Angle input domain of the grabber.
     GRABBER_DOM = 90
 
-    # Angle to increment each component by per loop in degrees.
-    ANGLE_INC = 5
+    # Joints of the arm.
+    JOINTS = ('shoulder', 'elbow', 'wrist', 'grabber')
+
+    # Angle domain of each joint in degrees.
+    JOINT_DOMS = {'shoulder': (SHOULDER_MIN_DOM, SHOULDER_MAX_DOM),
+                  'elbow': (ELBOW_MIN_DOM, ELBOW_MAX_DOM),
+                  'wrist': (MIN_ANGLE, MAX_ANGLE),
+                  'grabber': (MIN_ANGLE, GRABBER_DOM)}
+
+    # Maximum velocity of any joint in degrees per second.
+    MAX_VEL = 450
 
-    # Absolute tolerance for difference between desired angle and actual angle of components.
-    ABS_TOL = 1
+    # Maximum acceleration of any joint in degrees per second squared.
+    MAX_ACC = 3000
 
-    # Time between each angle increment.
-    SLEEPY_TIME = 0.01
+    # Number of setpoints per second sent to the servos while moving.
+    STEP_RATE = trajectory.STD_RATE
+
+    # Joint angles of the named motion primitives.
+    PRIMITIVES = {'open': {'grabber': MIN_ANGLE},
+                  'close': {'grabber': GRABBER_DOM},
+                  'retract': {'shoulder': SHOULDER_MIN_DOM, 'elbow': 90},
+                  'stow': {'shoulder': SHOULDER_MIN_DOM, 'elbow': ELBOW_MAX_DOM}}
+
+    # Motion primitives precomputed from their usual start angles.
+    PRECOMPUTED = [('open', {'grabber': GRABBER_INIT_ANGLE}),
+                   ('close', {'grabber': MIN_ANGLE}),
+                   ('stow', {'shoulder': SHOULDER_MIN_DOM, 'elbow': 90})]
+
+    # Maximum number of cached motion primitive trajectories, the least recently used are dropped.
+    MAX_PRIMITIVES = 64
 
 
     def __init__(self, shoulderPin, elbowPin, wristPin, grabberPin):
@@ -70,26 +101,37 @@ class Arm(Component):
         error.checkPCA9685(grabberPin)
 
         self.status = False
-        kit = ServoKit(channels=16)
-        self._shoulder = kit.servo[shoulderPin]
-        self._elbow = kit.servo[elbowPin]
-        self._wrist = kit.servo[wristPin]
-        self._grabber = kit.servo[grabberPin]
+        self._driver = hal.servoDriver()
+        self._servos = {'shoulder': self._driver.servo[shoulderPin],
+                        'elbow': self._driver.servo[elbowPin],
+                        'wrist': self._driver.servo[wristPin],
+                        'grabber': self._driver.servo[grabberPin]}
+
+        # last commanded angles of the joints in the input and actual domains,
+        # None while the servo is off
+        self._inputAngles = dict.fromkeys(self.JOINTS)
+        self._actualAngles = dict.fromkeys(self.JOINTS)
 
         self.pShoulder = None
         self.pElbow = None
         self.pWrist = None
         self.pGrabber = None
 
+        # trajectories by primitive name and start angles, least recently used first
+        self._primitives = collections.OrderedDict()
+        for name, start in self.PRECOMPUTED:
+            self._primitiveTrajectory(name, start)
+
 
     def setup(self):
         """
         Setup the arm in the initial angle for usage.
         """
-        self._shoulder.angle = self.SHOULDER_INIT_ANGLE
-        self._elbow.angle = self.ELBOW_INIT_ANGLE
-        self._wrist.angle = self.WRIST_INIT_ANGLE
-        self._grabber.angle = self.GRABBER_INIT_ANGLE
+        with self._driver.frame():
+            self._command('shoulder', self.SHOULDER_INIT_ANGLE)
+            self._command('elbow', self.ELBOW_INIT_ANGLE)
+            self._command('wrist', self.WRIST_INIT_ANGLE)
+            self._command('grabber', self.GRABBER_INIT_ANGLE)
         self.status = True
 
 
@@ -97,56 +139,189 @@ class Arm(Component):
         """
         Cleanup the arm when stopping usage.
         """
-        self._shoulder.angle = None
-        self._elbow.angle = None
-        self._wrist.angle = None
-        self._grabber.angle = None
+        with self._driver.frame():
+            for joint in self.JOINTS:
+                self._command(joint, None)
         self.status = False
 
 
+    def inputAngles(self):
+        """
+        Get the last commanded input angles of the servos, as written to the
+        board.
+
+        :return: dictionary of joint name to input angle in degrees, or None
+                 while the servo is off
+        """
+        return dict(self._inputAngles)
+
+
+    def resync(self):
+        """
+        Read the servo angles back from the board, replacing the commanded
+        angles, e.g. if the servos were driven by something else or the
+        board was reset. Otherwise the commanded angles are never read back.
+
+        :return: dictionary of joint name to the commanded and read input
+                 angles of the servos whose angles differed
+        """
+        drifted = {}
+        for joint, servo in self._servos.items():
+            inputAngle = servo.angle
+            if not pca9685.sameRegisters(self._inputAngles[joint], inputAngle):
+                drifted[joint] = (self._inputAngles[joint], inputAngle)
+                telemetry.warning(f'arm.{joint}.resynced', commanded=self._inputAngles[joint], read=inputAngle)
+            self._inputAngles[joint] = inputAngle
+            self._actualAngles[joint] = None if inputAngle is None else self._toActual(joint, inputAngle)
+        return drifted
+
+
+    def _toInput(self, joint, angle):
+        """
+        Translate and stretch an actual joint angle to the input angle of its
+        servo.
+
+        :param joint: name of the joint
+        :param angle: actual angle in degrees
+        :return: input angle in degrees
+        """
+        if joint == 'shoulder':
+            return self.MAX_ANGLE * (1 - (angle - self.SHOULDER_MIN_DOM) / (self.SHOULDER_MAX_DOM - self.SHOULDER_MIN_DOM))
+        if joint == 'elbow':
+            return (angle - self.ELBOW_MIN_DOM) * self.MAX_ANGLE / (self.ELBOW_MAX_DOM - self.ELBOW_MIN_DOM)
+        return angle
+
+
+    def _toActual(self, joint, inputAngle):
+        """
+        Translate and stretch the input angle of the servo of a joint to the
+        actual joint angle.
+
+        :param joint: name of the joint
+        :param inputAngle: input angle in degrees
+        :return: actual angle in degrees
+        """
+        if joint == 'shoulder':
+            return (1 - inputAngle / self.MAX_ANGLE) * (self.SHOULDER_MAX_DOM - self.SHOULDER_MIN_DOM) + self.SHOULDER_MIN_DOM
+        if joint == 'elbow':
+            return inputAngle * (self.ELBOW_MAX_DOM - self.ELBOW_MIN_DOM) / self.MAX_ANGLE + self.ELBOW_MIN_DOM
+        return inputAngle
+
+
+    def _command(self, joint, inputAngle, angle=None):
+        """
+        Write the input angle of the servo of a joint and keep it as the
+        commanded angle.
+
+        :param joint: name of the joint
+        :param inputAngle: input angle in degrees, or None to turn off
+        :param angle: actual angle in degrees if known, which the input angle
+                      is translated from otherwise
+        """
+        self._servos[joint].angle = inputAngle
+        if (angle is None) and (inputAngle is not None):
+            angle = self._toActual(joint, inputAngle)
+        self._inputAngles[joint] = inputAngle
+        self._actualAngles[joint] = angle
+
+
     def executePlan(self):
         """
-        Execute planned angles on arm.
+        Execute planned angles on arm. All planned joints move together along
+        a velocity and acceleration limited trajectory and arrive at the same
+        time.
 
         :raise ValueError: if the arm is off
         """
         error.checkComponent(self, 'Arm')
 
-        while not((self.pShoulder is None) and (self.pElbow is None) and (self.pWrist is None) and (self.pGrabber is None)):
+        planned = {'shoulder': self.pShoulder, 'elbow': self.pElbow, 'wrist': self.pWrist, 'grabber': self.pGrabber}
+        goal = {joint: angle for joint, angle in planned.items() if angle is not None}
+        self.pShoulder = None
+        self.pElbow = None
+        self.pWrist = None
+        self.pGrabber = None
 
-            if self.pShoulder is not None:
-                angleDiff = self.pShoulder - self.shoulder
-                change = min(abs(angleDiff), self.ANGLE_INC)*math.copysign(1, angleDiff)
-                self.shoulder = self.shoulder + change
+        if goal:
+            start = self._jointAngles(goal)
+            joints = tuple(goal)
+            path = Trajectory(joints, [start[joint] for joint in joints], [goal[joint] for joint in joints],
+                              self.MAX_VEL, self.MAX_ACC)
+            trajectory.stream([path], self._writeJoints, self.STEP_RATE)
 
-                if math.isclose(self.shoulder, self.pShoulder, abs_tol=self.ABS_TOL):
-                    self.pShoulder = None
 
-            if self.pElbow is not None:
-                angleDiff = self.pElbow - self.elbow
-                change = min(abs(angleDiff), self.ANGLE_INC)*math.copysign(1, angleDiff)
-                self.elbow = self.elbow + change
+    def executePrimitives(self, *names):
+        """
+        Execute named motion primitives one after another without pausing
+        between them.
 
-                if math.isclose(self.elbow, self.pElbow, abs_tol=self.ABS_TOL):
-                    self.pElbow = None
+        :param names: names of motion primitives in PRIMITIVES
+        :raise ValueError: if the arm is off
+        :raise KeyError: if a name is not a motion primitive
+        """
+        error.checkComponent(self, 'Arm')
 
-            if self.pWrist is not None:
-                angleDiff = self.pWrist - self.wrist
-                change = min(abs(angleDiff), self.ANGLE_INC)*math.copysign(1, angleDiff)
-                self.wrist = self.wrist + change
+        angles = self._jointAngles(set().union(*(self.PRIMITIVES[name] for name in names)))
+        paths = []
+        for name in names:
+            paths.append(self._primitiveTrajectory(name, angles))
+            angles.update(self.PRIMITIVES[name])
 
-                if math.isclose(self.wrist, self.pWrist, abs_tol=self.ABS_TOL):
-                    self.pWrist = None
+        trajectory.stream(paths, self._writeJoints, self.STEP_RATE)
 
-            if self.pGrabber is not None:
-                angleDiff = self.pGrabber - self.grabber
-                change = min(abs(angleDiff), self.ANGLE_INC)*math.copysign(1, angleDiff)
-                self.grabber = self.grabber + change
 
-                if math.isclose(self.grabber, self.pGrabber, abs_tol=self.ABS_TOL):
-                    self.pGrabber = None
+    def _primitiveTrajectory(self, name, start):
+        """
+        Get the trajectory of a motion primitive, which is cached by its start
+        angles rounded to a tenth of a degree. Only the MAX_PRIMITIVES most
+        recently used trajectories are kept, as arbitrary start angles would
+        otherwise grow the cache without bound.
 
-            time.sleep(self.SLEEPY_TIME)
+        :param name: name of a motion primitive in PRIMITIVES
+        :param start: dictionary of joint name to start angle in degrees,
+                      including the joints of the motion primitive
+        :return: the trajectory
+        """
+        goal = self.PRIMITIVES[name]
+        joints = tuple(goal)
+        startAngles = tuple(round(start[joint], 1) for joint in joints)
+
+        key = (name, startAngles)
+        if key in self._primitives:
+            self._primitives.move_to_end(key)
+            return self._primitives[key]
+
+        path = Trajectory(joints, startAngles, [goal[joint] for joint in joints], self.MAX_VEL, self.MAX_ACC)
+        self._primitives[key] = path
+        while len(self._primitives) > self.MAX_PRIMITIVES:
+            self._primitives.popitem(last=False)
+        return path
+
+
+    def _jointAngles(self, joints):
+        """
+        Get the current angles of joints, limited to their domains.
+
+        :param joints: names of the joints
+        :return: dictionary of joint name to angle in degrees
+        """
+        angles = {}
+        for joint in joints:
+            minAngle, maxAngle = self.JOINT_DOMS[joint]
+            angles[joint] = min(max(getattr(self, joint), minAngle), maxAngle)
+        return angles
+
+
+    def _writeJoints(self, angles):
+        """
+        Write joint angles to the servos in one frame.
+
+        :param angles: dictionary of joint name to angle in degrees
+        """
+        with self._driver.frame():
+            for joint, angle in angles.items():
+                setattr(self, joint, float(angle))
+        recorder.command('arm', **{joint: float(angle) for joint, angle in angles.items()})
 
 
     def planShoulder(self, angle):
@@ -196,43 +371,41 @@ class Arm(Component):
     @property
     def shoulder(self):
         """
-        Get the shoulder angle. As the actual angle and input angle differ,
-        the value must be translated and stretched.
+        Get the last commanded shoulder angle.
 
-        :return: shoulder angle in degrees
+        :return: shoulder angle in degrees, or None if the servo is off
         """
-        return (1 - self._shoulder.angle / self.MAX_ANGLE) * (self.SHOULDER_MAX_DOM - self.SHOULDER_MIN_DOM) + self.SHOULDER_MIN_DOM
+        return self._actualAngles['shoulder']
 
 
     @property
     def elbow(self):
         """
-        Get the elbow angle. As the actual angle and input angle differ,
-        the value must be translated and stretched.
+        Get the last commanded elbow angle.
 
-        :return: elbow angle in degrees
+        :return: elbow angle in degrees, or None if the servo is off
         """
-        return self._elbow.angle * (self.ELBOW_MAX_DOM - self.ELBOW_MIN_DOM) / self.MAX_ANGLE + self.ELBOW_MIN_DOM
+        return self._actualAngles['elbow']
 
 
     @property
     def wrist(self):
         """
-        Get the wrist angle.
+        Get the last commanded wrist angle.
 
-        :return: wrist angle in degrees
+        :return: wrist angle in degrees, or None if the servo is off
         """
-        return self._wrist.angle
+        return self._actualAngles['wrist']
 
 
     @property
     def grabber(self):
         """
-        Get the grabber angle.
+        Get the last commanded grabber angle.
 
-        :return: grabber angle in degrees
+        :return: grabber angle in degrees, or None if the servo is off
         """
-        return self._grabber.angle
+        return self._actualAngles['grabber']
 
 
     @shoulder.setter
@@ -246,7 +419,7 @@ class Arm(Component):
         """
         error.checkComponent(self, 'Arm')
         error.checkInRange(angle, self.SHOULDER_MIN_DOM, self.SHOULDER_MAX_DOM)
-        self._shoulder.angle = self.MAX_ANGLE * (1 - (angle - self.SHOULDER_MIN_DOM) / (self.SHOULDER_MAX_DOM - self.SHOULDER_MIN_DOM))
+        self._command('shoulder', self._toInput('shoulder', angle), angle)
 
 
     @elbow.setter
@@ -260,7 +433,7 @@ class Arm(Component):
         """
         error.checkComponent(self, 'Arm')
         error.checkInRange(angle, self.ELBOW_MIN_DOM, self.ELBOW_MAX_DOM)
-        self._elbow.angle = (angle - self.ELBOW_MIN_DOM) * self.MAX_ANGLE / (self.ELBOW_MAX_DOM - self.ELBOW_MIN_DOM)
+        self._command('elbow', self._toInput('elbow', angle), angle)
 
 
     @wrist.setter
@@ -272,7 +445,7 @@ class Arm(Component):
         :raise ValueError: if angle is not between 0 and 180, or the arm is off
         """
         error.checkComponent(self, 'Arm')
-        self._wrist.angle = angle
+        self._command('wrist', angle, angle)
 
 
     @grabber.setter
@@ -285,4 +458,4 @@ class Arm(Component):
         """
         error.checkComponent(self, 'Arm')
         error.checkInRange(angle, self.MIN_ANGLE, self.GRABBER_DOM)
-        self._grabber.angle = angle
+        self._command('grabber', angle, angle)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import hal
+import sim
+import telemetry
+import recorder
+import visual_servo
+import pipeline
+import component
+from arm import Arm
+from head import Head
+from ultrasonic import Ultrasonic
+from body import Body
+from motor import Motor
+from robot import Robot
+from entity import Entity
+
+import sys
+import time
+import argparse
+import functools
+
+
+# Phases of Robot.searchPickup which are timed.
+PHASES = ['farFind', 'closeFind', 'pickup']
+
+# Phases which report the time from seeing the block to centring it.
+CENTRED_PHASES = ['farFind', 'closeFind']
+
+# GPIO pins of the left motor (engine, backward, forward) as on the robot.
+LEFT_PINS = (17, 18, 27)
+
+# GPIO pins of the right motor (engine, backward, forward) as on the robot.
+RIGHT_PINS = (4, 14, 15)
+
+# GPIO pins of the ultrasonic sensor (trigger, echo) as on the robot.
+ULTRA_PINS = (11, 8)
+
+# PCA9685 channel of the head as on the robot.
+VIEW_CHANNEL = 11
+
+# PCA9685 channels of the arm (shoulder, elbow, wrist, grabber) as on the robot.
+ARM_CHANNELS = (12, 13, 14, 15)
+
+
+def timePhases(robot, times):
+    """
+    Record the wall-clock time of each phase called by the robot.
+
+    :param robot: the robot
+    :param times: dictionary which the phase times are appended to
+    """
+    for phase in PHASES:
+        method = getattr(robot.controller, phase)
+
+        @functools.wraps(method)
+        async def timed(*args, method=method, phase=phase, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                times.setdefault(phase, []).append(time.perf_counter() - start)
+
+        setattr(robot.controller, phase, timed)
+
+
+def run(entity, blockDist, blockBearing, roi=False, record=None, track=False, servo=None, pipeline=0):
+    """
+    Run Robot.searchPickup in a simulated scene.
+
+    :param entity: colour of the block
+    :param blockDist: initial distance of the block in metres
+    :param blockBearing: initial bearing of the block in degrees, positive
+                         to the left
+    :param roi: whether the robot searches by window around the last object
+    :param record: path of a log to record the search to, or None
+    :param track: whether the robot tracks the block with a Kalman filter
+    :param servo: gain preset of the visual servo, or None for fixed turns
+    :param pipeline: number of processes segmenting camera frames, or 0
+    :return: whether the block was picked up, the phase times, the total time,
+             the times from seeing the block to centring it per phase and the
+             statistics of the vision pipeline, or None without a pipeline
+    """
+    scene = sim.Scene(entity, blockDist, blockBearing, LEFT_PINS, RIGHT_PINS,
+                      ULTRA_PINS[0], ULTRA_PINS[1], VIEW_CHANNEL, ARM_CHANNELS[3])
+    hal.use(sim.SimBackend(scene))
+
+    body = Body(Body.MAX_MOTOR_DC, Motor(*LEFT_PINS), Motor(*RIGHT_PINS))
+    arm = Arm(*ARM_CHANNELS)
+    head = Head(VIEW_CHANNEL, Ultrasonic(*ULTRA_PINS))
+    robot = Robot(head, body, arm, roi, track=track, servo=servo, pipeline=pipeline)
+
+    times = {}
+    timePhases(robot, times)
+
+    telemetry.clear()
+    robot.setup()
+    if record:
+        recorder.start(record, entity=entity.name, roi=roi, farLevel=robot.farLevel,
+                       closeLevel=robot.closeLevel, track=track, servo=servo,
+                       pipeline=pipeline, phases=PHASES)
+    try:
+        start = time.perf_counter()
+        done = robot.searchPickup(entity)
+        total = time.perf_counter() - start
+        pipelineStats = robot.pipeline.stats() if robot.pipeline is not None else None
+    finally:
+        # stopped after the cleanup, which still records the final commands
+        robot.cleanup()
+        recorder.stop()
+
+    centring = {}
+    for phase in CENTRED_PHASES:
+        centring[phase] = [fields['time'] for timestamp, level, name, fields in telemetry.events(phase + '.centred')]
+    return done, times, total, centring, pipelineStats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time Robot.searchPickup per phase in a simulated scene.')
+    parser.add_argument('--entity', choices=[entity.name for entity in Entity], default=Entity.RED.name)
+    parser.add_argument('--distance', type=float, default=0.6, help='initial block distance in metres')
+    parser.add_argument('--bearing', type=float, default=30, help='initial block bearing in degrees, positive to the left')
+    parser.add_argument('--runs', type=int, default=1, help='number of searches')
+    parser.add_argument('--roi', action='store_true', help='search by window around the last object found')
+    parser.add_argument('--track', action='store_true', help='track the block with a Kalman filter on every frame')
+    parser.add_argument('--servo', choices=list(visual_servo.GAIN_PRESETS),
+                        help='gain preset of the visual servo, instead of fixed turns and head tilts')
+    parser.add_argument('--pipeline', type=int, default=0, metavar='N',
+                        help='segment camera frames in N worker processes')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='profile the latencies of the component methods over all runs into a JSON file')
+    parser.add_argument('--record', help="log file to record each search to, where '{run}' is replaced by the run number")
+    parser.add_argument('--verbose', action='store_true', help='print the telemetry events of the search')
+    args = parser.parse_args()
+
+    if args.verbose:
+        telemetry.setLevel(telemetry.DEBUG)
+        telemetry.setEcho(sys.stdout)
+    else:
+        # the times to centre the block are INFO events
+        telemetry.setLevel(telemetry.INFO)
+    if args.profile:
+        component.setProfiling(True)
+
+    for i in range(args.runs):
+        done, times, total, centring, pipelineStats = run(Entity[args.entity], args.distance, args.bearing,
+                                                          args.roi, args.record and args.record.format(run=i + 1),
+                                                          args.track, args.servo, args.pipeline)
+        print(f'run {i + 1}: picked up {done}, total {total:.3f} s')
+        for phase in PHASES:
+            phaseTimes = times.get(phase, [])
+            print(f'  {phase:<10} {sum(phaseTimes):8.3f} s  ({len(phaseTimes)} calls)')
+        for phase in CENTRED_PHASES:
+            centred = ', '.join(f'{centreTime:.3f} s' for centreTime in centring[phase]) or 'never'
+            print(f'  {phase:<10} centred after {centred}')
+        if pipelineStats is not None:
+            workers = ', '.join(f'{fps:.1f}' for fps in pipelineStats['workerFps'])
+            print(f"  pipeline   captured {pipelineStats['captureFps']:.1f} fps, dropped {pipelineStats['dropFps']:.1f} fps, "
+                  f"segmented {pipelineStats['segmentFps']:.1f} fps ({workers} per worker)")
+            latencies = ', '.join(f"p{p} {pipelineStats[f'latencyP{p}'] or 0:.1f}" for p in pipeline.PERCENTILES)
+            print(f'  pipeline   latency {latencies} ms')
+
+    if args.profile:
+        component.writeProfile(args.profile)
+        print(f'profile written to {args.profile}')
+        for name, stats in component.profile().items():
+            print(f"  {name:<28} {stats['count']:6d} calls  mean {stats['meanMs']:8.3f} ms  "
+                  f"p99 {stats['p99Ms']:8.3f} ms  max {stats['maxMs']:8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
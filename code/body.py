@@ -1,17 +1,74 @@
 # -*- coding: utf-8 -*-
 
 import error
+import telemetry
+import recorder
 from component import Component
+from hal import GPIO
 from motor import Motor
 from direction import Direction
 
 import time
-import RPi.GPIO as GPIO
+import threading
+
+class Motion:
+    """
+    A handle of a motion of the body, which runs until its deadline, its
+    cancellation token is set, it is cancelled or a newer motion supersedes it.
+    """
+
+
+    def __init__(self, body, deadline, token):
+        """
+        Initialise the handle of a started motion.
+
+        :param body: body making the motion
+        :param deadline: monotonic time the motion stops at, or None to run
+                         until cancelled
+        :param token: threading.Event cancelling the motion when set, or None
+        """
+        self.body = body
+        self.deadline = deadline
+        self.token = token
+        self.cancelled = False
+        self.superseded = False
+        self._done = threading.Event()
+
+
+    def done(self):
+        """
+        Check if the motion is over.
+
+        :return: True if the motion is over
+        """
+        return self._done.is_set()
+
+
+    def wait(self, timeout=None):
+        """
+        Wait for the motion to be over.
+
+        :param timeout: maximum number of seconds to wait, or None to wait
+                        for as long as it takes
+        :return: True if the motion is over
+        """
+        return self._done.wait(timeout)
+
+
+    def cancel(self):
+        """
+        Stop the motion if it is still running.
+        """
+        self.body._cancel(self)
+
 
 class Body(Component):
     """A class for controlling the movement of the robot body."""
 
 
+    # Methods whose latencies are profiled.
+    PROFILED = ('move', 'start', 'drive', 'stop')
+
     # The motors' minimum duty cycle.
     MIN_MOTOR_DC = 20
 
@@ -22,6 +79,9 @@ class Body(Component):
     # Used for calculating turning speed.
     STD_RADIUS = 0.6
 
+    # Seconds between checks of the cancellation token of a motion.
+    TOKEN_POLL_TIME = 0.01
+
 
     def __init__(self, dc, leftMotor, rightMotor):
         """
@@ -38,10 +98,15 @@ class Body(Component):
         self.leftMotor = leftMotor
         self.rightMotor = rightMotor
 
+        self._motion = None
+        self._changed = threading.Condition()
+        self._closing = False
+        self._thread = None
+
 
     def setup(self):
         """
-        Setup the motors for movement.
+        Setup the motors for movement and start supervising motions.
         """
         if not self.leftMotor.status:
             self.leftMotor.setup()
@@ -49,58 +114,228 @@ class Body(Component):
         if not self.rightMotor.status:
             self.rightMotor.setup()
 
+        if self._thread is None:
+            self._closing = False
+            self._thread = threading.Thread(target=self._supervise, daemon=True)
+            self._thread.start()
+
 
     def cleanup(self):
         """
-        Cleanup the motors for ending of movement.
+        Stop supervising motions and cleanup the motors for ending of movement.
         """
+        if self._thread is not None:
+            with self._changed:
+                self._closing = True
+                self._changed.notify_all()
+            self._thread.join()
+            self._thread = None
+
+        with self._changed:
+            if self._motion is not None:
+                self._motion._done.set()
+                self._motion = None
+
         self.leftMotor.cleanup()
         self.rightMotor.cleanup()
 
 
     def move(self, duration, direction):
         """
-        Move for a given duration in a given direction.
+        Move for a given duration in a given direction, blocking until the
+        movement is over.
 
         :param duration: number of seconds of movement
         :param direction: direction of movement
         :raise ValueError: if left or right motor is off, or duration is not
                            positive
         """
-        error.checkComponent(self.leftMotor, "Left motor")
-        error.checkComponent(self.rightMotor, "Right motor")
+        self.start(direction, duration).wait()
+
+
+    def start(self, direction, duration=None, token=None):
+        """
+        Start moving in a given direction and return immediately. The movement
+        supersedes the current one.
+
+        :param direction: direction of movement
+        :param duration: number of seconds of movement, or None to move until
+                         stopped or superseded
+        :param token: threading.Event stopping the movement when set, or None
+        :return: Motion handle of the movement
+        :raise ValueError: if left or right motor is off, or duration is not
+                           positive
+        """
         error.checkType(direction, Direction, 'direction', 'Direction')
-        error.checkPositive(duration)
 
         left_dc = self.dc
         right_dc = self.dc
 
-        if direction is Direction.FORWARD:
-            GPIO.output([self.leftMotor.backwardPin, self.rightMotor.backwardPin], GPIO.LOW)
-            GPIO.output([self.leftMotor.forwardPin, self.rightMotor.forwardPin], GPIO.HIGH)
-
-        elif direction is Direction.BACKWARD:
-            GPIO.output([self.leftMotor.forwardPin, self.rightMotor.forwardPin], GPIO.LOW)
-            GPIO.output([self.leftMotor.backwardPin, self.rightMotor.backwardPin], GPIO.HIGH)
+        if direction is Direction.BACKWARD:
+            left_dc, right_dc = -left_dc, -right_dc
 
         elif direction is Direction.LEFT:
-            GPIO.output([self.leftMotor.forwardPin, self.rightMotor.backwardPin], GPIO.LOW)
-            GPIO.output([self.leftMotor.backwardPin, self.rightMotor.forwardPin], GPIO.HIGH)
-            left_dc *= self.STD_RADIUS
+            left_dc *= -self.STD_RADIUS
 
         elif direction is Direction.RIGHT:
-            GPIO.output([self.leftMotor.backwardPin, self.rightMotor.forwardPin], GPIO.LOW)
-            GPIO.output([self.leftMotor.forwardPin, self.rightMotor.backwardPin], GPIO.HIGH)
-            right_dc *= self.STD_RADIUS
+            right_dc *= -self.STD_RADIUS
+
+        return self._command(left_dc, right_dc, duration, token)
+
+
+    def drive(self, linear, angular, duration=None, token=None):
+        """
+        Start moving with given velocities and return immediately. The movement
+        supersedes the current one. Track velocities beyond the duty cycle are
+        scaled down together, keeping the turning radius.
+
+        :param linear: forward velocity (-1-1) relative to the duty cycle,
+                       negative backwards
+        :param angular: anticlockwise turning velocity (-1-1) relative to the
+                        duty cycle, negative clockwise
+        :param duration: number of seconds of movement, or None to move until
+                         stopped or superseded
+        :param token: threading.Event stopping the movement when set, or None
+        :return: Motion handle of the movement
+        :raise ValueError: if left or right motor is off, linear or angular is
+                           out of range, or duration is not positive
+        """
+        error.checkInRange(linear, -1, 1)
+        error.checkInRange(angular, -1, 1)
+
+        left = linear - angular
+        right = linear + angular
+        scale = max(1, abs(left), abs(right))
+
+        return self._command(self._trackDc(left / scale), self._trackDc(right / scale), duration, token)
+
+
+    def stop(self):
+        """
+        Stop the current movement, if any.
+        """
+        with self._changed:
+            if self._motion is not None:
+                self._motion.cancel()
+
+
+    def _trackDc(self, velocity):
+        """
+        Map the velocity of a track to a signed duty cycle, which is at least
+        the minimum duty cycle that turns the motor.
+
+        :param velocity: track velocity (-1-1) relative to the duty cycle
+        :return: duty cycle, negative backwards, or 0 for no movement
+        """
+        if velocity == 0:
+            return 0
+        dc = self.MIN_MOTOR_DC + abs(velocity) * (self.dc - self.MIN_MOTOR_DC)
+        return dc if velocity > 0 else -dc
+
+
+    def _command(self, left_dc, right_dc, duration, token):
+        """
+        Drive the motors with given duty cycles as the current motion.
+
+        :param left_dc: duty cycle of the left motor, negative backwards
+        :param right_dc: duty cycle of the right motor, negative backwards
+        :param duration: number of seconds of movement, or None to move until
+                         stopped or superseded
+        :param token: threading.Event stopping the movement when set, or None
+        :return: Motion handle of the movement
+        :raise ValueError: if left or right motor is off, or duration is not
+                           positive
+        """
+        error.checkComponent(self.leftMotor, "Left motor")
+        error.checkComponent(self.rightMotor, "Right motor")
+        if duration is not None:
+            error.checkPositive(duration)
+
+        deadline = None if duration is None else time.monotonic() + duration
+        motion = Motion(self, deadline, token)
 
         try:
-            self.leftMotor.pwm.start(left_dc)
-            self.rightMotor.pwm.start(right_dc)
+            with self._changed:
+                if self._motion is not None:
+                    self._motion.superseded = True
+                    self._motion._done.set()
+                    telemetry.debug('body.superseded')
 
-            time.sleep(duration)
+                low = []
+                high = []
+                for motor, dc in ((self.leftMotor, left_dc), (self.rightMotor, right_dc)):
+                    if dc > 0:
+                        low.append(motor.backwardPin)
+                        high.append(motor.forwardPin)
+                    elif dc < 0:
+                        low.append(motor.forwardPin)
+                        high.append(motor.backwardPin)
+                    else:
+                        low += [motor.backwardPin, motor.forwardPin]
 
-            self.leftMotor.stop()
-            self.rightMotor.stop()
+                # release the pins before driving the others, as in a reversal
+                GPIO.output(low, GPIO.LOW)
+                if high:
+                    GPIO.output(high, GPIO.HIGH)
+                self.leftMotor.run(abs(left_dc))
+                self.rightMotor.run(abs(right_dc))
+
+                self._motion = motion
+                self._changed.notify_all()
+            recorder.command('body.drive', left=left_dc, right=right_dc, duration=duration)
         except Exception as e:
-            print(e)
+            telemetry.failure('body.move.failed', error=repr(e))
+            motion._done.set()
             self.cleanup()
+
+        return motion
+
+
+    def _cancel(self, motion):
+        """
+        Stop a motion if it is the current one, otherwise only mark it as over.
+
+        :param motion: the motion
+        """
+        with self._changed:
+            if not motion.done():
+                recorder.command('body.stop')
+                motion.cancelled = True
+                if motion is self._motion:
+                    self._halt()
+                motion._done.set()
+
+
+    def _halt(self):
+        """
+        Stop the motors and end the current motion, holding the lock.
+        """
+        self.leftMotor.stop()
+        self.rightMotor.stop()
+        self._motion._done.set()
+        self._motion = None
+        self._changed.notify_all()
+
+
+    def _supervise(self):
+        """
+        Stop the current motion at its deadline or when its cancellation token
+        is set, until closing.
+        """
+        with self._changed:
+            while not self._closing:
+                motion = self._motion
+                if motion is None:
+                    self._changed.wait()
+                    continue
+
+                now = time.monotonic()
+                if ((motion.deadline is not None) and (now >= motion.deadline)) or \
+                   ((motion.token is not None) and motion.token.is_set()):
+                    self._halt()
+                    continue
+
+                timeout = None if motion.deadline is None else motion.deadline - now
+                if motion.token is not None:
+                    timeout = self.TOKEN_POLL_TIME if timeout is None else min(timeout, self.TOKEN_POLL_TIME)
+                self._changed.wait(timeout)
@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+
+import error
+import lazy
+import recorder
+import telemetry
+from component import Component
+
+import io
+import time
+import threading
+from abc import ABC, abstractmethod
+cv2 = lazy.module('cv2')
+np = lazy.module('numpy')
+
+
+# Capture format of raw BGR frames.
+BGR = 'bgr'
+
+# Capture format of raw YUV (I420) frames, which are converted to BGR.
+YUV = 'yuv'
+
+# Capture format of JPEG stills, which are decoded, as a fallback.
+JPEG = 'jpeg'
+
+# Capture formats of the Pi camera.
+CAPTURE_FORMATS = [BGR, YUV, JPEG]
+
+# Width in pixels which the rows of raw frames are padded to a multiple of.
+RAW_WIDTH_ALIGNMENT = 32
+
+# Height in pixels which raw frames are padded to a multiple of.
+RAW_HEIGHT_ALIGNMENT = 16
+
+# Standard number of preallocated raw frames, the one being written, the one being copied out by a CameraService
+# and spares for a late copy.
+STD_POOL_SIZE = 4
+
+
+class FrameSource(ABC):
+    """An abstract class for the sources of camera frames."""
+
+
+    # Whether frames read are views of buffers which later frames overwrite.
+    reusesBuffers = False
+
+
+    @abstractmethod
+    def open(self):
+        """Open the source for capturing."""
+        pass
+
+
+    @abstractmethod
+    def read(self):
+        """
+        Capture the next frame, blocking until it is available.
+
+        :return: BGR image
+        """
+        pass
+
+
+    @abstractmethod
+    def close(self):
+        """Close the source."""
+        pass
+
+
+class RawFrameOutput:
+    """
+    A picamera output copying the raw frames of a recording into a pool of
+    preallocated buffers, which frames are handed out as views of.
+    """
+
+
+    def __init__(self, frameSize, poolSize):
+        """
+        Allocate the pool of buffers.
+
+        :param frameSize: number of bytes of a frame
+        :param poolSize: number of buffers, a frame is overwritten once this
+                         many more frames are captured
+        :raise ValueError: if frameSize or poolSize is not positive
+        """
+        error.checkPositive(frameSize)
+        error.checkPositive(poolSize)
+
+        self.pool = np.empty((poolSize, frameSize), dtype=np.uint8)
+        self.count = 0
+        self._offset = 0
+        self._newFrame = threading.Condition()
+
+
+    def write(self, data):
+        """
+        Copy the data of a frame into the next buffer of the pool. A frame may
+        be written in several parts.
+
+        :param data: bytes-like data of the frame
+        :return: number of bytes written
+        """
+        data = memoryview(data).cast('B')
+        frameSize = self.pool.shape[1]
+        written = 0
+
+        while written < data.nbytes:
+            part = min(data.nbytes - written, frameSize - self._offset)
+            buffer = self.pool[self.count % len(self.pool)]
+            buffer[self._offset:self._offset + part] = np.frombuffer(data, dtype=np.uint8, count=part, offset=written)
+            self._offset += part
+            written += part
+
+            if self._offset == frameSize:
+                self._offset = 0
+                with self._newFrame:
+                    self.count += 1
+                    self._newFrame.notify_all()
+
+        return written
+
+
+    def flush(self):
+        """
+        Nothing to flush, as frames are written into memory.
+        """
+        pass
+
+
+    def next(self, count):
+        """
+        Wait for a frame after the given number of frames.
+
+        :param count: number of frames already handed out
+        :return: the number of frames written and a view of the buffer of the
+                 last one
+        """
+        with self._newFrame:
+            self._newFrame.wait_for(lambda: self.count > count)
+            count = self.count
+        return count, self.pool[(count - 1) % len(self.pool)]
+
+
+class PiCameraSource(FrameSource):
+    """
+    A frame source streaming raw frames from the video port of the Pi camera
+    into preallocated buffers, or JPEG stills as a fallback.
+    """
+
+
+    def __init__(self, width, height, framerate, captureFormat=BGR, poolSize=STD_POOL_SIZE):
+        """
+        Initialise the camera settings.
+
+        :param width: frame width in pixels
+        :param height: frame height in pixels
+        :param framerate: frames per second
+        :param captureFormat: BGR or YUV raw frames, or JPEG stills which are
+                              decoded
+        :param poolSize: number of preallocated frames, a frame handed out is
+                         overwritten once this many more frames are captured
+        :raise ValueError: if width, height, framerate or poolSize is not
+                           positive, or captureFormat is not a capture format
+        """
+        error.checkPositive(width)
+        error.checkPositive(height)
+        error.checkPositive(framerate)
+        error.checkPositive(poolSize)
+        if captureFormat not in CAPTURE_FORMATS:
+            raise ValueError(f'Expected a capture format of {CAPTURE_FORMATS}, but got: {captureFormat}')
+
+        self.width = width
+        self.height = height
+        self.framerate = framerate
+        self.captureFormat = captureFormat
+        self.poolSize = poolSize
+        self.reusesBuffers = captureFormat != JPEG
+        self._camera = None
+
+        # raw frames are padded to whole blocks of the camera
+        self._paddedWidth = -(-width // RAW_WIDTH_ALIGNMENT) * RAW_WIDTH_ALIGNMENT
+        self._paddedHeight = -(-height // RAW_HEIGHT_ALIGNMENT) * RAW_HEIGHT_ALIGNMENT
+
+
+    def open(self):
+        """
+        Start the camera streaming from its video port.
+        """
+        from picamera import PiCamera
+
+        self._camera = PiCamera()
+        self._camera.resolution = (self.width, self.height)
+        self._camera.framerate = self.framerate
+        self._count = 0
+
+        if self.captureFormat == JPEG:
+            self._stream = io.BytesIO()
+            self._frames = self._camera.capture_continuous(self._stream, format=JPEG, use_video_port=True)
+            return
+
+        if self.captureFormat == YUV:
+            # I420 has a full resolution luma plane and quarter resolution chroma planes
+            frameSize = self._paddedWidth * self._paddedHeight * 3 // 2
+            self._converted = np.empty((self.poolSize, self._paddedHeight, self._paddedWidth, 3), dtype=np.uint8)
+        else:
+            frameSize = self._paddedWidth * self._paddedHeight * 3
+        self._output = RawFrameOutput(frameSize, self.poolSize)
+        self._camera.start_recording(self._output, format=self.captureFormat)
+
+
+    def read(self):
+        """
+        Capture the next frame from the video port. Raw frames are views of
+        the preallocated buffers, which are only valid until poolSize - 1
+        more frames are captured, so they must be copied before then.
+
+        :return: BGR image
+        """
+        if self.captureFormat == JPEG:
+            next(self._frames)
+            image = cv2.imdecode(np.frombuffer(self._stream.getbuffer(), dtype=np.uint8), cv2.IMREAD_COLOR)
+            self._stream.seek(0)
+            self._stream.truncate()
+            return image
+
+        self._count, buffer = self._output.next(self._count)
+        if self.captureFormat == YUV:
+            image = self._converted[(self._count - 1) % self.poolSize]
+            cv2.cvtColor(buffer.reshape(self._paddedHeight * 3 // 2, self._paddedWidth),
+                         cv2.COLOR_YUV2BGR_I420, dst=image)
+        else:
+            image = buffer.reshape(self._paddedHeight, self._paddedWidth, 3)
+        return image[:self.height, :self.width]
+
+
+    def close(self):
+        """
+        Stop streaming and release the camera.
+        """
+        if self._camera is not None:
+            if self.captureFormat == JPEG:
+                self._frames.close()
+            else:
+                self._camera.stop_recording()
+            self._camera.close()
+            self._camera = None
+
+
+class FakeFrameSource(FrameSource):
+    """A frame source replaying given frames at a fixed framerate."""
+
+
+    def __init__(self, frames, framerate):
+        """
+        Initialise the fake frames.
+
+        :param frames: list of BGR images which are cycled through, or a
+                       function of the capture time returning a BGR image
+        :param framerate: frames per second
+        :raise ValueError: if framerate is not positive
+        """
+        error.checkPositive(framerate)
+
+        self.frames = frames
+        self.framerate = framerate
+        self._count = 0
+        self._nextTime = None
+
+
+    def open(self):
+        """
+        Restart the fake frames from the first frame.
+        """
+        self._count = 0
+        self._nextTime = time.monotonic()
+
+
+    def read(self):
+        """
+        Wait for the next frame period and return the next fake frame.
+
+        :return: BGR image
+        """
+        delay = self._nextTime - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._nextTime = max(self._nextTime, time.monotonic()) + 1 / self.framerate
+
+        if callable(self.frames):
+            image = self.frames(time.monotonic())
+        else:
+            image = self.frames[self._count % len(self.frames)]
+        self._count += 1
+        return image
+
+
+    def close(self):
+        """
+        Nothing to release for fake frames.
+        """
+        pass
+
+
+class CameraService(Component):
+    """
+    A class owning a frame source, which a background thread captures into
+    a ring buffer of timestamped frames. Frames of a source reusing its
+    buffers are copied into slots of the ring buffer allocated once, so a
+    frame handed out is overwritten once bufferSize more frames are captured.
+    """
+
+
+    # Methods whose latencies are profiled, reading a frame from the source and waiting for one.
+    PROFILED = ('_read', 'nextAfter')
+
+    # Standard number of frames kept in the ring buffer.
+    STD_BUFFER_SIZE = 8
+
+    # Standard number of seconds to wait for a frame.
+    STD_TIMEOUT = 2
+
+    # Seconds to wait for the capture thread to stop, which a source blocked in read never does.
+    STOP_TIMEOUT = 2
+
+
+    def __init__(self, source, bufferSize=STD_BUFFER_SIZE):
+        """
+        Initialise the camera service.
+
+        :param source: frame source to capture from
+        :param bufferSize: number of frames kept in the ring buffer
+        :raise TypeError: if source is not a FrameSource
+        :raise ValueError: if bufferSize is not positive
+        """
+        error.checkType(source, FrameSource, 'source', 'FrameSource')
+        error.checkPositive(bufferSize)
+
+        self.status = False
+        self.source = source
+        self.bufferSize = bufferSize
+
+        self._frames = [None] * bufferSize
+        self._slots = None
+        self._count = 0
+        self._newFrame = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+
+
+    def setup(self):
+        """
+        Open the frame source and start capturing.
+        """
+        self.source.open()
+        self._frames = [None] * self.bufferSize
+        self._count = 0
+        self._error = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._capture, daemon=True)
+        self._thread.start()
+        self.status = True
+
+
+    def cleanup(self):
+        """
+        Stop capturing and close the frame source. A capture thread blocked
+        in the source is abandoned after STOP_TIMEOUT seconds.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.STOP_TIMEOUT)
+            if self._thread.is_alive():
+                telemetry.warning('camera.stuck', timeout=self.STOP_TIMEOUT)
+            self._thread = None
+        self.source.close()
+        self.status = False
+
+
+    def _capture(self):
+        """
+        Capture frames into the ring buffer until stopped or the source
+        fails, whose exception is kept for the consumers.
+        """
+        while not self._stop.is_set():
+            try:
+                image = self._read()
+            except Exception as e:
+                if not self._stop.is_set():
+                    telemetry.failure('camera.failed', error=repr(e))
+                    with self._newFrame:
+                        self._error = e
+                        self._newFrame.notify_all()
+                return
+            timestamp = time.monotonic()
+
+            with self._newFrame:
+                index = self._count % self.bufferSize
+                if self.source.reusesBuffers:
+                    image = self._copyToSlot(index, image)
+                self._frames[index] = (timestamp, image)
+                self._count += 1
+                self._newFrame.notify_all()
+
+
+    def _copyToSlot(self, index, image):
+        """
+        Copy a frame into a slot of the ring buffer, allocating the slots for
+        the first frame and whenever the frame shape changes.
+
+        :param index: index of the slot in the ring buffer
+        :param image: BGR image
+        :return: the slot holding the copy
+        """
+        if (self._slots is None) or (self._slots.shape[1:] != image.shape) or (self._slots.dtype != image.dtype):
+            self._slots = np.empty((self.bufferSize,) + image.shape, dtype=image.dtype)
+        slot = self._slots[index]
+        np.copyto(slot, image)
+        return slot
+
+
+    def _read(self):
+        """
+        Read the next frame from the source.
+
+        :return: BGR image
+        """
+        return self.source.read()
+
+
+    def latest(self):
+        """
+        Get the latest captured frame without waiting. The image is shared
+        with every other consumer, so it must not be modified, and a frame of
+        a source reusing its buffers must be copied to be kept after
+        bufferSize more frames are captured.
+
+        :return: (monotonic capture time, BGR image) or None if no frame
+                 has been captured yet
+        :raise ValueError: if the camera is off
+        :raise RuntimeError: if capturing failed, caused by the exception of
+                             the source
+        """
+        error.checkComponent(self, 'Camera')
+
+        with self._newFrame:
+            self._checkCapture()
+            if self._count == 0:
+                return None
+            frame = self._frames[(self._count - 1) % self.bufferSize]
+
+        recorder.frame(*frame)
+        return frame
+
+
+    def nextAfter(self, timestamp, timeout=STD_TIMEOUT):
+        """
+        Get the earliest buffered frame captured after the given time, waiting
+        for it to be captured if needed. The image is shared with every other
+        consumer, so it must not be modified, and a frame of a source reusing
+        its buffers must be copied to be kept after bufferSize more frames are
+        captured.
+
+        :param timestamp: monotonic time the frame must be captured after
+        :param timeout: maximum number of seconds to wait
+        :return: (monotonic capture time, BGR image)
+        :raise ValueError: if the camera is off
+        :raise TimeoutError: if no frame is captured in time
+        :raise RuntimeError: if capturing failed, caused by the exception of
+                             the source
+        """
+        error.checkComponent(self, 'Camera')
+
+        with self._newFrame:
+            self._newFrame.wait_for(lambda: (self._error is not None) or self._earliestAfter(timestamp), timeout)
+            frame = self._earliestAfter(timestamp)
+            if frame is None:
+                self._checkCapture()
+
+        if frame is None:
+            raise TimeoutError(f'No camera frame captured within {timeout} seconds')
+        recorder.frame(*frame)
+        return frame
+
+
+    def _checkCapture(self):
+        """
+        Check that capturing has not failed, holding the frame lock.
+
+        :raise RuntimeError: if capturing failed, caused by the exception of
+                             the source
+        """
+        if self._error is not None:
+            raise RuntimeError(f'Camera capture failed: {self._error!r}') from self._error
+
+
+    def _earliestAfter(self, timestamp):
+        """
+        Find the earliest buffered frame captured after the given time.
+
+        :param timestamp: monotonic time
+        :return: (monotonic capture time, BGR image) or None
+        """
+        for count in range(max(0, self._count - self.bufferSize), self._count):
+            frame = self._frames[count % self.bufferSize]
+            if frame[0] > timestamp:
+                return frame
+        return None
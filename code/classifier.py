@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import error
+import lazy
+from entity import Entity
+
+np = lazy.module('numpy')
+cv2 = lazy.module('cv2')
+
+
+# Label of pixels which do not belong to any colour class.
+BACKGROUND = 0
+
+# Number of values of each HSV channel (OpenCV hue is halved to 0-179).
+HSV_CHANNEL_SIZES = (180, 256, 256)
+
+# HSV boxes (inclusive minimum and maximum) of each block colour. A colour can
+# have several boxes, e.g. red wraps around the hue circle.
+HSV_RANGES = {
+    Entity.RED: [((0, 100, 20), (10, 255, 255)),
+                 ((169, 100, 20), (179, 255, 255))],
+    Entity.GREEN: [((50, 150, 20), (90, 255, 255))],
+    Entity.BLUE: [((100, 180, 20), (120, 255, 255))],
+}
+
+
+class ColourClassifier:
+    """
+    A lookup table classifier labelling every pixel of an HSV image with the
+    value of its entity in a single pass.
+
+    Each HSV box is given a bit. Per channel lookup tables store the bits of
+    the boxes containing each channel value, so a pixel is in a box if the bit
+    is set in all three tables. A final table maps the combined bits to the
+    entity value, so adding a colour only adds a bit and not a pass.
+    """
+
+
+    def __init__(self, ranges=HSV_RANGES):
+        """
+        Initialise the classifier, whose lookup tables are built on first use.
+
+        :param ranges: dictionary of entity to a list of inclusive
+                       (minimum HSV, maximum HSV) boxes
+        :raise TypeError: if a key is not an Entity
+        :raise ValueError: if a box is outside the HSV domain, or there are
+                           more than 16 boxes
+        """
+        boxes = []
+        for entity, entityBoxes in ranges.items():
+            error.checkType(entity, Entity, 'entity', 'Entity')
+            for (boxMin, boxMax) in entityBoxes:
+                for channel, size in enumerate(HSV_CHANNEL_SIZES):
+                    error.checkInRange(boxMin[channel], 0, boxMax[channel])
+                    error.checkInRange(boxMax[channel], boxMin[channel], size - 1)
+                boxes.append((entity, boxMin, boxMax))
+        error.checkInRange(len(boxes), 1, 16)
+
+        self.entities = list(ranges.keys())
+        self._boxes = boxes
+        self._labelLut = None
+
+
+    def _build(self):
+        """
+        Build the lookup tables, on first use so that creating classifiers
+        does not import numpy.
+        """
+        boxes = self._boxes
+        dtype = np.uint8 if len(boxes) <= 8 else np.uint16
+
+        # Every table has 256 entries so that any uint8 channel value is valid.
+        channelLuts = [np.zeros(256, dtype=dtype) for _ in HSV_CHANNEL_SIZES]
+        labelLut = np.full(np.iinfo(dtype).max + 1, BACKGROUND, dtype=np.uint8)
+
+        for bit, (entity, boxMin, boxMax) in enumerate(boxes):
+            for channel, lut in enumerate(channelLuts):
+                lut[boxMin[channel]:boxMax[channel] + 1] |= 1 << bit
+
+        # Lowest set bit decides the label when boxes overlap.
+        codes = np.arange(labelLut.size)
+        for bit in reversed(range(len(boxes))):
+            labelLut[(codes >> bit) & 1 == 1] = boxes[bit][0].value
+
+        self.dtype = dtype
+        self._channelLuts = channelLuts
+        # OpenCV applies the three channel tables in one pass over the image.
+        self._hsvLut = np.dstack(channelLuts).reshape(1, 256, 3)
+        # set last, as it marks the tables as built
+        self._labelLut = labelLut
+
+
+    def classify(self, hsv):
+        """
+        Label every pixel of an HSV image.
+
+        :param hsv: HSV image (uint8, OpenCV hue range)
+        :return: label image with the entity value of each pixel, or
+                 BACKGROUND if it belongs to no colour
+        """
+        if self._labelLut is None:
+            self._build()
+
+        if self.dtype is np.uint8:
+            hBits, sBits, vBits = cv2.split(cv2.LUT(hsv, self._hsvLut))
+            cv2.bitwise_and(hBits, sBits, dst=hBits)
+            cv2.bitwise_and(hBits, vBits, dst=hBits)
+            return cv2.LUT(hBits, self._labelLut)
+
+        hLut, sLut, vLut = self._channelLuts
+        bits = hLut[hsv[..., 0]]
+        bits &= sLut[hsv[..., 1]]
+        bits &= vLut[hsv[..., 2]]
+        return self._labelLut[bits]
+
+
+def labelMask(labels, entity):
+    """
+    Get the colour mask of an entity from a label image.
+
+    :param labels: label image from a ColourClassifier
+    :param entity: the entity of the mask
+    :return: uint8 mask with 255 where the pixel is labelled as the entity
+    """
+    return (labels == entity.value).view(np.uint8) * np.uint8(255)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+
+# Entry points whose cold start is timed, by the statement run in a fresh interpreter.
+ENTRY_POINTS = {
+    'robot': 'import robot',
+    'experiments': 'import experiments',
+    'benchmark': 'import benchmark',
+    'replay': 'import replay',
+    'microbench': 'import microbench',
+    'scene': 'import scene',
+    'planner': 'import planner',
+    'inverse_kinematics': 'import inverse_kinematics',
+}
+
+# Heavy modules reported as loaded or not after each entry point.
+HEAVY_MODULES = ['numpy', 'cv2', 'asyncio', 'multiprocessing']
+
+# Standard number of fresh interpreters per entry point.
+STD_RUNS = 10
+
+# Standard fraction which the median time may exceed the baseline by.
+STD_TOLERANCE = 0.25
+
+# Script timing a statement in a fresh interpreter and printing the time and the heavy
+# modules it loaded, which lazily loaded modules only count as once used.
+PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - start
+loaded = [name for name in {heavy!r}
+          if (name in sys.modules) and (type(sys.modules[name]).__name__ != '_LazyModule')]
+print(json.dumps([elapsed, loaded]))
+'''
+
+
+def coldStart(statement, runs):
+    """
+    Time a statement in fresh interpreters started in this directory.
+
+    :param statement: Python statement, e.g. 'import robot'
+    :param runs: number of interpreters
+    :return: list of the times in seconds and the heavy modules loaded
+    """
+    probe = PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    loaded = []
+    for i in range(runs):
+        output = subprocess.run([sys.executable, '-c', probe], cwd=directory, capture_output=True, text=True,
+                                check=True).stdout
+        elapsed, loaded = json.loads(output.splitlines()[-1])
+        times.append(elapsed)
+    return times, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the cold start of the entry points in fresh interpreters.')
+    parser.add_argument('--runs', type=int, default=STD_RUNS, help='number of fresh interpreters per entry point')
+    parser.add_argument('--only', nargs='+', choices=list(ENTRY_POINTS), help='names of the entry points to time')
+    parser.add_argument('--baseline', help='JSON file of a baseline to compare against')
+    parser.add_argument('--save', help='JSON file to save the results to, as a baseline for later runs')
+    parser.add_argument('--tolerance', type=float, default=STD_TOLERANCE,
+                        help='fraction which the median time may exceed the baseline by')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"entry point":<20} {"p50 ms":>10} {"min ms":>10}  heavy modules loaded')
+    for name, statement in ENTRY_POINTS.items():
+        if args.only and (name not in args.only):
+            continue
+        try:
+            times, loaded = coldStart(statement, args.runs)
+        except subprocess.CalledProcessError as e:
+            print(f'{name:<20} failed: {e.stderr.strip().splitlines()[-1]}')
+            continue
+
+        results[name] = {'p50': statistics.median(times) * 1000, 'min': min(times) * 1000, 'loaded': loaded}
+        print(f'{name:<20} {results[name]["p50"]:10.1f} {results[name]["min"]:10.1f}  {", ".join(loaded) or "-"}')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        slow = [(name, result['p50'], baseline[name]['p50']) for name, result in results.items()
+                if (name in baseline) and (result['p50'] > baseline[name]['p50'] * (1 + args.tolerance))]
+        for name, time, baseTime in slow:
+            print(f'regression: {name} p50 {time:.1f} ms > baseline {baseTime:.1f} ms')
+        if slow:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,244 @@
 import error
 from abc import ABC, abstractmethod
 
+import json
+import time
+import bisect
+import functools
+import threading
+
+
+# Upper bounds in seconds of the latency histogram buckets, four per decade from 10 us to
+# 10 s, with a last bucket for longer calls.
+HISTOGRAM_BOUNDS = tuple(10 ** (exp / 4) for exp in range(-20, 5))
+
+# Latency percentiles reported in profiles.
+PERCENTILES = [50, 90, 99]
+
+
+# Whether the profiled methods of the components are instrumented.
+_profiling = False
+
+# Latency statistics of each profiled method, by 'Class.method'.
+_stats = {}
+
+# Original attributes of the instrumented methods, by (class, name).
+_originals = {}
+
+
+class LatencyStats:
+    """
+    The call count and latency histogram of a method. Calls are counted into
+    fixed buckets, so recording costs the same however long the robot runs.
+    """
+
+
+    def __init__(self):
+        """
+        Initialise the statistics without calls.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        """
+        Forget the calls recorded so far.
+        """
+        with self._lock:
+            self.count = 0
+            self.total = 0.0
+            self.min = float('inf')
+            self.max = 0.0
+            self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+
+    def add(self, seconds):
+        """
+        Record a call.
+
+        :param seconds: duration of the call in seconds
+        """
+        bucket = bisect.bisect_left(HISTOGRAM_BOUNDS, seconds)
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.min = min(self.min, seconds)
+            self.max = max(self.max, seconds)
+            self.buckets[bucket] += 1
+
+
+    def percentile(self, p):
+        """
+        Get an upper bound of a latency percentile from the histogram.
+
+        :param p: percentile (0-100)
+        :return: upper bound of the bucket of the percentile in seconds, at
+                 most the longest call, or None without calls
+        """
+        if self.count == 0:
+            return None
+
+        rank = p / 100 * self.count
+        cumulative = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS, self.buckets):
+            cumulative += count
+            if (count > 0) and (cumulative >= rank):
+                return min(bound, self.max)
+        return self.max
+
+
+    def snapshot(self):
+        """
+        Get the statistics as JSON-serialisable values.
+
+        :return: dictionary of the call count, the total, mean, minimum and
+                 maximum latency and the percentiles in milliseconds, and the
+                 non-empty buckets as [upper bound in milliseconds or None, count]
+        """
+        with self._lock:
+            snapshot = {'count': self.count,
+                        'totalMs': self.total * 1000,
+                        'meanMs': self.total / self.count * 1000 if self.count else None,
+                        'minMs': self.min * 1000 if self.count else None,
+                        'maxMs': self.max * 1000 if self.count else None}
+            for p in PERCENTILES:
+                latency = self.percentile(p)
+                snapshot[f'p{p}Ms'] = None if latency is None else latency * 1000
+            bounds = [bound * 1000 for bound in HISTOGRAM_BOUNDS] + [None]
+            snapshot['buckets'] = [[bound, count] for bound, count in zip(bounds, self.buckets) if count]
+        return snapshot
+
+
+def _timed(function, stats):
+    """
+    Wrap a function to record the latency of every call.
+
+    :param function: the function
+    :param stats: LatencyStats of the function
+    :return: the wrapped function
+    """
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.add(time.perf_counter() - start)
+
+    return timed
+
+
+def _instrument(cls):
+    """
+    Instrument the profiled methods and property setters which a class
+    defines itself, recording them under the name of the class.
+
+    :param cls: subclass of Component
+    """
+    for name in cls.PROFILED:
+        if (name not in cls.__dict__) or ((cls, name) in _originals):
+            continue
+
+        attribute = cls.__dict__[name]
+        stats = _stats.setdefault(f'{cls.__name__}.{name}', LatencyStats())
+        if isinstance(attribute, property):
+            timed = property(attribute.fget, _timed(attribute.fset, stats), attribute.fdel, attribute.__doc__)
+        else:
+            timed = _timed(attribute, stats)
+
+        _originals[(cls, name)] = attribute
+        setattr(cls, name, timed)
+
+
+def _subclasses(cls):
+    """
+    Get every subclass of a class, however indirect.
+
+    :param cls: the class
+    :return: list of the subclasses
+    """
+    subclasses = []
+    for subclass in cls.__subclasses__():
+        subclasses.append(subclass)
+        subclasses.extend(_subclasses(subclass))
+    return subclasses
+
+
+def setProfiling(enabled):
+    """
+    Turn the latency profiling of the components on or off. The profiled
+    methods are only wrapped while profiling, so it costs nothing when off.
+
+    :param enabled: whether to profile
+    """
+    global _profiling
+    _profiling = enabled
+
+    if enabled:
+        for cls in _subclasses(Component):
+            _instrument(cls)
+    else:
+        for (cls, name), attribute in _originals.items():
+            setattr(cls, name, attribute)
+        _originals.clear()
+
+
+def profiling():
+    """
+    Check if the components are profiled.
+
+    :return: True if profiling is on
+    """
+    return _profiling
+
+
+def resetProfile():
+    """
+    Forget the calls profiled so far.
+    """
+    for stats in _stats.values():
+        stats.reset()
+
+
+def profile():
+    """
+    Get a snapshot of the latencies of the profiled methods called so far.
+
+    :return: dictionary of 'Class.method' to the LatencyStats snapshot
+    """
+    return {name: stats.snapshot() for name, stats in sorted(_stats.items()) if stats.count}
+
+
+def writeProfile(path):
+    """
+    Write a snapshot of the profile to a JSON file.
+
+    :param path: path of the file
+    """
+    with open(path, 'w') as file:
+        json.dump({'histogramBoundsMs': [bound * 1000 for bound in HISTOGRAM_BOUNDS],
+                   'methods': profile()}, file, indent=2)
+
+
 class Component(ABC):
-    """An abstract class for the hardware components of the robot."""
+    """
+    An abstract class for the hardware components of the robot. Subclasses
+    name the methods and property setters to profile in PROFILED.
+    """
+
+
+    # Names of the methods and property setters whose latencies are profiled.
+    PROFILED = ()
+
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Instrument the profiled methods of a subclass defined while profiling.
+        """
+        super().__init_subclass__(**kwargs)
+        if _profiling:
+            _instrument(cls)
 
 
     @abstractmethod
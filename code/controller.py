@@ -0,0 +1,521 @@
+# -*- coding: utf-8 -*-
+
+import error
+import lazy
+import telemetry
+from arm import Arm
+from head import Head
+from entity import Entity
+from direction import Direction
+from visual_servo import Pid
+
+import math
+import time
+
+ik = lazy.module('inverse_kinematics')
+asyncio = lazy.module('asyncio')
+tracker = lazy.module('tracker')
+
+
+async def inThread(func, *args):
+    """
+    Run a blocking function in the default executor of the running loop, as
+    asyncio.to_thread does from Python 3.9 on.
+
+    :param func: the blocking function
+    :param args: arguments of the function
+    :return: result of the function
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+class AsyncRobot:
+    """
+    An asyncio controller of the robot. Camera frames, ultrasonic distances,
+    the end of motions and the settling of servos are awaited, so each step
+    continues as soon as what it needs holds instead of after a fixed period.
+    """
+
+
+    # Seconds a servo takes to turn a degree (0.1 seconds per 60 degrees).
+    SERVO_TIME = 0.1 / 60
+
+    # Seconds a servo takes to settle after turning.
+    SERVO_SETTLE_TIME = 0.02
+
+    # Seconds a camera frame is exposed for, which must start after the robot settled.
+    EXPOSURE_TIME = 1 / Head.FRAMERATE
+
+    # Shift of full resolution images in pixels per degree of body turn or head tilt
+    # (focal length of 628 pixels).
+    PIXELS_PER_DEGREE = 628 * math.pi / 180
+
+    # Degrees per second the body turns left or right at the maximum duty cycle.
+    TURN_RATE = 140
+
+    # Shortest turn of the visual servo in seconds, as shorter ones do not overcome friction.
+    SERVO_MIN_MOVE_TIME = 0.02
+
+
+    def __init__(self, robot):
+        """
+        Initialise the controller of a robot.
+
+        :param robot: the robot, whose components and constants are used
+        """
+        self.robot = robot
+        self.tracker = None
+        self.turnPid = None
+        self.tiltPid = None
+        self._phase = None
+        self._acquired = None
+        self._reported = False
+        self._turn = 0
+        self._tilt = 0
+        self._motion = None
+        self._settleTime = time.monotonic()
+        self._still = None
+        self._frameTime = None
+
+
+    def turnHead(self, angle):
+        """
+        Start turning the head to a view angle.
+
+        :param angle: view angle in degrees
+        :raise ValueError: if the angle is not between 0 to 60, or
+                           the head is off
+        """
+        tilt = angle - self.robot.head.view
+        change = abs(tilt) * Head.VIEW_DOM / Head.VIEW_RNG
+        self.robot.head.view = angle
+        if change > 0:
+            self._still = None
+            self._settleTime = max(self._settleTime,
+                                   time.monotonic() + change * self.SERVO_TIME + self.SERVO_SETTLE_TIME)
+            if self.tracker is not None:
+                self.tracker.tilt(tilt)
+
+
+    def startMove(self, direction, duration):
+        """
+        Start moving the body, superseding the current motion.
+
+        :param direction: direction of movement
+        :param duration: number of seconds of movement
+        :raise ValueError: if left or right motor is off, or duration is not
+                           positive
+        """
+        self._motion = self.robot.body.start(direction, duration)
+        self._still = None
+
+        if self.tracker is not None:
+            rate = self.TURN_RATE * self.robot.body.dc / self.robot.body.MAX_MOTOR_DC
+            rate = {Direction.LEFT: rate, Direction.RIGHT: -rate}.get(direction, 0)
+            now = time.monotonic()
+            self.tracker.turn(rate, now + duration, now)
+
+
+    async def settle(self):
+        """
+        Wait for the current motion to end and the servos to settle.
+
+        :return: monotonic time after which camera frames are exposed while
+                 the robot is still, the same until the robot moves again
+        """
+        if self._motion is not None:
+            await inThread(self._motion.wait)
+            self._motion = None
+
+        delay = self._settleTime - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._still is None:
+            self._still = time.monotonic() + self.EXPOSURE_TIME
+        return self._still
+
+
+    async def track(self, level):
+        """
+        Start tracking the target of a search if the robot tracks targets.
+
+        :param level: image pyramid level the search processes images at
+        """
+        self.tracker = None
+        if self.robot.tracking:
+            self._frameTime = await self.settle()
+            self.tracker = tracker.TargetTracker(self.PIXELS_PER_DEGREE / 2 ** level)
+
+
+    def aim(self, phase):
+        """
+        Start aiming at the object of a search, with the visual servo if the
+        robot has servo gains.
+
+        :param phase: name of the search, which time to centre is reported for
+        """
+        self._phase = phase
+        self._acquired = None
+        self.turnPid = self.tiltPid = None
+        gains = self.robot.servoGains
+        if gains is not None:
+            self.turnPid = Pid(gains['turn'], gains['turnLimit'])
+            self.tiltPid = Pid(gains['tilt'], gains['tiltLimit'])
+
+
+    def steer(self, objProp, geom):
+        """
+        Update the visual servo with the offset of the object from the image
+        centre, and report the time from first seeing the object to centring it.
+
+        :param objProp: dictionary of the object properties, or None if the
+                        object is not in view
+        :param geom: image geometry of the search
+        """
+        now = time.monotonic()
+        if not objProp:
+            self._acquired = None
+            return
+
+        centred = (abs(objProp['x'] - geom['centerX']) <= geom['threshX']) and \
+                  (abs(objProp['y'] - geom['centerY']) <= geom['threshY'])
+        if self._acquired is None:
+            self._acquired = now
+            self._reported = False
+        if centred and not self._reported:
+            telemetry.info(self._phase + '.centred', time=now - self._acquired)
+            self._reported = True
+
+        if self.turnPid is not None:
+            if centred:
+                self.turnPid.reset()
+                self.tiltPid.reset()
+            self._turn = self.turnPid.update((objProp['x'] - geom['centerX']) / geom['centerX'], now)
+            self._tilt = self.tiltPid.update((objProp['y'] - geom['centerY']) / geom['centerY'], now)
+
+
+    def turnTime(self, moveTime):
+        """
+        Get the duration of a turn towards the object.
+
+        :param moveTime: duration of a turn without the visual servo
+        :return: number of seconds, scaled with the offset of the object by
+                 the visual servo
+        """
+        if self.turnPid is None:
+            return moveTime
+        return max(self.SERVO_MIN_MOVE_TIME, abs(self._turn))
+
+
+    def tiltAngle(self, viewDiff):
+        """
+        Get the head tilt towards the object.
+
+        :param viewDiff: tilt without the visual servo in degrees
+        :return: number of degrees, scaled with the offset of the object by the
+                 visual servo
+        """
+        if self.tiltPid is None:
+            return viewDiff
+        return max(1, round(abs(self._tilt)))
+
+
+    async def observe(self, entity, level):
+        """
+        Wait for the next camera frame and find the object of an entity in it.
+        Without tracking, the frame is exposed after the robot settled. With
+        tracking, every frame is used, and the object is predicted to now
+        through missed detections and the commands since the frame.
+
+        :param entity: the entity of the object
+        :param level: image pyramid level the image is processed at
+        :return: dictionary of the object properties in pixels of the level,
+                 or None if there is no object
+        :raise ValueError: if the camera is off
+        :raise TimeoutError: if no frame is captured in time
+        """
+        if self.tracker is None:
+            _, obj = await self.detect(entity, level, await self.settle())
+            return obj
+
+        self._frameTime, obj = await self.detect(entity, level, self._frameTime)
+        self.tracker.update(self._frameTime, obj)
+        return self.tracker.predict(time.monotonic())
+
+
+    async def detect(self, entity, level, after):
+        """
+        Find the object of an entity in the next camera frame captured after a
+        given time, segmented by the vision pipeline of the robot if it has one.
+
+        :param entity: the entity of the object
+        :param level: image pyramid level the image is processed at
+        :param after: monotonic time the frame must be captured after
+        :return: (monotonic capture time, dictionary of the object properties
+                 in pixels of the level or None if there is no object)
+        :raise ValueError: if the camera or the pipeline is off
+        :raise TimeoutError: if no frame is captured in time
+        """
+        pipeline = self.robot.pipeline
+        if pipeline is not None:
+            pipeline.level = level
+            return await inThread(pipeline.nextAfter, after, entity)
+
+        timestamp, image = await self.frame(after)
+        return timestamp, self.robot.findObj(image, entity, level)
+
+
+    async def frame(self, after):
+        """
+        Wait for a camera frame captured after a given time.
+
+        :param after: monotonic time the frame must be captured after
+        :return: (monotonic capture time, BGR image)
+        :raise ValueError: if the camera is off
+        :raise TimeoutError: if no frame is captured in time
+        """
+        return await inThread(self.robot.head.camera.nextAfter, after)
+
+
+    async def objPos(self, since):
+        """
+        Wait for the position of the object in front of the ultrasonic sensor.
+
+        :param since: monotonic time the distances must be measured after
+        :return: the cartesian position of the object in metres relative to
+                 the axis of the shoulder, or None if the sensor has no echoes
+        :raise ValueError: if the ultrasonic sensor is off
+        """
+        return await inThread(self.robot.head.objPos, since)
+
+
+    async def searchPickup(self, entity):
+        """
+        Pickup an object far away from the robot and/or behind it.
+
+        :param entity: the entity to be picked up
+        :return: True if the pick up succeeded, otherwise False
+        """
+        error.checkComponent(self.robot, 'Robot')
+        error.checkType(entity, Entity, 'entity', 'Entity')
+
+        await self.farFind(entity)
+        await self.closeFind(entity)
+        return await self.pickup(entity)
+
+
+    async def pickup(self, entity):
+        """
+        Pick up an object close to the front of the robot.
+
+        :param entity: the entity to be picked up
+        :return: True if the pick up succeeded in time, otherwise False
+        """
+        robot = self.robot
+        error.checkComponent(robot, 'Robot')
+        error.checkType(entity, Entity, 'entity', 'Entity')
+
+        objPos = await self.objPos(await self.settle())
+        angles = None if objPos is None else robot.reachAngles(objPos)
+        if angles:
+            shoulderAngle, elbowAngle = angles
+
+            # open while reaching the object
+            robot.arm.planGrabber(Arm.MIN_ANGLE)
+            robot.arm.planShoulder(shoulderAngle)
+            robot.arm.planElbow(elbowAngle)
+            await inThread(robot.arm.executePlan)
+            await asyncio.sleep(robot.SETTLE_TIME)
+
+            # close
+            await inThread(robot.arm.executePrimitives, 'close')
+            await asyncio.sleep(robot.CLOSE_TIME)
+
+            # lift the object and stow the arm
+            await inThread(robot.arm.executePrimitives, 'retract', 'stow')
+
+            if not await inThread(robot.head.objCamProp, entity):
+                return True
+        return False
+
+
+    async def farFind(self, entity, timeLim=10):
+        """
+        Turn and drive towards a faraway object until it is close.
+
+        :param entity: the entity searched for
+        :param timeLim: number of seconds to search without the object in view
+        :return: True if the object is close, False if it is not found in time
+        """
+        robot = self.robot
+        head = robot.head
+        error.checkComponent(robot, 'Robot')
+        error.checkType(entity, Entity, 'entity', 'Entity')
+
+        self.turnHead(0)
+        if robot.roiFinder is not None:
+            robot.roiFinder.reset()
+        geom = robot.imageGeometry(robot.farLevel, robot.FAR_THRESH_DIV)
+        await self.track(robot.farLevel)
+        self.aim('farFind')
+
+        inView = False
+        searchStart = time.time()
+
+        while True:
+            objProp = await self.observe(entity, robot.farLevel)
+            inRange = objProp and (geom['minArea'] <= objProp['area'] < geom['maxArea'])
+            self.steer(objProp if inRange else None, geom)
+
+            if objProp:
+                telemetry.debug('farFind.obj', **objProp)
+                if (objProp['area'] >= geom['minArea']) and (objProp['area'] < geom['maxArea']):
+                    if not inView:
+                        telemetry.info('farFind.found')
+                    inView = True
+
+                    # Too high
+                    if (objProp['y'] > geom['centerY'] + geom['threshY']) and (head.view != 0):
+                        self.turnHead(head.view - min(self.tiltAngle(robot.FAR_VIEW_DIFF), head.view))
+                        telemetry.debug('farFind.down')
+
+                    # Too low
+                    elif objProp['y'] < geom['centerY'] - geom['threshY']:
+                        diff = min(self.tiltAngle(robot.FAR_VIEW_DIFF), Head.VIEW_RNG - head.view)
+                        self.turnHead(head.view + diff)
+                        telemetry.debug('farFind.up')
+
+                        # If we get closer, the object will get out of view
+                        if math.isclose(head.view, Head.VIEW_RNG, abs_tol=1):
+                            telemetry.info('farFind.done')
+                            return True
+
+
+                    # Too left
+                    if objProp['x'] > geom['centerX'] + geom['threshX']:
+                        self.startMove(Direction.RIGHT, self.turnTime(robot.FAR_MOVE_TIME))
+                        telemetry.debug('farFind.left')
+
+                    # Too right
+                    elif objProp['x'] < geom['centerX'] - geom['threshX']:
+                        self.startMove(Direction.LEFT, self.turnTime(robot.FAR_MOVE_TIME))
+                        telemetry.debug('farFind.right')
+
+                    # Perfect horizontal view
+                    else:
+                        self.startMove(Direction.FORWARD, robot.FAR_MOVE_TIME)
+                        telemetry.debug('farFind.forward')
+
+
+                elif objProp['area'] < geom['minArea']:
+                    telemetry.debug('farFind.searching')
+                    if inView:
+                        # start searching again
+                        inView = False
+                        searchStart = time.time()
+                        telemetry.info('farFind.lost')
+                    elif (time.time() - searchStart > timeLim):
+                        return False
+                    self.startMove(Direction.LEFT, robot.FAR_MOVE_TIME)
+
+                else:
+                    telemetry.info('farFind.done')
+                    return True
+
+            else:
+                telemetry.debug('farFind.searching')
+                if (not inView) and (time.time() - searchStart > timeLim):
+                    return False
+                elif inView:
+                    # start searching again
+                    inView = False
+                    searchStart = time.time()
+                self.startMove(Direction.LEFT, robot.FAR_MOVE_TIME)
+
+
+    async def closeFind(self, entity, timeLim=15):
+        """
+        Turn and drive until a close object is within reach of the arm.
+
+        :param entity: the entity searched for
+        :param timeLim: number of seconds to search for
+        :return: True if the object is within reach, False if not in time
+        """
+        robot = self.robot
+        head = robot.head
+        error.checkComponent(robot, 'Robot')
+        error.checkType(entity, Entity, 'entity', 'Entity')
+
+        if robot.roiFinder is not None:
+            robot.roiFinder.reset()
+        geom = robot.imageGeometry(robot.closeLevel, robot.CLOSE_THRESH_DIV)
+        await self.track(robot.closeLevel)
+        self.aim('closeFind')
+
+        searchLeft = True
+        searchStart = time.time()
+
+        while True:
+            if time.time() - searchStart > timeLim:
+                return False
+
+            objProp = await self.observe(entity, robot.closeLevel)
+            self.steer(objProp, geom)
+
+            if objProp:
+                telemetry.debug('closeFind.obj', **objProp)
+
+                    # Too high
+                if (objProp['y'] > geom['centerY'] + geom['threshY']) and (head.view != 0):
+                    self.turnHead(head.view - min(self.tiltAngle(robot.CLOSE_VIEW_DIFF), head.view))
+                    telemetry.debug('closeFind.down')
+                    # Too low
+                elif objProp['y'] < geom['centerY'] - geom['threshY']:
+                    diff = min(self.tiltAngle(robot.CLOSE_VIEW_DIFF), Head.VIEW_RNG - head.view)
+                    self.turnHead(head.view + diff)
+                    telemetry.debug('closeFind.up')
+                    # If we get closer, the object will get out of view
+                    if math.isclose(head.view, Head.VIEW_RNG, abs_tol=1):
+                        telemetry.info('closeFind.done')
+                        return True
+
+                # Too left
+                if objProp['x'] > geom['centerX'] + geom['threshX']:
+                    self.startMove(Direction.RIGHT, self.turnTime(robot.CLOSE_MOVE_TIME))
+                    telemetry.debug('closeFind.left')
+                # Too right
+                elif objProp['x'] < geom['centerX'] - geom['threshX']:
+                    self.startMove(Direction.LEFT, self.turnTime(robot.CLOSE_MOVE_TIME))
+                    telemetry.debug('closeFind.right')
+                else:
+                    # the distance is only measured while still
+                    objPos = await self.objPos(await self.settle())
+                    # distance between shoulder axis and target
+                    tDist = None if objPos is None else round( math.sqrt(objPos[0]**2 + objPos[1]**2), ik.PRECISION)
+
+                    if tDist is None:
+                        telemetry.debug('closeFind.noEcho')
+                    elif tDist > ik.S_LEN + ik.E_LEN:
+                        self.startMove(Direction.FORWARD, robot.CLOSE_MOVE_TIME)
+                        telemetry.debug('closeFind.forward')
+                    elif tDist < ik.E_LEN - ik.S_LEN:
+                        self.startMove(Direction.BACKWARD, robot.CLOSE_MOVE_TIME)
+                        telemetry.debug('closeFind.backward')
+                    else:
+                        if robot.reachAngles(objPos):
+                            telemetry.info('closeFind.done')
+                            return True
+                        else:
+                            self.startMove(Direction.FORWARD, robot.CLOSE_MOVE_TIME)
+                            telemetry.debug('closeFind.forward')
+
+            else:
+                telemetry.debug('closeFind.searching')
+                self.startMove(Direction.BACKWARD, robot.CLOSE_MOVE_TIME)
+                await self.settle()
+                if searchLeft:
+                    self.startMove(Direction.LEFT, robot.CLOSE_MOVE_TIME)
+                    searchLeft = False
+                else:
+                    self.startMove(Direction.RIGHT, robot.CLOSE_MOVE_TIME)
+                    searchLeft = True
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import error
+import camera
+import pca9685
+from camera import PiCameraSource
+from pca9685 import ServoDriver
+
+from abc import ABC, abstractmethod
+
+class Backend(ABC):
+    """An abstract class for the hardware drivers used by the components."""
+
+
+    @abstractmethod
+    def gpio(self):
+        """
+        Get the GPIO driver.
+
+        :return: object with the RPi.GPIO interface
+        """
+        pass
+
+
+    @abstractmethod
+    def pca9685(self):
+        """
+        Get the registers of the PCA9685 board.
+
+        :return: object with the pca9685.I2CRegisters interface
+        """
+        pass
+
+
+    @abstractmethod
+    def frameSource(self, width, height, framerate):
+        """
+        Get the frame source of the camera.
+
+        :param width: frame width in pixels
+        :param height: frame height in pixels
+        :param framerate: frames per second
+        :return: camera.FrameSource
+        """
+        pass
+
+
+class PiBackend(Backend):
+    """The drivers of the Raspberry Pi hardware on the robot."""
+
+
+    def __init__(self, captureFormat=camera.BGR):
+        """
+        Initialise the drivers.
+
+        :param captureFormat: capture format of the camera, raw BGR or YUV
+                              frames, or the JPEG fallback
+        :raise ValueError: if captureFormat is not a capture format
+        """
+        if captureFormat not in camera.CAPTURE_FORMATS:
+            raise ValueError(f'Expected a capture format of {camera.CAPTURE_FORMATS}, but got: {captureFormat}')
+
+        self.captureFormat = captureFormat
+
+
+    def gpio(self):
+        """
+        Get the RPi.GPIO module.
+
+        :return: RPi.GPIO
+        """
+        import RPi.GPIO as GPIO
+        return GPIO
+
+
+    def pca9685(self):
+        """
+        Get the registers of the PCA9685 board on the I2C bus.
+
+        :return: pca9685.I2CRegisters instance
+        """
+        import board
+        import busio
+        from adafruit_bus_device.i2c_device import I2CDevice
+        return pca9685.I2CRegisters(I2CDevice(busio.I2C(board.SCL, board.SDA), pca9685.ADDRESS))
+
+
+    def frameSource(self, width, height, framerate):
+        """
+        Get the Pi camera frame source.
+
+        :param width: frame width in pixels
+        :param height: frame height in pixels
+        :param framerate: frames per second
+        :return: PiCameraSource instance
+        """
+        return PiCameraSource(width, height, framerate, self.captureFormat)
+
+
+# Backend used by the components, the Pi hardware unless another is chosen.
+_backend = None
+
+# Servo driver owning the PCA9685 board of the chosen backend, shared by every component.
+_servoDriver = None
+
+
+def use(backend):
+    """
+    Choose the backend of the components. Components use the backend chosen
+    when they are setup, so choose it before creating the robot.
+
+    :param backend: the backend
+    :raise TypeError: if backend is not a Backend instance
+    """
+    global _backend, _servoDriver
+    error.checkType(backend, Backend, 'backend', 'Backend')
+    _backend = backend
+    _servoDriver = None
+
+
+def backend():
+    """
+    Get the chosen backend.
+
+    :return: the chosen backend, by default the Pi hardware
+    """
+    global _backend
+    if _backend is None:
+        _backend = PiBackend()
+    return _backend
+
+
+def servoDriver():
+    """
+    Get the servo driver of the PCA9685 board of the chosen backend, which
+    every component with servos shares.
+
+    :return: pca9685.ServoDriver instance
+    """
+    global _servoDriver
+    if _servoDriver is None:
+        _servoDriver = ServoDriver(backend().pca9685())
+    return _servoDriver
+
+
+def frameSource(width, height, framerate):
+    """
+    Get the camera frame source from the chosen backend.
+
+    :param width: frame width in pixels
+    :param height: frame height in pixels
+    :param framerate: frames per second
+    :return: camera.FrameSource
+    """
+    return backend().frameSource(width, height, framerate)
+
+
+class _GPIOProxy:
+    """Forwards the RPi.GPIO interface to the GPIO driver of the chosen backend."""
+
+
+    def __getattr__(self, name):
+        return getattr(backend().gpio(), name)
+
+
+# GPIO driver of the chosen backend with the RPi.GPIO interface.
+GPIO = _GPIOProxy()
@@ -1,30 +1,34 @@
 # -*- coding: utf-8 -*-
 
 import error
+import lazy
+import hal
+import pca9685
+import telemetry
+import recorder
 from component import Component
 from entity import Entity
+from classifier import ColourClassifier, HSV_RANGES, labelMask
+from camera import CameraService
 
 import math
 import time
-import io
-from adafruit_servokit import ServoKit
-from picamera import PiCamera
-import cv2
-import numpy as np
+cv2 = lazy.module('cv2')
+np = lazy.module('numpy')
 
 class Head(Component):
     """A class for controlling the head of the robot."""
 
 
+    # Methods and servo writes whose latencies are profiled.
+    PROFILED = ('view', 'objPos', 'objCamProp', 'allObjCamProp')
+
     # The domain of the function which controls the view angle.
     VIEW_DOM = 100
 
     # The actual range of the view angle.
     VIEW_RNG = 60
 
-    # The number of times we measure the distance to an object.
-    NUM_TRIES = 10
-
     # Distance from axis of rotation for the head and the ultrasonic sensor
     AX_TO_SEN = math.sqrt(0.0265 ** 2 + 0.025 ** 2)
 
@@ -49,58 +53,53 @@ class Head(Component):
     # Camera framerate.
     FRAMERATE = 32
 
-    # Minimum yellow HSV.
-    G_HSV_MIN = np.array([50,150,20])
-
-    # Maximum yellow HSV.
-    G_HSV_MAX = np.array([90,255,255])
-
-    # Minimum blue HSV.
-    B_HSV_MIN = np.array([100,180,20])
-
-    # Maximum blue HSV.
-    B_HSV_MAX = np.array([120,255,255])
-
-    # Minimum red bottom hue HSV.
-    R_HSV_BMIN = np.array([0,100,20])
-
-    # Maximum red bottom hue HSV.
-    R_HSV_BMAX = np.array([10,255,255])
-
-    # Minimum red top hue HSV.
-    R_HSV_TMIN = np.array([169,100,20])
-
-    # Maximum red top hue HSV.
-    R_HSV_TMAX = np.array([179,255,255])
+    # Classifier labelling the pixels of HSV images with block colours.
+    CLASSIFIER = ColourClassifier(HSV_RANGES)
 
     # Object properties: pixel area, center horizontal pixel, center vertical pixel.
     OBJ_PROPS = ['area', 'x', 'y']
 
 
-    def __init__(self, viewPin, ultra):
+    def __init__(self, viewPin, ultra, source=None, camera=None):
         """
         Initialise the head view movement.
 
         :param viewPin: PCA9685 numbering of the pin controlling the head
+        :param ultra: ultrasonic sensor of the head
+        :param source: frame source of the camera, by default the one of the
+                       chosen hal backend
+        :param camera: camera component handing out frames like a
+                       CameraService, by default one capturing from source
         :raise ValueError: if viewPin is not a PCA9685 numbering
         """
         error.checkPCA9685(viewPin)
 
         self.status = False
-        kit = ServoKit(channels=16)
-        self._view = kit.servo[viewPin]
+        self._view = hal.servoDriver().servo[viewPin]
+        # last commanded view angle in the input and actual domains, None while the servo is off
+        self._viewInput = None
+        self._viewAngle = None
         self.ultra = ultra
 
+        if camera is None:
+            if source is None:
+                source = hal.frameSource(self.IMG_WIDTH, self.IMG_HEIGHT, self.FRAMERATE)
+            camera = CameraService(source)
+        self.camera = camera
+
 
     def setup(self):
         """
         Setup the view to be at the standard angle.
         """
-        self._view.angle = self.VIEW_DOM
+        self._command(self.VIEW_DOM)
 
         if not self.ultra.status:
             self.ultra.setup()
 
+        if not self.camera.status:
+            self.camera.setup()
+
         self.status = True
 
 
@@ -108,20 +107,20 @@ class Head(Component):
         """
         Cleanup the view by turning off the servo.
         """
-        self._view.angle = None
+        self._command(None)
         self.ultra.cleanup()
+        self.camera.cleanup()
         self.status = False
 
 
     @property
     def view(self):
         """
-        Get the actual view angle. As the actual angle and input angle differ,
-        the value must be translated and stretched.
+        Get the last commanded view angle, rounded to a degree.
 
-        :return: view angle in degrees
+        :return: view angle in degrees, or None if the servo is off
         """
-        return round(self.VIEW_RNG * (1 - self._view.angle / self.VIEW_DOM), 0)
+        return None if self._viewAngle is None else round(self._viewAngle, 0)
 
 
     @view.setter
@@ -136,149 +135,213 @@ class Head(Component):
         """
         error.checkComponent(self, 'Head')
         error.checkInRange(angle, 0, self.VIEW_RNG)
-        self._view.angle = self.VIEW_DOM * (1 - angle / self.VIEW_RNG)
+        self._command(self.VIEW_DOM * (1 - angle / self.VIEW_RNG), angle)
+        recorder.command('head.view', angle=angle)
+
+
+    @property
+    def viewInput(self):
+        """
+        Get the last commanded input angle of the view servo, as written to
+        the board.
+
+        :return: input angle in degrees, or None if the servo is off
+        """
+        return self._viewInput
+
+
+    def resync(self):
+        """
+        Read the view servo angle back from the board, replacing the commanded
+        angle, e.g. if the servo was driven by something else or the board was
+        reset. Otherwise the commanded angle is never read back.
+
+        :return: the commanded and read input angles if they differed,
+                 otherwise None
+        """
+        inputAngle = self._view.angle
+        drifted = None
+        if not pca9685.sameRegisters(self._viewInput, inputAngle):
+            drifted = (self._viewInput, inputAngle)
+            telemetry.warning('head.view.resynced', commanded=self._viewInput, read=inputAngle)
+        self._viewInput = inputAngle
+        self._viewAngle = None if inputAngle is None else self.VIEW_RNG * (1 - inputAngle / self.VIEW_DOM)
+        return drifted
 
 
-    def objPos(self):
+    def _command(self, inputAngle, angle=None):
         """
-        Calculate the cartesian coordinates of an object with the ultrasonic
-        sensor relative to the axis of the shoulder.
+        Write the input angle of the view servo and keep it as the commanded
+        angle. As the actual angle and input angle differ, the value must be
+        translated and stretched.
 
+        :param inputAngle: input angle in degrees, or None to turn off
+        :param angle: actual angle in degrees if known, which the input angle
+                      is translated from otherwise
+        """
+        self._view.angle = inputAngle
+        if (angle is None) and (inputAngle is not None):
+            angle = self.VIEW_RNG * (1 - inputAngle / self.VIEW_DOM)
+        self._viewInput = inputAngle
+        self._viewAngle = angle
+
+
+    def objPos(self, since=None):
+        """
+        Calculate the cartesian coordinates of an object with the filtered
+        distance of the ultrasonic sensor relative to the axis of the shoulder.
+
+        :param since: monotonic time the distances must be measured after,
+                      or None for the latest distances
         :return: the cartesian position of the object in metres relative to the
-                 axis of the shoulder
+                 axis of the shoulder, or None if the sensor has no echoes
         :raise ValueError: if the ultrasonic sensor is off
         """
         error.checkComponent(self.ultra, 'Ultrasonic sensor')
 
-        senToObj = self.ultra.meanAdjDist(self.NUM_TRIES)
+        senToObj = self.ultra.filteredDist(since)
+        if senToObj is None:
+            return None
 
-        print(senToObj)
-        x = self.X_ORIG_TO_AX + self.AX_TO_SEN * math.cos(self.view * self.DEG_TO_RAD + (3/4)*math.pi) \
-            - senToObj * math.cos(self.view * self.DEG_TO_RAD)
-        y = self.Y_ORIG_TO_AX + self.AX_TO_SEN * math.sin(self.view * self.DEG_TO_RAD - (1/4)*math.pi) \
-            + senToObj * math.sin(self.view * self.DEG_TO_RAD)
+        x, y = objCoords(self.view, senToObj)
 
-        return round(x, self.PRECISION), round(y, self.PRECISION)
+        telemetry.debug('head.objPos', dist=senToObj, x=x, y=y)
+        return x, y
 
 
     def objCamProp(self, entity, numOfChecks=10):
         """
-        Get the properties of a block in view.
+        Get the properties of a block in view, measuring them until the
+        estimate is confident or the block is consistently not found.
 
         :param entity: the object being observed
-        :param numOfChecks: number of times that the object properties
+        :param numOfChecks: maximum number of times that the object properties
                             are measured.
+        :return: dictionary of the median object properties, or None if the
+                 object is not in view
+        :raise ValueError: if the camera is off
         """
-        with PiCamera() as camera:
-            camera.resolution = (self.IMG_WIDTH, self.IMG_HEIGHT)
-            camera.start_preview()
-            time.sleep(1)
-
-            objs = []
-
-            for i in range(numOfChecks):
-                with io.BytesIO() as stream:
-                    camera.capture(stream, format='jpeg')
-                    data = np.fromstring(stream.getvalue(), dtype=np.uint8)
+        error.checkComponent(self.camera, 'Camera')
 
-                    img = cv2.imdecode(data, 1)
-                    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        estimator = ObjPropEstimator(numOfChecks)
+        timestamp = time.monotonic()
 
-                    colMask = colourMask(hsv, entity)
-                    obj = findObjProp(colMask)
-                    if obj:
-                        objs.append(obj)
+        while not estimator.done():
+            timestamp, img = self.camera.nextAfter(timestamp)
+            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
 
-            camera.stop_preview()
+            colMask = colourMask(hsv, entity)
+            estimator.add(findObjProp(colMask))
 
-        meanObj = None
-        if objs:
-            meanObj = meanObjProps(objs)
-
-        return meanObj
+        telemetry.debug('head.objCamProp', checks=estimator.checks, found=estimator.count)
+        return estimator.estimate()
 
 
     def allObjCamProp(self, numOfChecks=10):
         """
-        Get the properties of all blocks in camera view.
+        Get the properties of all blocks in camera view, measuring them until
+        the estimate of every block is confident or the block is consistently
+        not found.
 
-        :param numOfChecks: number of times that the object properties
+        :param numOfChecks: maximum number of times that the object properties
                             are measured.
+        :return: tuple of the dictionaries of the median properties of the red,
+                 green and blue objects, each None if the object is not in view
+        :raise ValueError: if the camera is off
         """
-        with PiCamera() as camera:
-            camera.resolution = (self.IMG_WIDTH, self.IMG_HEIGHT)
-            camera.start_preview()
-            time.sleep(1)
+        error.checkComponent(self.camera, 'Camera')
 
-            redObjs = []
-            greenObjs = []
-            blueObjs = []
+        entities = [Entity.RED, Entity.GREEN, Entity.BLUE]
+        estimators = [ObjPropEstimator(numOfChecks) for entity in entities]
+        timestamp = time.monotonic()
 
-            for i in range(numOfChecks):
-                with io.BytesIO() as stream:
-                    camera.capture(stream, format='jpeg')
-                    data = np.fromstring(stream.getvalue(), dtype=np.uint8)
+        while not all(estimator.done() for estimator in estimators):
+            timestamp, img = self.camera.nextAfter(timestamp)
+            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
 
-                    img = cv2.imdecode(data, 1)
-                    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            labels = self.CLASSIFIER.classify(hsv)
+            for entity, estimator in zip(entities, estimators):
+                if not estimator.done():
+                    estimator.add(findObjProp(labelMask(labels, entity)))
 
-                    redMask = colourMask(hsv, Entity.RED)
-                    redObj = findObjProp(redMask)
-                    if redObj:
-                        redObjs.append(redObj)
+        return tuple(estimator.estimate() for estimator in estimators)
 
-                    greenMask = colourMask(hsv, Entity.GREEN)
-                    greenObj = findObjProp(greenMask)
-                    if greenObj:
-                        greenObjs.append(greenObj)
 
-                    blueMask = colourMask(hsv, Entity.BLUE)
-                    blueObj = findObjProp(blueMask)
-                    if blueObj:
-                        blueObjs.append(blueObj)
-            camera.stop_preview()
+def objCoords(view, senToObj):
+    """
+    Calculate the cartesian coordinates of an object relative to the axis of
+    the shoulder from the view angle and the distance to the ultrasonic sensor.
 
-        meanRedObj = None
-        if redObjs:
-            meanRedObj = meanObjProps(redObjs)
+    :param view: view angle in degrees
+    :param senToObj: distance from the ultrasonic sensor to the object in metres
+    :return: the cartesian position of the object in metres relative to the
+             axis of the shoulder
+    """
+    x = Head.X_ORIG_TO_AX + Head.AX_TO_SEN * math.cos(view * Head.DEG_TO_RAD + (3/4)*math.pi) \
+        - senToObj * math.cos(view * Head.DEG_TO_RAD)
+    y = Head.Y_ORIG_TO_AX + Head.AX_TO_SEN * math.sin(view * Head.DEG_TO_RAD - (1/4)*math.pi) \
+        + senToObj * math.sin(view * Head.DEG_TO_RAD)
 
-        meanGreenObj = None
-        if greenObjs:
-            meanGreenObj = meanObjProps(greenObjs)
+    return round(x, Head.PRECISION), round(y, Head.PRECISION)
 
-        meanBlueObj = None
-        if blueObjs:
-            meanBlueObj = meanObjProps(blueObjs)
 
-        return (meanRedObj, meanGreenObj, meanBlueObj)
+def findObjProp(colMask):
+    """
+    Find the properties of the object (biggest blob) from the colour mask.
 
+    :param colMask: object colour mask
+    :return: dictionary of the object properties, or None if there is no object
+    """
+    return objProp(largestBlob(colMask))
 
-def findObjProp(colMask):
+
+def largestBlob(colMask):
     """
-    Find the properties of the object (biggest contour) from the colour mask.
+    Find the bounding box of the biggest blob of a colour mask, measured by
+    the area of its bounding box.
 
     :param colMask: object colour mask
+    :return: x, y, width and height of the bounding box in pixels, or None if
+             the mask is empty
+    """
+    number, _, stats, _ = cv2.connectedComponentsWithStats(colMask, connectivity=8)
+    if number < 2:
+        return None
+
+    # label 0 is the background
+    areas = stats[1:, cv2.CC_STAT_WIDTH] * stats[1:, cv2.CC_STAT_HEIGHT]
+    x, y, w, h = stats[1 + np.argmax(areas), :4]
+    return int(x), int(y), int(w), int(h)
+
+
+def objProp(box):
+    """
+    Get the properties of an object from its bounding box.
+
+    :param box: x, y, width and height of the bounding box in pixels, or None
+    :return: dictionary of the object properties, or None if box is None
     """
-    objA = 0
-    objX = 0
-    objY = 0
-
-    contours, _ = cv2.findContours(colMask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-    for contour in contours:
-        x, y, curW, curH = cv2.boundingRect(contour)
-        curA = curW * curH
-        curX = x + (curW // 2)
-        curY = y + (curH // 2)
-        if objA < curA:
-            objA = curA
-            objX = curX
-            objY = curY
-
-    if objA > 0:
-        objProp = {Head.OBJ_PROPS[0] : objA, Head.OBJ_PROPS[1] : objX, Head.OBJ_PROPS[2] : objY}
-    else:
-        objProp = None
-    return objProp
+    if box is None:
+        return None
+
+    x, y, w, h = box
+    return {Head.OBJ_PROPS[0] : w * h, Head.OBJ_PROPS[1] : x + (w // 2), Head.OBJ_PROPS[2] : y + (h // 2)}
+
+
+def pyramidLevel(image, level):
+    """
+    Downscale an image to a level of its image pyramid, averaging the pixels
+    that are merged.
+
+    :param image: image
+    :param level: image pyramid level, each level halving the resolution
+    :return: the downscaled image, or the image itself at level 0
+    """
+    if level == 0:
+        return image
+
+    height, width = image.shape[:2]
+    return cv2.resize(image, (width >> level, height >> level), interpolation=cv2.INTER_AREA)
 
 
 def meanObjProps(objs):
@@ -287,29 +350,223 @@ def meanObjProps(objs):
 
     :param objs: list of object property measurements
     """
-    meanObj = {Head.OBJ_PROPS[0] : None, Head.OBJ_PROPS[1] : None, Head.OBJ_PROPS[2] : None}
+    values = np.array([[obj[prop] for prop in Head.OBJ_PROPS] for obj in objs], dtype=np.float64)
+    return dict(zip(Head.OBJ_PROPS, values.mean(axis=0).astype(int).tolist()))
 
-    for prop in Head.OBJ_PROPS:
-        val = 0
-        for i in range(len(objs)):
-            val += objs[i][prop]
-        val /= len(objs)
-        meanObj[prop] = int(val)
 
-    return meanObj
+def colourMask(hsv, colour):
+    """
+    Get the colour mask of an entity from an HSV image. When masks of several
+    entities are needed, classify the image once and use classifier.labelMask
+    instead.
 
+    :param hsv: HSV image
+    :param colour: the entity of the mask
+    :return: uint8 mask with 255 where the pixel has the colour of the entity
+    """
+    return labelMask(Head.CLASSIFIER.classify(hsv), colour)
 
-def colourMask(hsv, colour):
+
+class RoiFinder:
+    """
+    A finder of the object of a colour which only searches a window around the
+    last object found, and the whole image when the object is not found there.
+    """
+
+
+    # Margin of the window around the last object relative to its size.
+    STD_MARGIN = 1
+
+    # Minimum margin of the window around the last object in pixels.
+    MIN_MARGIN = 16
+
+
+    def __init__(self, margin=STD_MARGIN):
+        """
+        Initialise the finder without a window.
+
+        :param margin: margin of the window around the last object relative to
+                       its size
+        :raise ValueError: if margin is not positive
+        """
+        error.checkPositive(margin)
+
+        self.margin = margin
+        self.window = None
+
+
+    def reset(self):
+        """
+        Forget the last object, so that the next search is of the whole image.
+        """
+        self.window = None
+
+
+    def find(self, image, colour):
+        """
+        Find the properties of the object of a colour in an image.
+
+        :param image: BGR image
+        :param colour: the entity of the object
+        :return: dictionary of the object properties, or None if there is no
+                 object
+        """
+        height, width = image.shape[:2]
+        box = None
+
+        if self.window is not None:
+            x0, y0, x1, y1 = self.window
+            box = self._search(image[y0:y1, x0:x1], colour)
+
+            if box is not None:
+                x, y, w, h = box
+                # the object may continue outside of the window
+                if ((x == 0) and (x0 > 0)) or ((y == 0) and (y0 > 0)) or \
+                   ((x + w == x1 - x0) and (x1 < width)) or ((y + h == y1 - y0) and (y1 < height)):
+                    box = None
+                else:
+                    box = (x + x0, y + y0, w, h)
+
+            if box is None:
+                telemetry.debug('roi.fallback')
+
+        if box is None:
+            box = self._search(image, colour)
+
+        if box is None:
+            self.window = None
+            return None
+
+        x, y, w, h = box
+        marginX = max(self.MIN_MARGIN, int(w * self.margin))
+        marginY = max(self.MIN_MARGIN, int(h * self.margin))
+        self.window = (max(0, x - marginX), max(0, y - marginY),
+                       min(width, x + w + marginX), min(height, y + h + marginY))
+
+        return objProp(box)
+
+
+    def _search(self, image, colour):
+        """
+        Find the bounding box of the object of a colour in an image.
+
+        :param image: BGR image
+        :param colour: the entity of the object
+        :return: x, y, width and height of the bounding box in pixels, or None
+                 if there is no object
+        """
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        return largestBlob(colourMask(hsv, colour))
+
+
+class ObjPropEstimator:
     """
-    TODO
+    An online estimator of the properties of an object from repeated
+    measurements, which are stored as NumPy records. The estimate is the
+    median, so single bad blobs are ignored, and measuring stops as soon as
+    its confidence interval is tight enough or the object is consistently
+    not found.
     """
-    if colour == Entity.RED:
-        redBMask = cv2.inRange(hsv, Head.R_HSV_BMIN, Head.R_HSV_BMAX)
-        redTMask = cv2.inRange(hsv, Head.R_HSV_TMIN, Head.R_HSV_TMAX)
-        colMask = cv2.bitwise_or(redBMask, redTMask)
-    elif colour == Entity.GREEN:
-        colMask = cv2.inRange(hsv, Head.G_HSV_MIN, Head.G_HSV_MAX)
-    else:
-        colMask = cv2.inRange(hsv, Head.B_HSV_MIN, Head.B_HSV_MAX)
-
-    return colMask
+
+
+    # Record of the properties of a measurement.
+    DTYPE = [(prop, 'float64') for prop in Head.OBJ_PROPS]
+
+    # Standard minimum number of measurements agreeing before stopping early.
+    STD_MIN_CHECKS = 3
+
+    # Standard half width of the confidence interval of the area relative to the area.
+    STD_AREA_TOLERANCE = 0.1
+
+    # Standard half width of the confidence interval of the position in pixels.
+    STD_POS_TOLERANCE = 4
+
+    # Standard normal quantile of the 95% confidence interval.
+    Z_95 = 1.96
+
+    # Scale of the median absolute deviation to the standard deviation of normal noise.
+    MAD_TO_STD = 1.4826
+
+    # Standard error of the median relative to the standard error of the mean of normal noise.
+    MEDIAN_EFFICIENCY = math.sqrt(math.pi / 2)
+
+
+    def __init__(self, maxChecks, minChecks=STD_MIN_CHECKS, areaTolerance=STD_AREA_TOLERANCE,
+                 posTolerance=STD_POS_TOLERANCE):
+        """
+        Initialise the estimator without measurements.
+
+        :param maxChecks: maximum number of measurements
+        :param minChecks: minimum number of measurements agreeing before
+                          stopping early
+        :param areaTolerance: half width of the confidence interval of the area
+                              relative to the area
+        :param posTolerance: half width of the confidence interval of the
+                             position in pixels
+        :raise ValueError: if maxChecks, minChecks, areaTolerance or
+                           posTolerance is not positive
+        """
+        error.checkPositive(maxChecks)
+        error.checkPositive(minChecks)
+        error.checkPositive(areaTolerance)
+        error.checkPositive(posTolerance)
+
+        self.maxChecks = maxChecks
+        self.minChecks = min(minChecks, maxChecks)
+        self.areaTolerance = areaTolerance
+        self.posTolerance = posTolerance
+        self.samples = np.empty(maxChecks, dtype=self.DTYPE)
+        self.count = 0
+        self.checks = 0
+
+
+    def add(self, obj):
+        """
+        Add a measurement.
+
+        :param obj: dictionary of the object properties, or None if the object
+                    was not found
+        """
+        self.checks += 1
+        if obj:
+            self.samples[self.count] = tuple(obj[prop] for prop in Head.OBJ_PROPS)
+            self.count += 1
+
+
+    def done(self):
+        """
+        Check if measuring can stop.
+
+        :return: True if the maximum number of measurements is taken, the
+                 object was not found in the first minChecks measurements, or
+                 the confidence intervals of the median properties are tight
+                 enough
+        """
+        if self.checks >= self.maxChecks:
+            return True
+        if self.count == 0:
+            return self.checks >= self.minChecks
+        if self.count < self.minChecks:
+            return False
+
+        # the records are rows of area, x and y
+        values = self.samples[:self.count].view(np.float64).reshape(self.count, len(Head.OBJ_PROPS))
+        median = np.median(values, axis=0)
+        mad = np.median(np.abs(values - median), axis=0)
+        halfWidth = self.Z_95 * self.MEDIAN_EFFICIENCY * self.MAD_TO_STD * mad / math.sqrt(self.count)
+        tolerance = np.array([self.areaTolerance * median[0], self.posTolerance, self.posTolerance])
+        return bool((halfWidth <= tolerance).all())
+
+
+    def estimate(self):
+        """
+        Get the median properties of the measurements.
+
+        :return: dictionary of the object properties, or None if the object
+                 was not found
+        """
+        if self.count == 0:
+            return None
+
+        samples = self.samples[:self.count]
+        return {prop: int(np.median(samples[prop])) for prop in Head.OBJ_PROPS}
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import math
+import numpy as np
 
 
 # The length of the shoulder in metres.
@@ -15,49 +16,73 @@ PRECISION = 3
 # Conversion factor from radians to degrees.
 RAD_TO_DEG = 180 / math.pi
 
+# Sides of the chord between the potential elbow positions of both solutions.
+SOLUTION_SIDES = np.array([1, -1])
 
-def calcAngles(objPos):
-    """
-    Calculate the angle of the shoulder and the elbow so that
-    the grabber is positioned to pickup the object (assuming
-    the object shape is simple).
 
-    :param objPos: the cartesian coordinates of the object position
-                   relative to the shoulder axis in metres
-    :return: the shoulder angle and elbow angle for the arm to reach
-             the object, or None is the object is not reachable
+def calcAnglesBatch(objPositions, shoulderDom=None, elbowDom=None):
     """
-    result = None
-    xObj, yObj = objPos
+    Calculate both solutions of the shoulder and elbow angles for many
+    object positions at once.
+
+    :param objPositions: N x 2 array of the cartesian coordinates of the
+                         object positions relative to the shoulder axis
+                         in metres
+    :param shoulderDom: (minimum, maximum) shoulder angle in degrees, or None
+                        to not check the shoulder angle
+    :param elbowDom: (minimum, maximum) elbow angle in degrees, or None to not
+                     check the elbow angle
+    :return: N x 2 x 2 array of the (shoulder angle, elbow angle) of both
+             solutions of each object position in degrees, and N x 2 boolean
+             array which is True where the solution reaches the object within
+             the angle domains
+    """
+    objPositions = np.asarray(objPositions, dtype=float).reshape(-1, 2)
+    xObj = objPositions[:, 0:1]
+    yObj = objPositions[:, 1:2]
     # distance between shoulder axis and target
-    tDist = round( math.sqrt(xObj**2 + yObj**2), PRECISION)
+    tDist = np.hypot(xObj, yObj)
+    reachable = (tDist <= S_LEN + E_LEN) & (tDist >= E_LEN - S_LEN)
 
-    if not ((tDist > S_LEN + E_LEN) or (tDist < E_LEN - S_LEN)):
+    with np.errstate(divide='ignore', invalid='ignore'):
         # distance from shoulder axis to chord between potential elbow positions
         sDist = (S_LEN**2 - E_LEN**2 + tDist**2) / (2*tDist)
-        # distance from chord between potential elbow positions to elbow positions
-        hlfChdDist = round( math.sqrt(S_LEN ** 2 - sDist**2), PRECISION)
+    # distance from chord between potential elbow positions to elbow positions
+    hlfChdDist = np.sqrt(np.maximum(S_LEN**2 - sDist**2, 0))
 
-        # coordinates for the middle of the chord between the potential elbow positions
-        xHlfMdPt = sDist * xObj / tDist
-        yHlfMdPt = sDist * yObj / tDist
+    # the elbow positions of both solutions mirror each other along the target
+    upperAngle = np.arctan2(hlfChdDist, sDist) * RAD_TO_DEG
+    shoulderAngle = np.arctan2(yObj, xObj) * RAD_TO_DEG - SOLUTION_SIDES * upperAngle
+    shoulderAngle = (shoulderAngle + 180) % 360 - 180
+    cosElbow = np.clip((tDist**2 - S_LEN**2 - E_LEN**2) / (2 * S_LEN * E_LEN), -1, 1)
+    elbowAngle = SOLUTION_SIDES * (np.arccos(cosElbow) * RAD_TO_DEG)
 
-        elbowPos = ( round(xHlfMdPt + (hlfChdDist * yObj) / tDist, PRECISION),
-                     round(yHlfMdPt - (hlfChdDist * xObj) / tDist, PRECISION))
-        shoulderAngle = round( math.atan2(elbowPos[1], elbowPos[0]) * RAD_TO_DEG, PRECISION)
+    valid = np.broadcast_to(reachable, shoulderAngle.shape)
+    if shoulderDom is not None:
+        valid = valid & (shoulderDom[0] <= shoulderAngle) & (shoulderAngle <= shoulderDom[1])
+    if elbowDom is not None:
+        valid = valid & (elbowDom[0] <= elbowAngle) & (elbowAngle <= elbowDom[1])
 
-        xTrans, yTrans = transPos(elbowPos, objPos)
-        elbowAngle =  round( math.atan2(yTrans, xTrans) * RAD_TO_DEG, PRECISION)
+    return np.stack((shoulderAngle, elbowAngle), axis=-1), valid
 
-        result = shoulderAngle, elbowAngle
 
-    print(objPos)
-    print(math.sqrt(xObj**2 + yObj**2))
-    print((tDist > S_LEN + E_LEN))
-    print((tDist < E_LEN - S_LEN))
-    print(result)
+def calcAngles(objPos):
+    """
+    Calculate the angle of the shoulder and the elbow so that
+    the grabber is positioned to pickup the object (assuming
+    the object shape is simple).
+
+    :param objPos: the cartesian coordinates of the object position
+                   relative to the shoulder axis in metres
+    :return: the shoulder angle and elbow angle for the arm to reach
+             the object, or None is the object is not reachable
+    """
+    angles, valid = calcAnglesBatch([objPos])
+    if not valid[0, 0]:
+        return None
 
-    return result
+    shoulderAngle, elbowAngle = angles[0, 0]
+    return round(float(shoulderAngle), PRECISION), round(float(elbowAngle), PRECISION)
 
 
 def transPos(elbowPos, objPos):
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import types
+import importlib.util
+
+
+class _MissingModule(types.ModuleType):
+    """A placeholder of a module which is not installed, failing when used."""
+
+
+    def __getattr__(self, attr):
+        """
+        Fail on any use of the module.
+
+        :raise ModuleNotFoundError: always
+        """
+        raise ModuleNotFoundError(f'No module named {self.__name__!r}', name=self.__name__)
+
+
+def module(name):
+    """
+    Get a module which is only imported on first attribute access, e.g.
+    cv2 = lazy.module('cv2'). Modules using OpenCV or numpy then import in
+    milliseconds, and those which are not installed only fail when used.
+
+    :param name: absolute name of the module
+    :return: the module if already imported, otherwise a lazily loaded one
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return _MissingModule(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    lazyModule = importlib.util.module_from_spec(spec)
+    sys.modules[name] = lazyModule
+    loader.exec_module(lazyModule)
+    return lazyModule
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+import head
+import scene
+import inverse_kinematics as ik
+from arm import Arm
+from head import Head
+from entity import Entity
+
+import sys
+import json
+import glob
+import time
+import argparse
+import cv2
+import numpy as np
+
+
+# Number of synthetic frames.
+NUM_FRAMES = 16
+
+# Number of inverse kinematics targets.
+NUM_TARGETS = 256
+
+# Seed of the synthetic frames and targets, so that every run measures the same data.
+SEED = 0
+
+# Standard number of timed calls per kernel.
+STD_CALLS = 500
+
+# Number of untimed calls per kernel before timing.
+WARMUP_CALLS = 20
+
+# Latency percentiles reported per kernel.
+PERCENTILES = [50, 90, 99]
+
+# Standard fraction which the median latency may exceed the baseline by.
+STD_TOLERANCE = 0.25
+
+# BGR colours of the blocks drawn in the synthetic frames.
+BLOCK_COLOURS = {Entity.RED: (40, 30, 200), Entity.GREEN: (60, 170, 40), Entity.BLUE: (190, 80, 30)}
+
+
+def syntheticFrames(number=NUM_FRAMES, seed=SEED):
+    """
+    Generate camera frames of blocks on a floor with sensor noise and small
+    specks of block colours, as seen by the robot.
+
+    :param number: number of frames
+    :param seed: seed of the random generator
+    :return: list of BGR frames of Head.IMG_WIDTH x Head.IMG_HEIGHT pixels
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+
+    for i in range(number):
+        frame = np.empty((Head.IMG_HEIGHT, Head.IMG_WIDTH, 3), dtype=np.uint8)
+        frame[:] = rng.integers(90, 160, size=3, dtype=np.uint8)
+
+        for colour in BLOCK_COLOURS.values():
+            for j in range(rng.integers(0, 3)):
+                w, h = rng.integers(10, 160, size=2)
+                x = rng.integers(0, Head.IMG_WIDTH - w)
+                y = rng.integers(0, Head.IMG_HEIGHT - h)
+                frame[y:y + h, x:x + w] = colour
+
+            # specks which are too small to be blocks
+            specks = rng.integers(0, [Head.IMG_WIDTH, Head.IMG_HEIGHT], size=(200, 2))
+            frame[specks[:, 1], specks[:, 0]] = colour
+
+        noise = rng.normal(0, 6, size=frame.shape)
+        frames.append(np.clip(frame + noise, 0, 255).astype(np.uint8))
+
+    return frames
+
+
+def recordedFrames(pattern):
+    """
+    Load recorded camera frames, resized to the camera resolution.
+
+    :param pattern: glob pattern of the image files
+    :return: list of BGR frames of Head.IMG_WIDTH x Head.IMG_HEIGHT pixels
+    :raise ValueError: if no image matches the pattern
+    """
+    frames = []
+    for path in sorted(glob.glob(pattern)):
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is not None:
+            frames.append(cv2.resize(frame, (Head.IMG_WIDTH, Head.IMG_HEIGHT), interpolation=cv2.INTER_AREA))
+
+    if not frames:
+        raise ValueError(f'Expected recorded frames matching {pattern}')
+    return frames
+
+
+def ikTargets(number=NUM_TARGETS, seed=SEED):
+    """
+    Generate object positions in and around the reach of the arm.
+
+    :param number: number of positions
+    :param seed: seed of the random generator
+    :return: array of N x 2 cartesian positions in metres relative to the
+             shoulder axis
+    """
+    rng = np.random.default_rng(seed)
+    dist = rng.uniform(0, 1.1 * (ik.S_LEN + ik.E_LEN), number)
+    angle = rng.uniform(0, np.pi, number)
+    return np.round(np.column_stack((dist * np.cos(angle), dist * np.sin(angle))), ik.PRECISION)
+
+
+def timeKernel(kernel, inputs, calls=STD_CALLS):
+    """
+    Time the calls of a kernel, cycling through its inputs.
+
+    :param kernel: function of one input
+    :param inputs: list of inputs
+    :param calls: number of timed calls
+    :return: array of the latency of each call in seconds
+    """
+    for i in range(WARMUP_CALLS):
+        kernel(inputs[i % len(inputs)])
+
+    latencies = np.empty(calls)
+    for i in range(calls):
+        arg = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        kernel(arg)
+        latencies[i] = time.perf_counter() - start
+
+    return latencies
+
+
+def kernels(frames, targets):
+    """
+    Get the kernels and their inputs.
+
+    :param frames: list of BGR frames
+    :param targets: array of N x 2 object positions
+    :return: dictionary of kernel name to kernel and list of inputs
+    """
+    hsvs = [cv2.cvtColor(frame, cv2.COLOR_BGR2HSV) for frame in frames]
+    masks = [head.colourMask(hsv, Entity.RED) for hsv in hsvs]
+    objs = [obj for obj in (head.findObjProp(mask) for mask in masks) if obj] or [{'area': 1, 'x': 0, 'y': 0}]
+    objLists = [[objs[(i + j) % len(objs)] for j in range(10)] for i in range(len(objs))]
+    readings = [(view, dist) for view in range(0, Head.VIEW_RNG + 1, 5) for dist in (0.05, 0.1, 0.2, 0.4)]
+    shoulderDom = (Arm.SHOULDER_MIN_DOM, Arm.SHOULDER_MAX_DOM)
+    elbowDom = (Arm.ELBOW_MIN_DOM, Arm.ELBOW_MAX_DOM)
+
+    return {
+        'cvtColor': (lambda frame: cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), frames),
+        'colourMask': (lambda hsv: head.colourMask(hsv, Entity.RED), hsvs),
+        'classify': (Head.CLASSIFIER.classify, hsvs),
+        'findObjProp': (head.findObjProp, masks),
+        'pyramidLevel2': (lambda frame: head.pyramidLevel(frame, 2), frames),
+        'meanObjProps': (head.meanObjProps, objLists),
+        'objPropEstimator': (estimate, objLists),
+        'inferScene': (scene.inferScene, frames),
+        'objCoords': (lambda reading: head.objCoords(*reading), readings),
+        'calcAngles': (ik.calcAngles, list(targets)),
+        'calcAnglesBatch': (lambda batch: ik.calcAnglesBatch(batch, shoulderDom, elbowDom), [targets]),
+    }
+
+
+def estimate(objs):
+    """
+    Estimate object properties from measurements until the estimator is done.
+
+    :param objs: list of object property measurements
+    :return: dictionary of the object properties, or None
+    """
+    estimator = head.ObjPropEstimator(len(objs))
+    for obj in objs:
+        if estimator.done():
+            break
+        estimator.add(obj)
+    return estimator.estimate()
+
+
+def summarise(latencies):
+    """
+    Summarise the latencies of a kernel.
+
+    :param latencies: array of latencies in seconds
+    :return: dictionary of the latency percentiles and mean in microseconds,
+             and the calls per second
+    """
+    summary = {f'p{p}': float(np.percentile(latencies, p)) * 1e6 for p in PERCENTILES}
+    summary['mean'] = float(latencies.mean()) * 1e6
+    summary['fps'] = 1 / float(latencies.mean())
+    return summary
+
+
+def regressions(results, baseline, tolerance=STD_TOLERANCE):
+    """
+    Find the kernels whose median latency exceeds the baseline.
+
+    :param results: dictionary of kernel name to summary
+    :param baseline: dictionary of kernel name to baseline summary
+    :param tolerance: fraction which the median latency may exceed the
+                      baseline by
+    :return: list of (kernel name, median latency, baseline median latency)
+    """
+    slow = []
+    for name, summary in results.items():
+        if (name in baseline) and (summary['p50'] > baseline[name]['p50'] * (1 + tolerance)):
+            slow.append((name, summary['p50'], baseline[name]['p50']))
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the vision and kinematics kernels.')
+    parser.add_argument('--frames', help='glob pattern of recorded frames used instead of synthetic ones')
+    parser.add_argument('--calls', type=int, default=STD_CALLS, help='number of timed calls per kernel')
+    parser.add_argument('--only', nargs='+', help='names of the kernels to time')
+    parser.add_argument('--baseline', help='JSON file of a baseline to compare against')
+    parser.add_argument('--save', help='JSON file to save the results to, as a baseline for later runs')
+    parser.add_argument('--tolerance', type=float, default=STD_TOLERANCE,
+                        help='fraction which the median latency may exceed the baseline by')
+    args = parser.parse_args()
+
+    frames = recordedFrames(args.frames) if args.frames else syntheticFrames()
+    results = {}
+
+    print(f'{"kernel":<16} {"p50 us":>10} {"p90 us":>10} {"p99 us":>10} {"calls/s":>10}')
+    for name, (kernel, inputs) in kernels(frames, ikTargets()).items():
+        if args.only and (name not in args.only):
+            continue
+        results[name] = summary = summarise(timeKernel(kernel, inputs, args.calls))
+        print(f'{name:<16} {summary["p50"]:10.1f} {summary["p90"]:10.1f} {summary["p99"]:10.1f} {summary["fps"]:10.1f}')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            slow = regressions(results, json.load(file), args.tolerance)
+        for name, latency, baseLatency in slow:
+            print(f'regression: {name} p50 {latency:.1f} us > baseline {baseLatency:.1f} us')
+        if slow:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
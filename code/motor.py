@@ -1,14 +1,17 @@
 # -*- coding: utf-8 -*-
 
 import error
+import telemetry
 from component import Component
-
-import RPi.GPIO as GPIO
+from hal import GPIO
 
 class Motor(Component):
     """A class for controlling the wheel motors of the robot."""
 
 
+    # Methods whose latencies are profiled.
+    PROFILED = ('run', 'stop')
+
     # Standard frequency (Hz) of PWM instance controlling motor engine.
     STD_MOTOR_FREQ = 1000
 
@@ -28,6 +31,7 @@ class Motor(Component):
         error.checkGPIO(forwardPin)
 
         self.status = False
+        self.running = False
         self.enginePin = enginePin
         self.backwardPin = backwardPin
         self.forwardPin = forwardPin
@@ -46,7 +50,7 @@ class Motor(Component):
             self.pwm = GPIO.PWM(self.enginePin, self.STD_MOTOR_FREQ)
             self.status = True
         except Exception as e:
-            print(e)
+            telemetry.failure('motor.setup.failed', error=repr(e))
             self.cleanup()
 
 
@@ -59,11 +63,25 @@ class Motor(Component):
         self.status = False
 
 
+    def run(self, dc):
+        """
+        Run the motor engine, changing the duty cycle if it is already running.
+
+        :param dc: duty cycle (0-100)
+        """
+        if self.running:
+            self.pwm.ChangeDutyCycle(dc)
+        else:
+            self.pwm.start(dc)
+            self.running = True
+
+
     def stop(self):
         """
         Stop the motor.
         """
         self.pwm.stop()
+        self.running = False
         GPIO.output(self.pins(), GPIO.LOW)
 
 
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+import error
+
+import time
+import threading
+
+
+# I2C address of the PCA9685 board.
+ADDRESS = 0x40
+
+# Number of PWM channels of the board.
+CHANNELS = 16
+
+# Mode register 1, with the restart, auto-increment and sleep bits.
+MODE1 = 0x00
+MODE1_RESTART = 0x80
+MODE1_AI = 0x20
+MODE1_SLEEP = 0x10
+
+# Prescaler register of the PWM frequency, only writable while asleep.
+PRE_SCALE = 0xFE
+
+# First register of channel 0 (ON_L, ON_H, OFF_L, OFF_H), each channel has four.
+LED0_ON_L = 0x06
+
+# Number of registers of a channel.
+CHANNEL_REGISTERS = 4
+
+# Bit of the OFF_H register turning a channel fully off.
+FULL_OFF = 0x10
+
+# Frequency of the internal oscillator in hertz.
+OSCILLATOR = 25000000
+
+# Steps of a PWM period.
+RESOLUTION = 4096
+
+# PWM frequency of the servos in hertz.
+FREQUENCY = 50
+
+# Pulse widths in microseconds of the minimum and maximum servo angle, as ServoKit.
+MIN_PULSE = 750
+MAX_PULSE = 2250
+
+# Angle range of the servos in degrees.
+ACTUATION_RANGE = 180
+
+# Seconds the oscillator takes to start after waking up.
+WAKE_TIME = 0.0005
+
+# Registers of a channel which is off.
+OFF_REGISTERS = bytes((0, 0, 0, FULL_OFF))
+
+
+def angleRegisters(angle):
+    """
+    Get the registers of a channel driving a servo to an angle.
+
+    :param angle: servo angle in degrees, or None to turn the servo off
+    :return: ON_L, ON_H, OFF_L and OFF_H register values
+    :raise ValueError: if angle is not between 0 and ACTUATION_RANGE
+    """
+    if angle is None:
+        return OFF_REGISTERS
+
+    error.checkInRange(angle, 0, ACTUATION_RANGE)
+    pulse = MIN_PULSE + (MAX_PULSE - MIN_PULSE) * angle / ACTUATION_RANGE
+    off = min(RESOLUTION - 1, round(pulse * FREQUENCY * RESOLUTION / 1000000))
+    return bytes((0, 0, off & 0xFF, off >> 8))
+
+
+def sameRegisters(angle, other):
+    """
+    Check if two servo angles drive a channel with the same registers, so
+    they only differ by less than the resolution of the board.
+
+    :param angle: servo angle in degrees, or None if turned off
+    :param other: servo angle in degrees, or None if turned off
+    :return: True if the registers of the angles are the same
+    :raise ValueError: if an angle is not between 0 and ACTUATION_RANGE
+    """
+    return angleRegisters(angle) == angleRegisters(other)
+
+
+def registersAngle(registers):
+    """
+    Get the servo angle driven by the registers of a channel.
+
+    :param registers: ON_L, ON_H, OFF_L and OFF_H register values
+    :return: servo angle in degrees, or None if the channel is off
+    """
+    onL, onH, offL, offH = registers
+    if offH & FULL_OFF:
+        return None
+
+    counts = ((offH & 0x0F) << 8 | offL) - ((onH & 0x0F) << 8 | onL)
+    pulse = (counts % RESOLUTION) * 1000000 / (FREQUENCY * RESOLUTION)
+    angle = (pulse - MIN_PULSE) * ACTUATION_RANGE / (MAX_PULSE - MIN_PULSE)
+    return min(max(angle, 0), ACTUATION_RANGE)
+
+
+class I2CRegisters:
+    """The registers of an I2C device, read and written in block transfers."""
+
+
+    def __init__(self, device):
+        """
+        Initialise the registers of a device.
+
+        :param device: adafruit_bus_device.i2c_device.I2CDevice
+        """
+        self.device = device
+
+
+    def write(self, register, data):
+        """
+        Write consecutive registers in one transfer.
+
+        :param register: address of the first register
+        :param data: bytes of the registers
+        """
+        with self.device as device:
+            device.write(bytes((register,)) + bytes(data))
+
+
+    def read(self, register, count):
+        """
+        Read consecutive registers in one transfer.
+
+        :param register: address of the first register
+        :param count: number of registers
+        :return: bytes of the registers
+        """
+        data = bytearray(count)
+        with self.device as device:
+            device.write_then_readinto(bytes((register,)), data)
+        return bytes(data)
+
+
+class Servo:
+    """A servo on a channel of the servo driver, like an adafruit_motor servo."""
+
+
+    def __init__(self, driver, channel):
+        """
+        Initialise the servo of a channel.
+
+        :param driver: the ServoDriver
+        :param channel: PCA9685 channel
+        """
+        self.driver = driver
+        self.channel = channel
+
+
+    @property
+    def angle(self):
+        """
+        Read back the servo angle from the board.
+
+        :return: servo angle in degrees, or None if turned off
+        """
+        return self.driver.read(self.channel)
+
+
+    @angle.setter
+    def angle(self, angle):
+        """
+        Set the servo angle, written when the frame is committed, or at once
+        outside of a frame.
+
+        :param angle: servo angle in degrees, or None to turn off
+        :raise ValueError: if angle is not between 0 and 180
+        """
+        self.driver.set(self.channel, angle)
+
+
+class ServoDriver:
+    """
+    A driver owning the PCA9685 board, shared by every component with servos.
+    Servo angles set within a frame are written when the frame is committed,
+    in a single auto-increment write spanning all of their channels, so a
+    trajectory step of the arm is one I2C transfer instead of one per joint.
+    """
+
+
+    def __init__(self, registers):
+        """
+        Initialise the board, setting the PWM frequency and auto-increment,
+        with every channel off.
+
+        :param registers: registers of the board, like I2CRegisters
+        """
+        self.registers = registers
+        self.servo = [Servo(self, channel) for channel in range(CHANNELS)]
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # the LED registers of every channel as last written
+        self._leds = bytearray(OFF_REGISTERS * CHANNELS)
+        self.writes = 0
+
+        prescale = round(OSCILLATOR / (RESOLUTION * FREQUENCY)) - 1
+        registers.write(MODE1, (MODE1_SLEEP,))
+        registers.write(PRE_SCALE, (prescale,))
+        registers.write(MODE1, (MODE1_AI,))
+        time.sleep(WAKE_TIME)
+        registers.write(MODE1, (MODE1_RESTART | MODE1_AI,))
+        registers.write(LED0_ON_L, self._leds)
+
+
+    def _staged(self):
+        """
+        Get the channel registers staged by the current thread.
+
+        :return: dictionary of channel to registers
+        """
+        if not hasattr(self._local, 'staged'):
+            self._local.staged = {}
+            self._local.depth = 0
+        return self._local.staged
+
+
+    def set(self, channel, angle):
+        """
+        Set the angle of a servo, written when the frame is committed, or at
+        once outside of a frame.
+
+        :param channel: PCA9685 channel
+        :param angle: servo angle in degrees, or None to turn off
+        :raise ValueError: if channel is not a PCA9685 channel or angle is not
+                           between 0 and 180
+        """
+        error.checkInRange(channel, 0, CHANNELS - 1)
+        self._staged()[channel] = angleRegisters(angle)
+        if self._local.depth == 0:
+            self.commitFrame()
+
+
+    def frame(self):
+        """
+        Get a context collecting the servo angles set within it into one
+        frame, committed when it exits. Frames can be nested, the outermost
+        one commits. The frame is committed even if its body raises, so the
+        angles set before the exception reach the servos like the angles set
+        outside of frames do.
+
+        :return: context manager
+        """
+        return _Frame(self)
+
+
+    def commitFrame(self):
+        """
+        Write the servo angles set by the current thread since the last
+        commit, in a single write from the lowest to the highest channel.
+        Channels in between are rewritten with their current registers.
+        """
+        staged = self._staged()
+        if not staged:
+            return
+
+        with self._lock:
+            for channel, registers in staged.items():
+                start = channel * CHANNEL_REGISTERS
+                self._leds[start:start + CHANNEL_REGISTERS] = registers
+            first = min(staged) * CHANNEL_REGISTERS
+            last = (max(staged) + 1) * CHANNEL_REGISTERS
+            staged.clear()
+            self.registers.write(LED0_ON_L + first, bytes(self._leds[first:last]))
+            self.writes += 1
+
+
+    def read(self, channel):
+        """
+        Read back the angle of a servo from the board.
+
+        :param channel: PCA9685 channel
+        :return: servo angle in degrees, or None if turned off
+        :raise ValueError: if channel is not a PCA9685 channel
+        """
+        error.checkInRange(channel, 0, CHANNELS - 1)
+        with self._lock:
+            registers = self.registers.read(LED0_ON_L + channel * CHANNEL_REGISTERS, CHANNEL_REGISTERS)
+        return registersAngle(registers)
+
+
+class _Frame:
+    """A context collecting the servo angles set within it into one frame."""
+
+
+    def __init__(self, driver):
+        """
+        Initialise the frame.
+
+        :param driver: the ServoDriver
+        """
+        self.driver = driver
+
+
+    def __enter__(self):
+        """
+        Start collecting the servo angles set by the current thread.
+
+        :return: the ServoDriver
+        """
+        self.driver._staged()
+        self.driver._local.depth += 1
+        return self.driver
+
+
+    def __exit__(self, excType, excValue, traceback):
+        """
+        Commit the angles set within the frame if it is the outermost one,
+        also when the body raised, which the exception is passed on from.
+
+        :param excType: type of the exception raised by the body, or None
+        :param excValue: the exception, or None
+        :param traceback: traceback of the exception, or None
+        :return: False, so an exception is not suppressed
+        """
+        self.driver._local.depth -= 1
+        if self.driver._local.depth == 0:
+            self.driver.commitFrame()
+        return False
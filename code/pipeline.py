@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+import error
+import lazy
+import head
+from head import Head
+from entity import Entity
+from component import Component
+from classifier import labelMask
+
+import time
+import queue
+import threading
+import collections
+import multiprocessing
+from multiprocessing import shared_memory
+cv2 = lazy.module('cv2')
+np = lazy.module('numpy')
+
+
+# Standard number of segmentation processes, leaving a core to capture and control.
+STD_WORKERS = 3
+
+# Standard number of frames queued for segmentation, older frames are dropped for newer ones.
+STD_QUEUE_SIZE = 2
+
+# Standard number of seconds to wait for a segmented frame.
+STD_TIMEOUT = 2
+
+# Number of latencies kept for the statistics.
+LATENCY_WINDOW = 512
+
+# Latency percentiles reported in the statistics.
+PERCENTILES = [50, 90, 99]
+
+# Start method of the worker processes, as forking a process running camera threads and
+# the OpenCV thread pool can deadlock the child.
+START_METHOD = 'spawn'
+
+
+def _segment(name, shape, levelValue, frames, results):
+    """
+    Segment the frames in shared memory slots until stopped, finding the
+    object of every entity in each.
+
+    :param name: name of the shared memory of the slots
+    :param shape: shape of the slots, (slots, height, width, channels)
+    :param levelValue: shared value of the image pyramid level to process at
+    :param frames: queue of (slot, sequence number, capture time) of the
+                   frames, None to stop
+    :param results: queue which (slot, sequence number, capture time, level,
+                    process id, dictionary of entity name to object properties)
+                    are put on
+    """
+    memory = shared_memory.SharedMemory(name=name)
+    slots = np.ndarray(shape, dtype=np.uint8, buffer=memory.buf)
+    try:
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+
+            slot, sequence, timestamp = frame
+            level = levelValue.value
+            hsv = cv2.cvtColor(head.pyramidLevel(slots[slot], level), cv2.COLOR_BGR2HSV)
+            labels = Head.CLASSIFIER.classify(hsv)
+            objs = {entity.name: head.findObjProp(labelMask(labels, entity)) for entity in Entity}
+            results.put((slot, sequence, timestamp, level, multiprocessing.current_process().pid, objs))
+    finally:
+        del slots
+        memory.close()
+
+
+class VisionPipeline(Component):
+    """
+    A pipeline segmenting camera frames in worker processes. Frames are
+    copied into shared memory slots instead of being pickled, and are dropped
+    when the workers fall behind, so results are never stale.
+    """
+
+
+    # Methods whose latencies are profiled.
+    PROFILED = ('nextAfter',)
+
+
+    def __init__(self, camera, workers=STD_WORKERS, queueSize=STD_QUEUE_SIZE, level=0):
+        """
+        Initialise the pipeline.
+
+        :param camera: camera component handing out frames like a
+                       CameraService
+        :param workers: number of segmentation processes
+        :param queueSize: number of frames queued for segmentation
+        :param level: image pyramid level which frames are segmented at
+        :raise ValueError: if workers or queueSize is not positive, or level
+                           is negative
+        """
+        error.checkPositive(workers)
+        error.checkPositive(queueSize)
+        error.checkInRange(level, 0, float('inf'))
+
+        self.status = False
+        self.camera = camera
+        self.workers = workers
+        self.queueSize = queueSize
+        self._level = level
+
+        self._context = multiprocessing.get_context(START_METHOD)
+        self._levelValue = None
+        self._memory = None
+        self._processes = []
+        self._threads = []
+        self._stop = threading.Event()
+        self._newResult = threading.Condition()
+        self._result = None
+        self._statsLock = threading.Lock()
+
+
+    @property
+    def level(self):
+        """
+        Get the image pyramid level which frames are segmented at.
+
+        :return: image pyramid level
+        """
+        return self._level
+
+
+    @level.setter
+    def level(self, level):
+        """
+        Set the image pyramid level which frames are segmented at, from the
+        next frame on.
+
+        :param level: image pyramid level
+        :raise ValueError: if level is negative
+        """
+        error.checkInRange(level, 0, float('inf'))
+        self._level = level
+        if self._levelValue is not None:
+            self._levelValue.value = level
+
+
+    def setup(self):
+        """
+        Allocate the slots and start the worker processes and the threads
+        feeding them frames and collecting their results.
+        """
+        if not self.camera.status:
+            self.camera.setup()
+
+        # workers, queued frames and the frame being copied each hold a slot
+        numSlots = self.workers + self.queueSize + 1
+        self._shape = (numSlots, Head.IMG_HEIGHT, Head.IMG_WIDTH, 3)
+        self._memory = shared_memory.SharedMemory(create=True, size=int(np.prod(self._shape)))
+        self._slots = np.ndarray(self._shape, dtype=np.uint8, buffer=self._memory.buf)
+        self._free = collections.deque(range(numSlots))
+        self._freeLock = threading.Lock()
+
+        self._levelValue = self._context.Value('i', self._level)
+        self._frames = self._context.Queue(self.queueSize)
+        self._results = self._context.Queue()
+        self._processes = [self._context.Process(target=_segment, daemon=True,
+                                                 args=(self._memory.name, self._shape, self._levelValue,
+                                                       self._frames, self._results))
+                           for i in range(self.workers)]
+        for process in self._processes:
+            process.start()
+
+        self._result = None
+        self._resetStats()
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._feed, daemon=True),
+                         threading.Thread(target=self._collect, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        self.status = True
+
+
+    def cleanup(self):
+        """
+        Stop the workers and threads and free the slots, if the pipeline was
+        setup.
+        """
+        if self._memory is None:
+            return
+
+        self._stop.set()
+        for thread in self._threads[:1]:
+            thread.join()
+        for process in self._processes:
+            self._frames.put(None)
+        for process in self._processes:
+            process.join()
+        self._results.put(None)
+        for thread in self._threads[1:]:
+            thread.join()
+        self._threads = []
+        self._processes = []
+
+        del self._slots
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+        self.status = False
+
+
+    def _resetStats(self):
+        """
+        Reset the statistics of the pipeline.
+        """
+        with self._statsLock:
+            self._statsStart = time.monotonic()
+            self._captured = 0
+            self._dropped = 0
+            self._segmented = collections.Counter()
+            self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+
+    def _feed(self):
+        """
+        Copy every new camera frame into a free slot and queue it, dropping
+        the oldest queued frame when the workers fall behind.
+        """
+        timestamp = time.monotonic()
+        sequence = 0
+        while not self._stop.is_set():
+            try:
+                timestamp, image = self.camera.nextAfter(timestamp, STD_TIMEOUT)
+            except TimeoutError:
+                continue
+            self._captured += 1
+
+            with self._freeLock:
+                slot = self._free.popleft() if self._free else None
+            if slot is None:
+                self._dropped += 1
+                continue
+            self._slots[slot] = image
+
+            sequence += 1
+            while True:
+                try:
+                    self._frames.put_nowait((slot, sequence, timestamp))
+                    break
+                except queue.Full:
+                    try:
+                        stale = self._frames.get_nowait()
+                    except queue.Empty:
+                        continue
+                    self._dropped += 1
+                    self._release(stale[0])
+
+
+    def _release(self, slot):
+        """
+        Return a slot to the free slots.
+
+        :param slot: index of the slot
+        """
+        with self._freeLock:
+            self._free.append(slot)
+
+
+    def _collect(self):
+        """
+        Collect the results of the workers, keeping the latest one.
+        """
+        while True:
+            result = self._results.get()
+            if result is None:
+                break
+
+            slot, sequence, timestamp, level, pid, objs = result
+            self._release(slot)
+            with self._statsLock:
+                self._latencies.append(time.monotonic() - timestamp)
+                self._segmented[pid] += 1
+
+            with self._newResult:
+                if (self._result is None) or (sequence > self._result[0]):
+                    self._result = (sequence, timestamp, level, objs)
+                    self._newResult.notify_all()
+
+
+    def nextAfter(self, timestamp, entity, timeout=STD_TIMEOUT):
+        """
+        Get the object of an entity in the latest frame captured after the
+        given time and segmented at the current level, waiting for it if
+        needed.
+
+        :param timestamp: monotonic time the frame must be captured after
+        :param entity: the entity of the object
+        :param timeout: maximum number of seconds to wait
+        :return: (monotonic capture time, dictionary of the object properties
+                 in pixels of the level or None if there is no object)
+        :raise ValueError: if the pipeline is off
+        :raise TimeoutError: if no frame is segmented in time
+        """
+        error.checkComponent(self, 'Vision pipeline')
+
+        ready = lambda: (self._result is not None) and (self._result[1] > timestamp) and \
+                        (self._result[2] == self._level)
+        with self._newResult:
+            if not self._newResult.wait_for(ready, timeout):
+                raise TimeoutError(f'No frame segmented within {timeout} seconds')
+            sequence, captured, level, objs = self._result
+        return captured, objs[entity.name]
+
+
+    def stats(self):
+        """
+        Get the throughput of each stage and the end-to-end latency since the
+        pipeline was setup.
+
+        :return: dictionary of the frames per second captured, dropped and
+                 segmented overall and per worker, and the latency percentiles
+                 from capture to result in milliseconds
+        """
+        # the collecting thread adds workers and latencies while they are copied
+        with self._statsLock:
+            elapsed = max(time.monotonic() - self._statsStart, 1e-9)
+            captured, dropped = self._captured, self._dropped
+            segmented = list(self._segmented.values())
+            latencies = np.array(self._latencies)
+        stats = {'captureFps': captured / elapsed,
+                 'dropFps': dropped / elapsed,
+                 'segmentFps': sum(segmented) / elapsed,
+                 'workerFps': [count / elapsed for count in segmented]}
+        for p in PERCENTILES:
+            stats[f'latencyP{p}'] = float(np.percentile(latencies, p)) * 1000 if latencies.size else None
+        return stats
@@ -0,0 +1,857 @@
+# -*- coding: utf-8 -*-
+
+import re
+import heapq
+import itertools
+import collections
+import numpy as np
+
+
+# Type every other type derives from.
+OBJECT_TYPE = 'object'
+
+# Heuristic value of states from which the goal is unreachable.
+DEAD_END = float('inf')
+
+# Standard maximum number of expanded states before giving up.
+STD_MAX_EXPANSIONS = 200000
+
+# Number of expansions from the helpful actions' open list after the heuristic improves.
+PREFERRED_BOOST = 1000
+
+# Standard maximum number of memoised plan suffixes.
+STD_MAX_PLANS = 4096
+
+# Standard maximum number of expanded states of a search bridging to a plan suffix.
+STD_MAX_BRIDGE_EXPANSIONS = 2000
+
+
+class Action:
+    """An action schema of a PDDL domain."""
+
+
+    def __init__(self, name, parameters, precondition, effect):
+        """
+        Initialise the action schema.
+
+        :param name: name of the action
+        :param parameters: list of (variable, type) of the parameters
+        :param precondition: list of (positive, atom) literals, where an atom
+                             is a tuple of the predicate and its arguments and
+                             '=' is the equality predicate
+        :param effect: list of (positive, atom) literals
+        """
+        self.name = name
+        self.parameters = parameters
+        self.precondition = precondition
+        self.effect = effect
+
+
+class Domain:
+    """A PDDL domain."""
+
+
+    def __init__(self, name, types, predicates, constants, actions):
+        """
+        Initialise the domain.
+
+        :param name: name of the domain
+        :param types: dictionary of type to parent type
+        :param predicates: dictionary of predicate to number of arguments
+        :param constants: dictionary of constant to type
+        :param actions: list of action schemas
+        """
+        self.name = name
+        self.types = types
+        self.predicates = predicates
+        self.constants = constants
+        self.actions = actions
+
+
+class Problem:
+    """A PDDL problem."""
+
+
+    def __init__(self, name, objects, init, goal):
+        """
+        Initialise the problem.
+
+        :param name: name of the problem
+        :param objects: dictionary of object to type
+        :param init: list of atoms which are true initially
+        :param goal: list of atoms which must be true in the end
+        """
+        self.name = name
+        self.objects = objects
+        self.init = init
+        self.goal = goal
+
+
+class GroundAction:
+    """
+    An action with its parameters bound to objects, whose literals are
+    bitsets of fact indices.
+    """
+
+
+    def __init__(self, name, args, pre, negPre, add, delete):
+        """
+        Initialise the ground action.
+
+        :param name: name of the action
+        :param args: tuple of the objects bound to its parameters
+        :param pre: bitset of the facts which must be true
+        :param negPre: bitset of the facts which must be false
+        :param add: bitset of the facts made true
+        :param delete: bitset of the facts made false, unless also added
+        """
+        self.name = name
+        self.args = args
+        self.pre = pre
+        self.negPre = negPre
+        self.add = add
+        self.delete = delete & ~add
+
+
+    def applicable(self, state):
+        """
+        Check if the action is applicable in a state.
+
+        :param state: bitset of the true facts
+        :return: True if the preconditions hold
+        """
+        return (state & self.pre == self.pre) and not (state & self.negPre)
+
+
+    def apply(self, state):
+        """
+        Get the state after applying the action.
+
+        :param state: bitset of the true facts
+        :return: bitset of the true facts after the action
+        """
+        return (state & ~self.delete) | self.add
+
+
+    def __repr__(self):
+        return f'({" ".join((self.name,) + self.args)})'
+
+
+class Task:
+    """A grounded planning task over bitset states."""
+
+
+    def __init__(self, facts, actions, init, goal):
+        """
+        Initialise the task and index the actions by the facts they add and
+        require.
+
+        :param facts: list of the atoms, each the fact of its index
+        :param actions: list of ground actions
+        :param init: bitset of the initial facts
+        :param goal: bitset of the goal facts
+        """
+        self.facts = facts
+        self.factIndex = {fact: i for i, fact in enumerate(facts)}
+        self.actions = actions
+        self.init = init
+        self.goal = goal
+
+        # bitsets as rows of 64 bit words, to test all actions at once
+        self.numWords = max(1, -(-len(facts) // 64))
+        self.preWords = np.array([self.words(action.pre) for action in actions], dtype=np.uint64).reshape(-1, self.numWords)
+        self.negPreWords = np.array([self.words(action.negPre) for action in actions], dtype=np.uint64).reshape(-1, self.numWords)
+        self.addWords = np.array([self.words(action.add) for action in actions], dtype=np.uint64).reshape(-1, self.numWords)
+        self.goalWords = self.words(goal)
+
+        self.preFacts = [bits(action.pre) for action in actions]
+        achievers = [[] for fact in facts]
+        for i, action in enumerate(actions):
+            for fact in bits(action.add):
+                achievers[fact].append(i)
+        self.achievers = achievers
+
+
+    def words(self, bitset):
+        """
+        Split a bitset into 64 bit words.
+
+        :param bitset: bitset of facts
+        :return: array of the words, least significant first
+        """
+        return np.frombuffer(bitset.to_bytes(self.numWords * 8, 'little'), dtype=np.uint64)
+
+
+    def factMask(self, words):
+        """
+        Get the facts of a bitset split into words.
+
+        :param words: array of the words of the bitset
+        :return: boolean array of whether each fact is in the bitset
+        """
+        return np.unpackbits(words.view(np.uint8), bitorder='little')[:len(self.facts)].astype(bool)
+
+
+    def applicable(self, state):
+        """
+        Get the actions applicable in a state.
+
+        :param state: bitset of the true facts
+        :return: array of the indices of the applicable actions
+        """
+        words = self.words(state)
+        return np.flatnonzero(((self.preWords & ~words) == 0).all(axis=1) &
+                              ((self.negPreWords & words) == 0).all(axis=1))
+
+
+    def state(self, atoms):
+        """
+        Get the bitset of atoms, ignoring atoms which are not facts of the task.
+
+        :param atoms: iterable of atoms
+        :return: bitset of the atoms
+        """
+        state = 0
+        for atom in atoms:
+            i = self.factIndex.get(tuple(atom))
+            if i is not None:
+                state |= 1 << i
+        return state
+
+
+    def atoms(self, state):
+        """
+        Get the atoms of a bitset.
+
+        :param state: bitset of facts
+        :return: list of the atoms
+        """
+        return [self.facts[i] for i in bits(state)]
+
+
+    def validate(self, plan, state=None):
+        """
+        Check if a plan reaches the goal.
+
+        :param plan: list of ground actions
+        :param state: bitset of the start state, by default the initial state
+        :return: True if every action is applicable in turn and the goal holds
+                 at the end
+        """
+        state = self.init if state is None else state
+        for action in plan:
+            if not action.applicable(state):
+                return False
+            state = action.apply(state)
+        return state & self.goal == self.goal
+
+
+def bits(bitset):
+    """
+    Get the indices of the set bits.
+
+    :param bitset: non-negative integer
+    :return: list of the indices in increasing order
+    """
+    indices = []
+    while bitset:
+        low = bitset & -bitset
+        indices.append(low.bit_length() - 1)
+        bitset ^= low
+    return indices
+
+
+def popcount(bitset):
+    """
+    Count the set bits, as int.bit_count does from Python 3.10 on.
+
+    :param bitset: non-negative integer
+    :return: number of set bits
+    """
+    return bin(bitset).count('1')
+
+
+def tokenize(text):
+    """
+    Parse PDDL text into nested lists of lower case tokens, dropping comments.
+
+    :param text: PDDL text
+    :return: nested list of the outermost expression
+    :raise ValueError: if the parentheses are unbalanced
+    """
+    tokens = re.findall(r'\(|\)|[^\s()]+', re.sub(r';[^\n]*', '', text).lower())
+    stack = [[]]
+    for token in tokens:
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            if len(stack) == 1:
+                raise ValueError('Unbalanced parentheses in PDDL')
+            expr = stack.pop()
+            stack[-1].append(expr)
+        else:
+            stack[-1].append(token)
+
+    if (len(stack) != 1) or (len(stack[0]) != 1):
+        raise ValueError('Expected one PDDL expression with balanced parentheses')
+    return stack[0][0]
+
+
+def typedList(tokens):
+    """
+    Parse a PDDL typed list, e.g. 'a b - block c' or the loosely written
+    'a -block'.
+
+    :param tokens: list of tokens
+    :return: list of (name, type), with type object when not given
+    """
+    typed = []
+    untyped = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == '-':
+            typed += [(name, tokens[i + 1]) for name in untyped]
+            untyped = []
+            i += 2
+        elif token.startswith('-'):
+            typed += [(name, token[1:]) for name in untyped]
+            untyped = []
+            i += 1
+        else:
+            untyped.append(token)
+            i += 1
+
+    return typed + [(name, OBJECT_TYPE) for name in untyped]
+
+
+def literals(expr):
+    """
+    Parse a PDDL conjunction of literals.
+
+    :param expr: nested list of an atom, a negated atom or a conjunction
+    :return: list of (positive, atom) literals
+    :raise ValueError: if the expression is not a conjunction of literals
+    """
+    if not expr:
+        return []
+    if expr[0] == 'and':
+        return [literal for part in expr[1:] for literal in literals(part)]
+    if expr[0] == 'not':
+        return [(not positive, atom) for (positive, atom) in literals(expr[1])]
+    if any(isinstance(arg, list) for arg in expr):
+        raise ValueError(f'Expected a conjunction of literals, but got: {expr[0]}')
+    return [(True, tuple(expr))]
+
+
+def parseDomain(text):
+    """
+    Parse a PDDL domain of STRIPS actions with typing, negative preconditions
+    and equality.
+
+    :param text: PDDL text of the domain
+    :return: the domain
+    :raise ValueError: if the text is not a supported PDDL domain
+    """
+    expr = tokenize(text)
+    if expr[:1] != ['define'] or expr[1][0] != 'domain':
+        raise ValueError('Expected a PDDL domain definition')
+
+    types = {}
+    predicates = {}
+    constants = {}
+    actions = []
+    for section in expr[2:]:
+        if section[0] == ':types':
+            for name, parent in typedList(section[1:]):
+                types[name] = parent
+        elif section[0] == ':predicates':
+            for predicate in section[1:]:
+                predicates[predicate[0]] = len(typedList(predicate[1:]))
+        elif section[0] == ':constants':
+            constants.update(typedList(section[1:]))
+        elif section[0] == ':action':
+            fields = dict(zip(section[2::2], section[3::2]))
+            actions.append(Action(section[1], typedList(fields.get(':parameters', [])),
+                                  literals(fields.get(':precondition', [])),
+                                  literals(fields.get(':effect', []))))
+
+    return Domain(expr[1][1], types, predicates, constants, actions)
+
+
+def parseProblem(text):
+    """
+    Parse a PDDL problem with a conjunctive goal of atoms.
+
+    :param text: PDDL text of the problem
+    :return: the problem
+    :raise ValueError: if the text is not a supported PDDL problem
+    """
+    expr = tokenize(text)
+    if expr[:1] != ['define'] or expr[1][0] != 'problem':
+        raise ValueError('Expected a PDDL problem definition')
+
+    objects = {}
+    init = []
+    goal = []
+    for section in expr[2:]:
+        if section[0] == ':objects':
+            objects.update(typedList(section[1:]))
+        elif section[0] == ':init':
+            init = [tuple(atom) for atom in section[1:]]
+        elif section[0] == ':goal':
+            goal = literals(section[1])
+            if not all(positive for positive, atom in goal):
+                raise ValueError('Expected a goal of atoms')
+            goal = [atom for positive, atom in goal]
+
+    return Problem(expr[1][1], objects, init, goal)
+
+
+def isType(objType, ofType, types):
+    """
+    Check if a type is a given type or derives from it.
+
+    :param objType: type of an object
+    :param ofType: type it should be
+    :param types: dictionary of type to parent type
+    :return: True if objType is ofType or a subtype of it
+    """
+    while objType != ofType:
+        if objType == OBJECT_TYPE:
+            return ofType == OBJECT_TYPE
+        objType = types.get(objType, OBJECT_TYPE)
+    return True
+
+
+def ground(domain, problem):
+    """
+    Ground the actions of a problem into bitset actions over the facts
+    reachable from the initial state, ignoring deletes.
+
+    :param domain: the domain
+    :param problem: the problem
+    :return: the grounded task
+    """
+    objects = {**domain.constants, **problem.objects}
+    facts = {}
+    index = lambda atom: facts.setdefault(atom, len(facts))
+
+    candidates = []
+    for schema in domain.actions:
+        domains = [[obj for obj, objType in objects.items() if isType(objType, paramType, domain.types)]
+                   for (param, paramType) in schema.parameters]
+        variables = [param for (param, paramType) in schema.parameters]
+
+        for args in itertools.product(*domains):
+            binding = dict(zip(variables, args))
+            bind = lambda atom: (atom[0],) + tuple(binding.get(arg, arg) for arg in atom[1:])
+
+            literalsOk = True
+            pre = []
+            negPre = []
+            for positive, atom in schema.precondition:
+                atom = bind(atom)
+                if atom[0] == '=':
+                    if (atom[1] == atom[2]) != positive:
+                        literalsOk = False
+                        break
+                else:
+                    (pre if positive else negPre).append(atom)
+            if literalsOk:
+                effect = [(positive, bind(atom)) for positive, atom in schema.effect]
+                candidates.append((schema.name, args, pre, negPre, effect))
+
+    # keep the actions whose preconditions are reachable ignoring deletes
+    reached = set(problem.init)
+    remaining = candidates
+    changed = True
+    while changed:
+        changed = False
+        pending = []
+        for candidate in remaining:
+            if all(atom in reached for atom in candidate[2]):
+                for positive, atom in candidate[4]:
+                    if positive and atom not in reached:
+                        reached.add(atom)
+                        changed = True
+            else:
+                pending.append(candidate)
+        remaining = pending
+
+    usable = [candidate for candidate in candidates if all(atom in reached for atom in candidate[2])]
+    for atom in problem.init:
+        index(atom)
+    for atom in sorted(reached):
+        index(atom)
+
+    actions = []
+    for name, args, pre, negPre, effect in usable:
+        mask = lambda atoms: sum(1 << index(atom) for atom in set(atoms))
+        actions.append(GroundAction(name, args, mask(pre),
+                                    mask(atom for atom in negPre if atom in reached),
+                                    mask(atom for positive, atom in effect if positive),
+                                    mask(atom for positive, atom in effect if not positive and atom in reached)))
+
+    goal = 0
+    for atom in problem.goal:
+        goal |= 1 << index(atom)
+    init = sum(1 << facts[atom] for atom in set(problem.init))
+
+    factList = [None] * len(facts)
+    for atom, i in facts.items():
+        factList[i] = atom
+    return Task(factList, actions, init, goal)
+
+
+def relaxedPlan(task, state, goal=None):
+    """
+    Compute the FF heuristic, the length of a plan ignoring deletes, and the
+    helpful actions, which are applicable and achieve a subgoal of the first
+    layer of that plan.
+
+    :param task: the grounded task
+    :param state: bitset of the true facts
+    :param goal: bitset of the goal facts, by default the goal of the task
+    :return: heuristic value (DEAD_END if the goal is unreachable) and array
+             of the indices of the helpful actions
+    """
+    goal = task.goal if goal is None else goal
+    goalWords = task.words(goal)
+
+    # layer each fact and action first appears in, building the planning graph
+    reached = task.words(state).copy()
+    factLayer = np.where(task.factMask(reached), 0, -1)
+    actionLayer = np.full(len(task.actions), -1)
+    layer = 0
+
+    while ((goalWords & ~reached) != 0).any():
+        fired = ((task.preWords & ~reached) == 0).all(axis=1) & (actionLayer < 0)
+        actionLayer[fired] = layer
+        added = np.bitwise_or.reduce(task.addWords[fired], axis=0) & ~reached
+        if not fired.any() or not added.any():
+            return DEAD_END, np.array([], dtype=np.intp)
+
+        layer += 1
+        factLayer[task.factMask(added)] = layer
+        reached |= added
+
+    # extract a relaxed plan backwards from the goal
+    goals = [[] for i in range(layer + 1)]
+    marked = task.factMask(goalWords).tolist()
+    for fact in bits(goal):
+        goals[factLayer[fact]].append(fact)
+
+    planned = set()
+    actionLayers = actionLayer.tolist()
+    factLayers = factLayer.tolist()
+    for current in range(layer, 0, -1):
+        for fact in goals[current]:
+            achiever = min((i for i in task.achievers[fact] if 0 <= actionLayers[i] < current),
+                           key=actionLayers.__getitem__)
+            if achiever in planned:
+                continue
+            planned.add(achiever)
+            for pre in task.preFacts[achiever]:
+                if not marked[pre]:
+                    marked[pre] = True
+                    goals[factLayers[pre]].append(pre)
+
+    # applicable actions achieving a subgoal of the first layer
+    subgoals = task.words(sum(1 << fact for fact in goals[1]) if layer else 0)
+    helpful = np.flatnonzero((actionLayer == 0) & ((task.addWords & subgoals) != 0).any(axis=1))
+    return len(planned), helpful
+
+
+def plan(task, state=None, goal=None, negGoal=0, maxExpansions=STD_MAX_EXPANSIONS):
+    """
+    Find a plan by greedy best-first search with the FF heuristic. Successors
+    are evaluated when expanded, and those reached by helpful actions are
+    expanded from a second open list, alternately or for a while after the
+    heuristic improves. A table of the reached states detects duplicates.
+
+    :param task: the grounded task
+    :param state: bitset of the start state, by default the initial state
+    :param goal: bitset of the goal facts, by default the goal of the task
+    :param negGoal: bitset of the facts which must be false in the end
+    :param maxExpansions: maximum number of expanded states
+    :return: list of ground actions reaching the goal, or None if there is no
+             plan or none is found in time
+    """
+    state = task.init if state is None else state
+    goal = task.goal if goal is None else goal
+    counter = itertools.count()
+
+    # open lists of (heuristic of parent, tie breaker, parent state, action index)
+    regular = [(0, next(counter), None, None)]
+    preferred = []
+    # table of the reached states to their parent state and action index
+    parents = {}
+    usePreferred = True
+    boost = 0
+    best = DEAD_END
+
+    for expansion in range(maxExpansions):
+        if not (regular or preferred):
+            return None
+        if preferred and (boost > 0 or usePreferred or not regular):
+            queue = preferred
+            boost -= 1
+        else:
+            queue = regular
+        usePreferred = not usePreferred
+
+        h, tie, parent, actionIndex = heapq.heappop(queue)
+        current = state if parent is None else task.actions[actionIndex].apply(parent)
+        if current in parents:
+            continue
+        parents[current] = (parent, actionIndex)
+
+        if (current & goal == goal) and not (current & negGoal):
+            steps = []
+            while parents[current][0] is not None:
+                current, actionIndex = parents[current]
+                steps.append(task.actions[actionIndex])
+            return steps[::-1]
+
+        h, helpful = relaxedPlan(task, current, goal)
+        if h == DEAD_END:
+            continue
+        if h < best:
+            best = h
+            boost += PREFERRED_BOOST
+
+        helpful = set(helpful.tolist())
+        for i in task.applicable(current).tolist():
+            entry = (h, next(counter), current, i)
+            heapq.heappush(preferred if i in helpful else regular, entry)
+
+    return None
+
+
+def canonical(atoms):
+    """
+    Get the canonical encoding of a set of atoms, independent of their order
+    and repetition.
+
+    :param atoms: iterable of atoms, each a sequence of lower case names
+    :return: sorted tuple of the distinct atoms as tuples
+    """
+    return tuple(sorted(set(tuple(atom) for atom in atoms)))
+
+
+def regress(task, steps, goal=None):
+    """
+    Regress a goal through a plan, getting the conditions under which each
+    suffix of the plan reaches the goal.
+
+    :param task: the grounded task
+    :param steps: list of ground actions
+    :param goal: bitset of the goal facts, by default the goal of the task
+    :return: list of (facts which must be true, facts which must be false)
+             bitsets for each suffix steps[i:], including the empty suffix,
+             or None for suffixes which never reach the goal
+    """
+    goal = task.goal if goal is None else goal
+    conditions = [None] * (len(steps) + 1)
+    conditions[-1] = (goal, 0)
+
+    for i in range(len(steps) - 1, -1, -1):
+        action = steps[i]
+        pos, neg = conditions[i + 1]
+        if (action.delete & pos) or (action.add & neg):
+            break
+        conditions[i] = ((pos & ~action.add) | action.pre, (neg & ~action.delete) | action.negPre)
+
+    return conditions
+
+
+def repair(task, steps, state, maxExpansions=STD_MAX_BRIDGE_EXPANSIONS):
+    """
+    Repair a plan after execution deviated from it. The shortest suffix of the
+    plan which still reaches the goal from the state is reused. If there is
+    none, a search bridges to the condition of the suffix which is quickest
+    to finish through, rated by how many of its facts are wrong.
+
+    :param task: the grounded task
+    :param steps: list of ground actions of the plan being executed
+    :param state: bitset of the true facts
+    :param maxExpansions: maximum number of expanded states of the bridging
+                          search
+    :return: list of ground actions reaching the goal, or None if the plan
+             cannot be repaired
+    """
+    conditions = regress(task, steps)
+    for i in range(len(steps), -1, -1):
+        if conditions[i] is not None:
+            pos, neg = conditions[i]
+            if (state & pos == pos) and not (state & neg):
+                return list(steps[i:])
+
+    # rate the suffixes by the number of their conditions not holding plus their length
+    rated = []
+    for i, condition in enumerate(conditions):
+        if condition is not None:
+            pos, neg = condition
+            rated.append((popcount(pos & ~state) + popcount(neg & state) + len(steps) - i, -i, condition))
+
+    cost, negIndex, (pos, neg) = min(rated)
+    bridge = plan(task, state, pos, neg, maxExpansions)
+    if bridge is None:
+        return None
+    return bridge + list(steps[-negIndex:])
+
+
+class Planner:
+    """
+    A planner of problems over a domain, which memoises grounded tasks and
+    the plans found, and repairs plans when execution deviates from them.
+    """
+
+
+    def __init__(self, domainText, maxPlans=STD_MAX_PLANS, maxExpansions=STD_MAX_EXPANSIONS):
+        """
+        Initialise the planner.
+
+        :param domainText: PDDL text of the domain
+        :param maxPlans: maximum number of memoised plan suffixes, the least
+                         recently used are forgotten first
+        :param maxExpansions: maximum number of expanded states per search
+        :raise ValueError: if the text is not a supported PDDL domain
+        """
+        self.domain = parseDomain(domainText)
+        self.maxPlans = maxPlans
+        self.maxExpansions = maxExpansions
+        # tasks by the canonical objects and goal
+        self._tasks = {}
+        # plans by task key and start state, to the plan and the offset of the suffix
+        self._plans = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def task(self, objects, atoms, goal):
+        """
+        Get a grounded task, reusing a task of the same objects and goal
+        whose facts include the atoms. Its facts are closed under the relaxed
+        actions, so every state reachable from the atoms is a state of it.
+
+        :param objects: dictionary of object to type
+        :param atoms: iterable of the true atoms
+        :param goal: iterable of the goal atoms
+        :return: (key, task), where the key is the canonical objects and goal
+        """
+        atoms = canonical(atoms)
+        key = (canonical(objects.items()), canonical(goal))
+        tasks = self._tasks.setdefault(key, [])
+        for task in tasks:
+            if all(atom in task.factIndex for atom in atoms):
+                return key, task
+
+        task = ground(self.domain, Problem(None, objects, list(atoms), list(key[1])))
+        tasks.append(task)
+        return key, task
+
+
+    def _remember(self, key, task, steps, state):
+        """
+        Memoise a plan and each of its suffixes by the state it starts from.
+
+        :param key: key of the task
+        :param task: the grounded task
+        :param steps: list of ground actions reaching the goal from the state
+        :param state: bitset of the true facts
+        """
+        steps = tuple(steps)
+        for offset in range(len(steps) + 1):
+            self._plans[(key, state)] = (steps, offset)
+            self._plans.move_to_end((key, state))
+            if offset < len(steps):
+                state = steps[offset].apply(state)
+
+        while len(self._plans) > self.maxPlans:
+            self._plans.popitem(last=False)
+
+
+    def plan(self, objects, atoms, goal):
+        """
+        Plan from the true atoms to the goal, returning a memoised plan when
+        the state was planned from, or passed through, before.
+
+        :param objects: dictionary of object to type
+        :param atoms: iterable of the true atoms
+        :param goal: iterable of the goal atoms
+        :return: list of ground actions reaching the goal, or None if no plan
+                 is found
+        """
+        atoms = canonical(atoms)
+        key, task = self.task(objects, atoms, goal)
+        state = task.state(atoms)
+
+        memo = self._plans.get((key, state))
+        if memo is not None:
+            self.hits += 1
+            self._plans.move_to_end((key, state))
+            steps, offset = memo
+            return list(steps[offset:])
+
+        self.misses += 1
+        steps = plan(task, state, maxExpansions=self.maxExpansions)
+        if steps is not None:
+            self._remember(key, task, steps, state)
+        return steps
+
+
+    def repair(self, objects, atoms, goal, steps):
+        """
+        Repair a plan after execution deviated from it, reusing the remaining
+        valid suffix of the plan and planning from scratch only if it cannot
+        be reached.
+
+        :param objects: dictionary of object to type
+        :param atoms: iterable of the true atoms
+        :param goal: iterable of the goal atoms
+        :param steps: list of the ground actions of the plan not executed yet
+        :return: list of ground actions reaching the goal, or None if no plan
+                 is found
+        """
+        atoms = canonical(atoms)
+        key, task = self.task(objects, atoms, goal)
+        state = task.state(atoms)
+
+        memo = self._plans.get((key, state))
+        if memo is not None:
+            self.hits += 1
+            self._plans.move_to_end((key, state))
+            memoSteps, offset = memo
+            return list(memoSteps[offset:])
+
+        # actions of another task are matched by name and arguments
+        actionIndex = {(action.name, action.args): action for action in task.actions}
+        steps = [actionIndex.get((action.name, action.args)) for action in steps]
+        repaired = None
+        if all(steps):
+            repaired = repair(task, steps, state)
+        if repaired is None:
+            return self.plan(objects, atoms, goal)
+
+        self.misses += 1
+        self._remember(key, task, repaired, state)
+        return repaired
+
+
+def solve(domainText, problemText, maxExpansions=STD_MAX_EXPANSIONS):
+    """
+    Parse, ground and solve a PDDL problem.
+
+    :param domainText: PDDL text of the domain
+    :param problemText: PDDL text of the problem
+    :param maxExpansions: maximum number of expanded states
+    :return: list of (action name, arguments) of the plan, or None if no plan
+             is found
+    """
+    task = ground(parseDomain(domainText), parseProblem(problemText))
+    steps = plan(task, maxExpansions=maxExpansions)
+    if steps is None:
+        return None
+    return [(action.name, action.args) for action in steps]
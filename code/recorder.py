@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+import error
+import lazy
+
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+np = lazy.module('numpy')
+
+
+# First bytes of a log file.
+MAGIC = b'STKLOG\x00\x01'
+
+# Kind of the record marking the end of the log.
+END = 0
+
+# Kind of a record of the JSON metadata of the log.
+META = 1
+
+# Kind of a record of a camera frame handed to the robot.
+FRAME = 2
+
+# Kind of a record of the ultrasonic distances handed to the robot.
+DISTANCES = 3
+
+# Kind of a record of a JSON motion or servo command issued by the robot.
+COMMAND = 4
+
+# Header of every record: kind, payload length in bytes and monotonic time.
+RECORD_HEADER = struct.Struct('<BxxxId')
+
+# Header of a frame payload: height, width and channels of the image.
+FRAME_HEADER = struct.Struct('<HHHxx')
+
+# Alignment of records in bytes, so that frames and distances can be viewed in place.
+ALIGNMENT = 8
+
+# Standard number of bytes the log file grows by when it is full.
+STD_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+# Log being recorded to, or None.
+_log = None
+
+
+class LogWriter:
+    """
+    An append-only log of records written through a memory map of its file,
+    which grows the file in chunks. Records are complete once written, so the
+    log can be read up to the last record even if recording is interrupted.
+    """
+
+
+    def __init__(self, path, chunkSize=STD_CHUNK_SIZE):
+        """
+        Create the log file, truncating an existing one.
+
+        :param path: path of the log file
+        :param chunkSize: number of bytes the file grows by when it is full
+        :raise ValueError: if chunkSize is not positive
+        """
+        error.checkPositive(chunkSize)
+
+        self.path = path
+        self.chunkSize = chunkSize
+        self._file = open(path, 'w+b')
+        self._capacity = 0
+        self._map = None
+        self._offset = 0
+        self._lock = threading.Lock()
+
+        self._reserve(len(MAGIC))
+        self._map[0:len(MAGIC)] = MAGIC
+        self._offset = len(MAGIC)
+
+
+    def _reserve(self, size):
+        """
+        Grow the file and remap it if it is too small for more bytes.
+
+        :param size: number of bytes to be appended
+        """
+        if self._offset + size <= self._capacity:
+            return
+
+        if self._map is not None:
+            self._map.close()
+        self._capacity += max(self.chunkSize, size)
+        os.ftruncate(self._file.fileno(), self._capacity)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+
+    def append(self, kind, payload, timestamp=None):
+        """
+        Append a record, or nothing if the log is closed, as recording may be
+        stopped while a frame or command is being recorded.
+
+        :param kind: kind of the record
+        :param payload: bytes-like payload, or a sequence of them which are
+                        concatenated
+        :param timestamp: monotonic time of the record, by default now
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        parts = [memoryview(part).cast('B') for part in (payload if isinstance(payload, (list, tuple)) else [payload])]
+        length = sum(part.nbytes for part in parts)
+        size = RECORD_HEADER.size + -(-length // ALIGNMENT) * ALIGNMENT
+
+        with self._lock:
+            if self._map is None:
+                return
+            self._reserve(size)
+            offset = self._offset + RECORD_HEADER.size
+            for part in parts:
+                self._map[offset:offset + part.nbytes] = part
+                offset += part.nbytes
+            # the header goes last, so that a partly written record ends the log
+            RECORD_HEADER.pack_into(self._map, self._offset, kind, length, timestamp)
+            self._offset += size
+
+
+    def close(self):
+        """
+        Flush the log and truncate its file to the records.
+        """
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            self._file.truncate(self._offset)
+            self._file.close()
+
+
+class LogReader:
+    """
+    A reader of a log through a memory map of its file. Frames and distances
+    are views of the map, so they are only valid until the reader is closed.
+    """
+
+
+    def __init__(self, path):
+        """
+        Open and index the log.
+
+        :param path: path of the log file
+        :raise ValueError: if the file is not a log
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'Expected a log file, but got: {path}')
+
+        # (kind, payload offset, payload length, monotonic time) of each record
+        self.index = []
+        offset = len(MAGIC)
+        while offset + RECORD_HEADER.size <= len(self._map):
+            kind, length, timestamp = RECORD_HEADER.unpack_from(self._map, offset)
+            # a log cut off while recording ends at its last complete record
+            if (kind == END) or (offset + RECORD_HEADER.size + length > len(self._map)):
+                break
+            self.index.append((kind, offset + RECORD_HEADER.size, length, timestamp))
+            offset += RECORD_HEADER.size + -(-length // ALIGNMENT) * ALIGNMENT
+
+
+    def close(self):
+        """
+        Close the log.
+        """
+        self._map.close()
+        self._file.close()
+
+
+    def _payload(self, kind, offset, length):
+        """
+        Decode the payload of a record.
+
+        :param kind: kind of the record
+        :param offset: offset of the payload in the file
+        :param length: length of the payload in bytes
+        :return: BGR image of a frame, array of distances, or dictionary of
+                 metadata or a command
+        """
+        if kind == FRAME:
+            height, width, channels = FRAME_HEADER.unpack_from(self._map, offset)
+            image = np.frombuffer(self._map, dtype=np.uint8, count=length - FRAME_HEADER.size,
+                                  offset=offset + FRAME_HEADER.size)
+            return image.reshape((height, width, channels) if channels > 1 else (height, width))
+        if kind == DISTANCES:
+            return np.frombuffer(self._map, dtype=np.float64, count=length // 8, offset=offset)
+        return json.loads(bytes(self._map[offset:offset + length]))
+
+
+    def records(self, *kinds):
+        """
+        Iterate over the records of given kinds in the order they were written.
+
+        :param kinds: kinds of the records, or none for all records
+        :return: iterator of (kind, monotonic time, payload)
+        """
+        for kind, offset, length, timestamp in self.index:
+            if (not kinds) or (kind in kinds):
+                yield kind, timestamp, self._payload(kind, offset, length)
+
+
+    def meta(self):
+        """
+        Get the metadata of the log.
+
+        :return: dictionary of the metadata, empty if there is none
+        """
+        for kind, timestamp, payload in self.records(META):
+            return payload
+        return {}
+
+
+    def duration(self):
+        """
+        Get the time between the first and last record.
+
+        :return: number of seconds
+        """
+        if not self.index:
+            return 0
+        return self.index[-1][3] - self.index[0][3]
+
+
+def start(path, **meta):
+    """
+    Start recording the frames and distances handed to the robot and the
+    commands it issues.
+
+    :param path: path of the log file
+    :param meta: metadata of the log, e.g. the entity searched for
+    """
+    global _log
+    stop()
+    log = LogWriter(path)
+    log.append(META, json.dumps(meta).encode())
+    _log = log
+
+
+def stop():
+    """
+    Stop recording and close the log.
+    """
+    global _log
+    log, _log = _log, None
+    if log is not None:
+        log.close()
+
+
+def recording():
+    """
+    Check if recording, to skip preparing records.
+
+    :return: True if recording
+    """
+    return _log is not None
+
+
+def frame(timestamp, image):
+    """
+    Record a camera frame handed to the robot if recording.
+
+    :param timestamp: monotonic capture time
+    :param image: BGR image
+    """
+    log = _log
+    if log is not None:
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim > 2 else 1
+        log.append(FRAME, [FRAME_HEADER.pack(height, width, channels), image], timestamp)
+
+
+def distances(samples):
+    """
+    Record ultrasonic distances handed to the robot if recording.
+
+    :param samples: list of distances in metres
+    """
+    log = _log
+    if log is not None:
+        log.append(DISTANCES, np.asarray(samples, dtype=np.float64))
+
+
+def command(name, **fields):
+    """
+    Record a command issued by the robot if recording.
+
+    :param name: dotted command name, e.g. 'body.drive'
+    :param fields: numeric fields of the command
+    """
+    log = _log
+    if log is not None:
+        log.append(COMMAND, json.dumps({'name': name, **fields}).encode())
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+import error
+import hal
+import sim
+import recorder
+import benchmark
+from component import Component
+from camera import CameraService
+from ultrasonic import Ultrasonic
+from arm import Arm
+from head import Head
+from body import Body
+from motor import Motor
+from robot import Robot
+from entity import Entity
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+
+# Standard phases of Robot.searchPickup which are replayed.
+STD_PHASES = benchmark.PHASES
+
+# Names of the commands compared between a log and its replay. Arm commands
+# are left out, as the setpoints streamed depend on timing.
+COMPARED_COMMANDS = ['body.drive', 'body.stop', 'head.view']
+
+# Decimal places which command fields are compared to.
+PRECISION = 6
+
+# Robot periods which only let the real world settle, skipped in fast replays.
+SETTLE_PERIODS = ['SETTLE_TIME', 'CLOSE_TIME']
+
+# Controller periods which only let the real world settle, skipped in fast replays.
+CONTROLLER_PERIODS = ['SERVO_TIME', 'SERVO_SETTLE_TIME', 'EXPOSURE_TIME']
+
+
+class ReplayCamera(Component):
+    """
+    A camera handing out the frames of a log in the order the robot was
+    handed them, without waiting.
+    """
+
+
+    def __init__(self, log, realTime=False):
+        """
+        Initialise the camera.
+
+        :param log: LogReader of the log
+        :param realTime: whether frames are handed out no sooner after the
+                         first frame than they were recorded
+        """
+        self.status = False
+        self.log = log
+        self.realTime = realTime
+        self.count = 0
+        self._frames = iter(())
+        self._start = None
+
+
+    def setup(self):
+        """
+        Start from the first frame of the log.
+        """
+        self._frames = self.log.records(recorder.FRAME)
+        self.count = 0
+        self._start = None
+        self.status = True
+
+
+    def cleanup(self):
+        """
+        Stop handing out frames.
+        """
+        self.status = False
+
+
+    def latest(self):
+        """
+        Get the next frame of the log.
+
+        :return: (monotonic time, BGR image) or None if the log has no more
+                 frames
+        :raise ValueError: if the camera is off
+        """
+        error.checkComponent(self, 'Camera')
+
+        record = next(self._frames, None)
+        if record is None:
+            return None
+        self.count += 1
+
+        if self.realTime:
+            if self._start is None:
+                self._start = (time.monotonic(), record[1])
+            delay = self._start[0] + record[1] - self._start[1] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return time.monotonic(), record[2]
+
+
+    def nextAfter(self, timestamp, timeout=CameraService.STD_TIMEOUT):
+        """
+        Get the next frame of the log.
+
+        :param timestamp: ignored, as every frame of the log is new
+        :param timeout: ignored, as frames are not waited for
+        :return: (monotonic time, BGR image)
+        :raise ValueError: if the camera is off
+        :raise TimeoutError: if the log has no more frames
+        """
+        frame = self.latest()
+        if frame is None:
+            raise TimeoutError('No more camera frames in the log')
+        return frame
+
+
+class ReplayUltrasonic(Ultrasonic):
+    """
+    An ultrasonic sensor handing out the distances of a log in the order the
+    robot was handed them, without waiting.
+    """
+
+
+    def __init__(self, log, trigPin, echoPin):
+        """
+        Initialise the sensor.
+
+        :param log: LogReader of the log
+        :param trigPin: GPIO number of the trigger pin, which is not used
+        :param echoPin: GPIO number of the echo pin, which is not used
+        :raise ValueError: if trigPin or echoPin is outside of GPIO numbering
+        """
+        super().__init__(trigPin, echoPin)
+
+        self.log = log
+        self._logged = iter(())
+
+
+    def setup(self):
+        """
+        Start from the first distances of the log.
+        """
+        self._logged = self.log.records(recorder.DISTANCES)
+        self.status = True
+
+
+    def cleanup(self):
+        """
+        Stop handing out distances.
+        """
+        self.status = False
+
+
+    def _waitSamples(self, number, since, timeout):
+        """
+        Get the next distances of the log.
+
+        :param number: ignored, as the logged distances are handed out as is
+        :param since: ignored, as every distance of the log is new
+        :param timeout: ignored, as distances are not waited for
+        :return: list of distances, empty if the log has no more distances
+        """
+        record = next(self._logged, None)
+        samples = [] if record is None else [float(dist) for dist in record[2]]
+
+        recorder.distances(samples)
+        return samples
+
+
+class ReplayBody(Body):
+    """
+    A body whose motions are over as soon as they are commanded, as the
+    frames of the log already show where they led.
+    """
+
+
+    def _command(self, left_dc, right_dc, duration, token):
+        """
+        Drive the motors with given duty cycles, ending the motion at once.
+
+        :param left_dc: duty cycle of the left motor, negative backwards
+        :param right_dc: duty cycle of the right motor, negative backwards
+        :param duration: number of seconds of movement, or None
+        :param token: threading.Event stopping the movement when set, or None
+        :return: Motion handle of the movement, which is over
+        :raise ValueError: if left or right motor is off, or duration is not
+                           positive
+        """
+        motion = super()._command(left_dc, right_dc, duration, token)
+        motion._done.set()
+        return motion
+
+
+def commands(log):
+    """
+    Get the compared commands of a log.
+
+    :param log: LogReader of the log
+    :return: list of (name, fields) of the commands, with rounded fields
+    """
+    result = []
+    for kind, timestamp, payload in log.records(recorder.COMMAND):
+        name = payload.pop('name')
+        if name in COMPARED_COMMANDS:
+            fields = {key: round(val, PRECISION) if isinstance(val, float) else val for key, val in payload.items()}
+            result.append((name, fields))
+    return result
+
+
+def replay(path, phases=None, realTime=False):
+    """
+    Run the phases of a search against the frames and distances of its log,
+    recording the commands issued.
+
+    :param path: path of the log of the search
+    :param phases: names of the Robot methods run one after another, by
+                   default the phases in the log metadata
+    :param realTime: whether to wait the settling periods of the robot and
+                     hand out frames at their recorded times, as on the real
+                     robot, which tracked and pipelined searches depend on
+    :return: dictionary of the replay time, the log duration, the number of
+             frames replayed, the phase results, and the index of the first
+             command which differs from the log (None if none does)
+    """
+    log = recorder.LogReader(path)
+    previous = hal.backend()
+    try:
+        return _replay(log, phases, realTime)
+    finally:
+        # the frames of the log are views of its map, closed once replayed
+        log.close()
+        hal.use(previous)
+
+
+def _replay(log, phases, realTime):
+    """
+    Replay a search against its open log, using the simulated hardware.
+
+    :param log: LogReader of the log of the search
+    :param phases: names of the Robot methods run one after another, or None
+                   for the phases in the log metadata
+    :param realTime: whether to replay in real time
+    :return: dictionary summarising the replay, as returned by replay
+    """
+    meta = log.meta()
+    entity = Entity[meta.get('entity', Entity.RED.name)]
+    phases = phases or meta.get('phases', STD_PHASES)
+
+    # the simulated hardware takes the commands, the scene itself is not seen
+    scene = sim.Scene(entity, 1, 0, benchmark.LEFT_PINS, benchmark.RIGHT_PINS, *benchmark.ULTRA_PINS,
+                      benchmark.VIEW_CHANNEL, benchmark.ARM_CHANNELS[3])
+    hal.use(sim.SimBackend(scene))
+
+    camera = ReplayCamera(log, realTime)
+    bodyClass = Body if realTime else ReplayBody
+    body = bodyClass(Body.MAX_MOTOR_DC, Motor(*benchmark.LEFT_PINS), Motor(*benchmark.RIGHT_PINS))
+    arm = Arm(*benchmark.ARM_CHANNELS)
+    head = Head(benchmark.VIEW_CHANNEL, ReplayUltrasonic(log, *benchmark.ULTRA_PINS), camera=camera)
+    robot = Robot(head, body, arm, meta.get('roi', False),
+                  meta.get('farLevel', Robot.FAR_LEVEL), meta.get('closeLevel', Robot.CLOSE_LEVEL),
+                  meta.get('track', False), meta.get('servo'), meta.get('pipeline', 0))
+    if not realTime:
+        for period in SETTLE_PERIODS:
+            setattr(robot, period, 0)
+        for period in CONTROLLER_PERIODS:
+            setattr(robot.controller, period, 0)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        replayPath = os.path.join(directory, 'replay.log')
+        recorder.start(replayPath, **meta)
+        robot.setup()
+        try:
+            start = time.perf_counter()
+            for phase in phases:
+                try:
+                    results[phase] = getattr(robot, phase)(entity)
+                except TimeoutError:
+                    # the robot asked for more frames than it was handed
+                    results[phase] = None
+                    break
+            total = time.perf_counter() - start
+        finally:
+            robot.cleanup()
+            recorder.stop()
+
+        replayLog = recorder.LogReader(replayPath)
+        logged, replayed = commands(log), commands(replayLog)
+        replayLog.close()
+
+    diverged = next((i for i, (a, b) in enumerate(zip(logged, replayed)) if a != b), None)
+    if (diverged is None) and (len(logged) != len(replayed)):
+        diverged = min(len(logged), len(replayed))
+
+    summary = {'time': total, 'duration': log.duration(), 'frames': camera.count,
+               'results': results, 'diverged': diverged}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded searches and compare the commands issued.')
+    parser.add_argument('logs', nargs='+', help='log files recorded by benchmark.py --record or recorder.start')
+    parser.add_argument('--phases', nargs='+', choices=STD_PHASES, help='phases to replay, by default the recorded ones')
+    parser.add_argument('--real-time', action='store_true', help='wait the settling periods of the robot and hand out frames as recorded, needed by tracked and pipelined searches')
+    args = parser.parse_args()
+
+    failed = 0
+    for path in args.logs:
+        summary = replay(path, args.phases, args.real_time)
+        match = 'same commands' if summary['diverged'] is None else f'commands differ from #{summary["diverged"]}'
+        print(f'{path}: {summary["frames"]} frames in {summary["time"]:.3f} s '
+              f'(recorded {summary["duration"]:.3f} s), {summary["results"]}, {match}')
+        failed += summary['diverged'] is not None
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
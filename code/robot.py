@@ -1,27 +1,25 @@
 # -*- coding: utf-8 -*-
 
 import error
+import lazy
 from component import Component
-import inverse_kinematics as ik
 from arm import Arm
-from head import Head
+from head import Head, RoiFinder
 import head
-from entity import Entity
-from direction import Direction
+from controller import AsyncRobot
+from pipeline import VisionPipeline
+import visual_servo
 
-import math
-import time
-from picamera.array import PiRGBArray
-from picamera import PiCamera
-import cv2
-import numpy as np
+ik = lazy.module('inverse_kinematics')
+asyncio = lazy.module('asyncio')
+cv2 = lazy.module('cv2')
 
 class Robot(Component):
     """A class for controlling the robot."""
 
 
-    # Time for grabber to open
-    OPEN_TIME = 0.5
+    # Time for the arm to settle after reaching an object
+    SETTLE_TIME = 0.2
 
     # Time for grabber to grab
     CLOSE_TIME = 1
@@ -42,6 +40,10 @@ class Robot(Component):
     # if object is within center view for faraway find.
     FAR_THRESH_DIV = 5
 
+    # Image pyramid level processed in faraway search (160x120 pixels), as
+    # only a coarse bearing of the object is needed.
+    FAR_LEVEL = 2
+
     # Duration of movement per camera frame in faraway entity search.
     FAR_MOVE_TIME = 0.2
 
@@ -49,9 +51,6 @@ class Robot(Component):
     # center view for faraway search.
     FAR_VIEW_DIFF = 5
 
-    # Readjustment period for camera after search movement for faraway search.
-    FAR_REF_TIME = 0.5
-
     # The divisor of image width or height in pixels to determine
     # if object is within center view for faraway find.
     CLOSE_THRESH_DIV = 6
@@ -63,22 +62,54 @@ class Robot(Component):
     # center view for faraway search.
     CLOSE_VIEW_DIFF = 3
 
-    # Readjustment period for camera after search movement for faraway search.
-    CLOSE_REF_TIME = 1
+    # Image pyramid level processed in close search (full resolution).
+    CLOSE_LEVEL = 0
+
+    # Highest image pyramid level (40x30 pixels).
+    MAX_LEVEL = 4
 
 
-    def __init__(self, head, body, arm):
+    def __init__(self, head, body, arm, roi=False, farLevel=FAR_LEVEL, closeLevel=CLOSE_LEVEL, track=False,
+                 servo=None, pipeline=0):
         """
         Initialise the robot components
 
         :param head: robot head component
         :param body: robot body component
         :param arm: robot arm component
+        :param roi: whether searches only process a window around the last
+                    object found, falling back to the whole image
+        :param farLevel: image pyramid level of faraway search
+        :param closeLevel: image pyramid level of close search
+        :param track: whether searches track the object with a Kalman filter,
+                      acting on every camera frame instead of waiting for the
+                      robot to settle
+        :param servo: name of the gain preset of the visual servo, which
+                      scales turns and head tilts with the offset of the
+                      object, or None for fixed turns and tilts
+        :param pipeline: number of processes segmenting camera frames in a
+                         VisionPipeline, or 0 to segment them in the search
+                         itself; searches by window do not use the pipeline
+        :raise ValueError: if farLevel or closeLevel is not between 0 and MAX_LEVEL,
+                           servo is not a gain preset or pipeline is negative
         """
+        error.checkInRange(farLevel, 0, self.MAX_LEVEL)
+        error.checkInRange(closeLevel, 0, self.MAX_LEVEL)
+        if (servo is not None) and (servo not in visual_servo.GAIN_PRESETS):
+            raise ValueError(f'Expected a gain preset of {list(visual_servo.GAIN_PRESETS)}, but got: {servo}')
+        error.checkInRange(pipeline, 0, float('inf'))
+
         self.status = False
         self.head = head
         self.body = body
         self.arm = arm
+        self.roiFinder = RoiFinder() if roi else None
+        self.farLevel = farLevel
+        self.closeLevel = closeLevel
+        self.tracking = track
+        self.servoGains = None if servo is None else visual_servo.GAIN_PRESETS[servo]
+        self.pipeline = VisionPipeline(head.camera, pipeline) if pipeline and not roi else None
+        self.controller = AsyncRobot(self)
 
 
     def setup(self):
@@ -89,6 +120,8 @@ class Robot(Component):
             self.head.setup()
         if not self.arm.status:
             self.arm.setup()
+        if (self.pipeline is not None) and (not self.pipeline.status):
+            self.pipeline.setup()
         self.body.setup()
         self.status = True
 
@@ -97,6 +130,8 @@ class Robot(Component):
         """
         Cleanup all the robots components.
         """
+        if self.pipeline is not None:
+            self.pipeline.cleanup()
         self.head.cleanup()
         self.body.cleanup()
         self.arm.cleanup()
@@ -108,229 +143,100 @@ class Robot(Component):
         Pickup an object far away from the robot and/or behind it.
 
         :param entity: the entity to be picked up
-        :param numTries: the total number of tries for all action parts
+        :return: True if the pick up succeeded, otherwise False
         """
-        error.checkComponent(self, 'Robot')
-        error.checkType(entity, Entity, 'entity', 'Entity')
-        
-        farFound = self.farFind(entity)
-        time.sleep(5)
-        closeFound = self.closeFind(entity)
-        time.sleep(5)
-        pickupDone = self.pickup(entity)
-        return pickupDone
+        return asyncio.run(self.controller.searchPickup(entity))
 
 
     def pickup(self, entity):
         """
         Pick up an object close to the front of the robot.
 
+        :param entity: the entity to be picked up
         :return: True if the pick up succeeded in time, otherwise False
         """
-        error.checkComponent(self, 'Robot')
-        error.checkType(entity, Entity, 'entity', 'Entity')
+        return asyncio.run(self.controller.pickup(entity))
+
+
+    def farFind(self, entity, timeLim=10):
+        """
+        Turn and drive towards a faraway object until it is close.
+
+        :param entity: the entity searched for
+        :param timeLim: number of seconds to search without the object in view
+        :return: True if the object is close, False if it is not found in time
+        """
+        return asyncio.run(self.controller.farFind(entity, timeLim))
+
+
+    def closeFind(self, entity, timeLim = 15):
+        """
+        Turn and drive until a close object is within reach of the arm.
 
-        objPos = self.head.objPos()
-        angles = ik.calcAngles(objPos)
-        if angles:
-            shoulderAngle, elbowAngle = angles
+        :param entity: the entity searched for
+        :param timeLim: number of seconds to search for
+        :return: True if the object is within reach, False if not in time
+        """
+        return asyncio.run(self.controller.closeFind(entity, timeLim))
 
-            if (Arm.SHOULDER_MIN_DOM <= shoulderAngle <= Arm.SHOULDER_MAX_DOM) and (Arm.ELBOW_MIN_DOM <= elbowAngle <= Arm.ELBOW_MAX_DOM):
-                # open
-                self.arm.planGrabber(Arm.MIN_ANGLE)
-                self.arm.executePlan()
-                time.sleep(self.OPEN_TIME)
 
-                # position
-                self.arm.planShoulder(shoulderAngle)
-                self.arm.planElbow(elbowAngle)
-                self.arm.executePlan()
-                time.sleep(self.CLOSE_TIME)
+    def reachAngles(self, objPos):
+        """
+        Get the shoulder and elbow angles for the arm to reach an object,
+        trying both inverse kinematics solutions against the arm angle domains.
 
-                # close
-                self.arm.planGrabber(Arm.GRABBER_DOM)
-                self.arm.executePlan()
-                time.sleep(self.CLOSE_TIME)
+        :param objPos: the cartesian coordinates of the object position
+                       relative to the shoulder axis in metres
+        :return: the shoulder angle and elbow angle in degrees, or None if the
+                 object is not reachable
+        """
+        angles, valid = ik.calcAnglesBatch([objPos],
+                                           (Arm.SHOULDER_MIN_DOM, Arm.SHOULDER_MAX_DOM),
+                                           (Arm.ELBOW_MIN_DOM, Arm.ELBOW_MAX_DOM))
+        if not valid[0].any():
+            return None
 
-                # position
-                self.arm.planShoulder(Arm.SHOULDER_MIN_DOM)
-                self.arm.planElbow(90)
-                self.arm.executePlan()
+        shoulderAngle, elbowAngle = angles[0, valid[0].argmax()]
+        return float(shoulderAngle), float(elbowAngle)
 
-                self.arm.planElbow(Arm.ELBOW_MAX_DOM)
-                self.arm.executePlan()
 
-                if not self.head.objCamProp(entity):
-                    return True
-        return False
+    def imageGeometry(self, level, threshDiv):
+        """
+        Get the image centre, the centre view thresholds and the object area
+        limits at an image pyramid level.
+
+        :param level: image pyramid level, each level halving the resolution
+        :param threshDiv: the divisor of image width or height to determine
+                          if the object is within center view
+        :return: dictionary of centerX, centerY, threshX and threshY in pixels,
+                 and minArea and maxArea in square pixels
+        """
+        scale = 2 ** level
+        return {'centerX' : self.CENTER_IMG_X // scale,
+                'centerY' : self.CENTER_IMG_Y // scale,
+                'threshX' : (Head.IMG_WIDTH // scale) // threshDiv,
+                'threshY' : (Head.IMG_HEIGHT // scale) // threshDiv,
+                'minArea' : self.MIN_AREA / scale ** 2,
+                'maxArea' : self.MAX_AREA / scale ** 2}
 
 
-    def farFind(self, entity, timeLim=10):
-        error.checkComponent(self, 'Robot')
-        error.checkType(entity, Entity, 'entity', 'Entity')
-
-        self.head.view = 0
-
-        with PiCamera() as camera:
-            camera.resolution = (Head.IMG_WIDTH, Head.IMG_HEIGHT)
-            camera.framerate = Head.FRAMERATE
-            rawCapture = PiRGBArray(camera, size=(Head.IMG_WIDTH, Head.IMG_HEIGHT))
-
-            inView = False
-            searchStart = time.time()
-
-            for frame in camera.capture_continuous(rawCapture, format="bgr", use_video_port=True):
-                image = frame.array
-                hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-                colMask = head.colourMask(hsv, entity)
-                objProp = head.findObjProp(colMask)
-
-                if objProp:
-                    print(objProp)
-                    if (objProp['area'] >= self.MIN_AREA) and (objProp['area'] < self.MAX_AREA):
-                        if not inView:
-                            print('found')
-                        inView = True
-
-                        # Too high
-                        if (objProp['y'] > self.CENTER_IMG_Y + (Head.IMG_HEIGHT // self.FAR_THRESH_DIV)) and (self.head.view != 0):
-                            self.head.view = self.head.view - min(self.FAR_VIEW_DIFF, self.head.view)
-                            print('down')
-
-                        # Too low
-                        elif objProp['y'] < self.CENTER_IMG_Y - (Head.IMG_HEIGHT // self.FAR_THRESH_DIV):
-                            diff = min(self.FAR_VIEW_DIFF, Head.VIEW_RNG - self.head.view)
-                            self.head.view = self.head.view + diff
-                            print('up')
-
-                            # If we get closer, the object will get out of view
-                            if math.isclose(self.head.view, Head.VIEW_RNG, abs_tol=1):
-                                print('Done')
-                                return True
-
-
-                        # Too left
-                        if objProp['x'] > self.CENTER_IMG_X + (Head.IMG_WIDTH // self.FAR_THRESH_DIV):
-                            self.body.move(self.FAR_MOVE_TIME, Direction.RIGHT)
-                            print('left')
-
-                        # Too right
-                        elif objProp['x'] < self.CENTER_IMG_X - (Head.IMG_WIDTH // self.FAR_THRESH_DIV):
-                            self.body.move(self.FAR_MOVE_TIME, Direction.LEFT)
-                            print('right')
-
-                        # Perfect horizontal view
-                        else:
-                            self.body.move(self.FAR_MOVE_TIME, Direction.FORWARD)
-                            print('forward')
-
-
-                    elif objProp['area'] < self.MIN_AREA:
-                        print('searching')
-                        if inView:
-                            # start searching again
-                            inView = False
-                            searchStart = time.time()
-                            print('lost')
-                        elif (time.time() - searchStart > timeLim):
-                            return False
-                        self.body.move(self.FAR_MOVE_TIME, Direction.LEFT)
-
-                    else:
-                        print('Done')
-                        return True
-
-                else:
-                    print('searching')
-                    if (not inView) and (time.time() - searchStart > timeLim):
-                        return False
-                    elif inView:
-                        # start searching again
-                        inView = False
-                        searchStart = time.time()
-                    self.body.move(self.FAR_MOVE_TIME, Direction.LEFT)
-
-                # readjust the camera
-                time.sleep(self.FAR_REF_TIME)
-                rawCapture.truncate(0)
+    def findObj(self, image, entity, level=0):
+        """
+        Find the properties of the object of an entity in a camera image,
+        in the window around the last object found if searching by window.
+
+        :param image: BGR camera image
+        :param entity: the entity of the object
+        :param level: image pyramid level the image is processed at, each
+                      level halving the resolution
+        :return: dictionary of the object properties in pixels of the level,
+                 or None if there is no object
+        """
+        image = head.pyramidLevel(image, level)
 
+        if self.roiFinder is not None:
+            return self.roiFinder.find(image, entity)
 
-    def closeFind(self, entity, timeLim = 15):
-        error.checkComponent(self, 'Robot')
-        error.checkType(entity, Entity, 'entity', 'Entity')
-
-        with PiCamera() as camera:
-            camera.resolution = (Head.IMG_WIDTH, Head.IMG_HEIGHT)
-            camera.framerate = Head.FRAMERATE
-            rawCapture = PiRGBArray(camera, size=(Head.IMG_WIDTH, Head.IMG_HEIGHT))
-
-            searchLeft = True
-            searchStart = time.time()
-
-            for frame in camera.capture_continuous(rawCapture, format="bgr", use_video_port=True):
-                if time.time() - searchStart > timeLim:
-                    return False
-
-                image = frame.array
-                hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-                colMask = head.colourMask(hsv, entity)
-                objProp = head.findObjProp(colMask)
-
-                if objProp:
-                    print(objProp)
-
-                        # Too high
-                    if (objProp['y'] > self.CENTER_IMG_Y + (Head.IMG_HEIGHT // self.CLOSE_THRESH_DIV)) and (self.head.view != 0):
-                        self.head.view = self.head.view - min(self.CLOSE_VIEW_DIFF, self.head.view)
-                        print('down')
-                        # Too low
-                    elif objProp['y'] < self.CENTER_IMG_Y - (Head.IMG_HEIGHT // self.CLOSE_THRESH_DIV):
-                        diff = min(self.CLOSE_VIEW_DIFF, Head.VIEW_RNG - self.head.view)
-                        self.head.view = self.head.view + diff
-                        print('up')
-                        # If we get closer, the object will get out of view
-                        if math.isclose(self.head.view, Head.VIEW_RNG, abs_tol=1):
-                            print('Done')
-                            return True
-
-                    # Too left
-                    if objProp['x'] > self.CENTER_IMG_X + (Head.IMG_WIDTH // self.CLOSE_THRESH_DIV):
-                        self.body.move(self.CLOSE_MOVE_TIME, Direction.RIGHT)
-                        print('left')
-                    # Too right
-                    elif objProp['x'] < self.CENTER_IMG_X - (Head.IMG_WIDTH // self.CLOSE_THRESH_DIV):
-                        self.body.move(self.CLOSE_MOVE_TIME, Direction.LEFT)
-                        print('right')
-                    else:
-                        objPos = self.head.objPos()
-                        # distance between shoulder axis and target
-                        tDist = round( math.sqrt(objPos[0]**2 + objPos[1]**2), ik.PRECISION)
-
-                        if tDist > ik.S_LEN + ik.E_LEN:
-                            self.body.move(self.CLOSE_MOVE_TIME, Direction.FORWARD)
-                            print('forward')
-                        elif tDist < ik.E_LEN - ik.S_LEN:
-                            self.body.move(self.CLOSE_MOVE_TIME, Direction.BACKWARD)
-                            print('backward')
-                        else:
-                            shoulderAngle, elbowAngle = ik.calcAngles(objPos)
-                            if (Arm.SHOULDER_MIN_DOM <= shoulderAngle <= Arm.SHOULDER_MAX_DOM) and (Arm.ELBOW_MIN_DOM <= elbowAngle <= Arm.ELBOW_MAX_DOM):
-                                print('Done')
-                                return True
-                            else:
-                                self.body.move(self.CLOSE_MOVE_TIME, Direction.FORWARD)
-                                print('forward')
-
-                else:
-                    print('searching')
-                    self.body.move(self.CLOSE_MOVE_TIME, Direction.BACKWARD)
-                    if searchLeft:
-                        self.body.move(self.CLOSE_MOVE_TIME, Direction.LEFT)
-                        searchLeft = False
-                    else:
-                        self.body.move(self.CLOSE_MOVE_TIME, Direction.RIGHT)
-                        searchLeft = True
-
-                # readjust the camera
-                time.sleep(self.CLOSE_REF_TIME)
-                rawCapture.truncate(0)
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        colMask = head.colourMask(hsv, entity)
+        return head.findObjProp(colMask)
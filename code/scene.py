@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import error
+import lazy
+import telemetry
+import head
+from head import Head
+from entity import Entity
+from classifier import labelMask
+from camera import CameraService
+
+import time
+cv2 = lazy.module('cv2')
+
+
+# Name of the table constant of the blocks-world domain.
+TABLE = 'table'
+
+# Type of the blocks of the blocks-world domain.
+BLOCK_TYPE = 'block'
+
+# Standard image pyramid level which frames are processed at, quartering the pixels.
+STD_LEVEL = 1
+
+# Maximum image pyramid level, at which blocks are still several pixels wide.
+MAX_LEVEL = 3
+
+# Standard minimum area in full-resolution pixels of a blob which is a block, smaller blobs are specks.
+STD_MIN_AREA = 200
+
+# Standard gap between stacked blocks relative to the height of the lower block.
+STD_MAX_GAP = 0.25
+
+# Standard horizontal overlap of stacked blocks relative to the narrower block.
+STD_MIN_OVERLAP = 0.5
+
+# Height to width ratio of a blob above which it is split into blocks of the same colour.
+SPLIT_ASPECT = 1.5
+
+
+def detectBlocks(labels, entities=tuple(Entity), minArea=STD_MIN_AREA):
+    """
+    Detect every block blob of a label image. Blocks are cubes, so a blob
+    which is several times taller than wide is a stack of blocks of the same
+    colour, which is split into equal parts.
+
+    :param labels: label image from a ColourClassifier
+    :param entities: the entities of the blocks
+    :param minArea: minimum area in pixels of a blob which is a block
+    :return: list of (entity, x, y, width, height) of the blocks
+    """
+    blocks = []
+    for entity in entities:
+        number, _, stats, _ = cv2.connectedComponentsWithStats(labelMask(labels, entity), connectivity=8)
+
+        # label 0 is the background
+        for x, y, w, h in stats[1:number, :4].tolist():
+            if w * h < minArea:
+                continue
+
+            parts = max(1, round(h / w)) if h > SPLIT_ASPECT * w else 1
+            for i in range(parts):
+                top = y + (h * i) // parts
+                blocks.append((entity, x, top, w, y + (h * (i + 1)) // parts - top))
+
+    return blocks
+
+
+def groupStacks(blocks, maxGap=STD_MAX_GAP, minOverlap=STD_MIN_OVERLAP):
+    """
+    Group blocks into stacks. A block is on the top block of a stack if it
+    overlaps it horizontally and its bottom edge meets the top edge of that
+    block. A block behind another one and touching it in the image is
+    indistinguishable from a block on it.
+
+    :param blocks: list of (entity, x, y, width, height) of the blocks
+    :param maxGap: gap between stacked blocks relative to the height of the
+                   lower block
+    :param minOverlap: horizontal overlap of stacked blocks relative to the
+                       narrower block
+    :return: list of the stacks from left to right, each a list of blocks from
+             the bottom up
+    """
+    stacks = []
+    # lowest bottom edges first, so every block is placed after the one it is on
+    for block in sorted(blocks, key=lambda block: block[2] + block[4], reverse=True):
+        entity, x, y, w, h = block
+        best = None
+        bestGap = None
+
+        for stack in stacks:
+            topEntity, topX, topY, topW, topH = stack[-1]
+            overlap = min(x + w, topX + topW) - max(x, topX)
+            gap = abs(topY - (y + h))
+            if (overlap >= minOverlap * min(w, topW)) and (gap <= maxGap * topH):
+                if (best is None) or (gap < bestGap):
+                    best = stack
+                    bestGap = gap
+
+        if best is None:
+            stacks.append([block])
+        else:
+            best.append(block)
+
+    return sorted(stacks, key=lambda stack: stack[0][1])
+
+
+def blockNames(stacks):
+    """
+    Name the blocks after their colours, numbering blocks of the same colour
+    from left to right, e.g. 'red', 'red2'.
+
+    :param stacks: list of the stacks from left to right
+    :return: list of the names of the blocks of each stack
+    """
+    counts = {}
+    names = [[None] * len(stack) for stack in stacks]
+    blocks = sorted((block[1], i, j) for i, stack in enumerate(stacks) for j, block in enumerate(stack))
+
+    for x, i, j in blocks:
+        colour = stacks[i][j][0].name.lower()
+        counts[colour] = counts.get(colour, 0) + 1
+        names[i][j] = colour if counts[colour] == 1 else f'{colour}{counts[colour]}'
+
+    return names
+
+
+def stackFacts(names):
+    """
+    Get the facts of the blocks-world domain describing stacks of blocks.
+
+    :param names: list of the names of the blocks of each stack, from the
+                  bottom up
+    :return: dictionary of object to type and list of the true atoms, in the
+             lower case names of the planner
+    """
+    objects = {}
+    atoms = []
+    for stack in names:
+        below = TABLE
+        for name in stack:
+            objects[name] = BLOCK_TYPE
+            atoms.append(('on', name, below))
+            below = name
+        atoms.append(('clear', below))
+
+    return objects, atoms
+
+
+def inferScene(image, level=STD_LEVEL, minArea=STD_MIN_AREA, maxGap=STD_MAX_GAP, minOverlap=STD_MIN_OVERLAP):
+    """
+    Infer the start state of the blocks-world domain from a single frame.
+
+    :param image: BGR image
+    :param level: image pyramid level which the image is processed at
+    :param minArea: minimum area in full-resolution pixels of a blob which is
+                    a block
+    :param maxGap: gap between stacked blocks relative to the height of the
+                   lower block
+    :param minOverlap: horizontal overlap of stacked blocks relative to the
+                       narrower block
+    :return: dictionary of object to type and list of the true atoms
+    """
+    labels = Head.CLASSIFIER.classify(cv2.cvtColor(head.pyramidLevel(image, level), cv2.COLOR_BGR2HSV))
+    stacks = groupStacks(detectBlocks(labels, minArea=minArea / 4 ** level), maxGap, minOverlap)
+    return stackFacts(blockNames(stacks))
+
+
+class SceneMonitor:
+    """
+    A monitor refreshing the inferred start state from every new camera frame.
+    """
+
+
+    def __init__(self, camera, level=STD_LEVEL, minArea=STD_MIN_AREA, maxGap=STD_MAX_GAP,
+                 minOverlap=STD_MIN_OVERLAP):
+        """
+        Initialise the monitor.
+
+        :param camera: camera component handing out frames like a
+                       CameraService
+        :param level: image pyramid level which frames are processed at
+        :param minArea: minimum area in full-resolution pixels of a blob which
+                        is a block
+        :param maxGap: gap between stacked blocks relative to the height of
+                       the lower block
+        :param minOverlap: horizontal overlap of stacked blocks relative to
+                           the narrower block
+        :raise ValueError: if level is not between 0 and MAX_LEVEL, or
+                           minArea, maxGap or minOverlap is not positive
+        """
+        error.checkInRange(level, 0, MAX_LEVEL)
+        error.checkPositive(minArea)
+        error.checkPositive(maxGap)
+        error.checkPositive(minOverlap)
+
+        self.camera = camera
+        self.level = level
+        self.minArea = minArea
+        self.maxGap = maxGap
+        self.minOverlap = minOverlap
+        self.timestamp = time.monotonic()
+        self.objects = {}
+        self.atoms = []
+
+
+    def refresh(self, timeout=CameraService.STD_TIMEOUT):
+        """
+        Infer the start state from the next camera frame.
+
+        :param timeout: number of seconds to wait for the frame
+        :return: True if the state changed since the last refresh
+        :raise ValueError: if the camera is off
+        :raise TimeoutError: if no frame is captured in time
+        """
+        error.checkComponent(self.camera, 'Camera')
+
+        self.timestamp, image = self.camera.nextAfter(self.timestamp, timeout)
+        objects, atoms = inferScene(image, self.level, self.minArea, self.maxGap, self.minOverlap)
+
+        changed = sorted(atoms) != sorted(self.atoms)
+        if changed:
+            telemetry.debug('scene.changed', blocks=len(objects))
+        self.objects = objects
+        self.atoms = atoms
+        return changed
@@ -0,0 +1,673 @@
+# -*- coding: utf-8 -*-
+
+import error
+import lazy
+import hal
+import pca9685
+from camera import FakeFrameSource
+from entity import Entity
+from head import Head
+
+import math
+import time
+import threading
+np = lazy.module('numpy')
+
+
+# Seconds taken by a GPIO pin write or read.
+GPIO_LATENCY = 0.000002
+
+# Seconds taken to start, change or stop a software PWM.
+PWM_LATENCY = 0.00002
+
+# Seconds taken by an I2C transfer besides its bytes, for the driver call and start and stop.
+I2C_TRANSFER_LATENCY = 0.00015
+
+# Seconds taken by a byte on the I2C bus at 100 kHz, with its acknowledge bit.
+I2C_BYTE_TIME = 0.00009
+
+# Seconds between the end of the ultrasonic trigger pulse and the echo pulse.
+ECHO_DELAY = 0.0002
+
+# Seconds between the exposure of a camera frame and it being read.
+CAMERA_LATENCY = 0.01
+
+
+def _wait(duration):
+    """
+    Take the given time like a hardware transaction would. The end is spun
+    as sleeping overshoots it.
+
+    :param duration: number of seconds
+    """
+    end = time.perf_counter() + duration
+    if duration >= 0.001:
+        time.sleep(duration - 0.0005)
+    while time.perf_counter() < end:
+        pass
+
+
+class Scene:
+    """A simulated world of the robot on a floor with a block to pick up."""
+
+
+    # Speed of a track at full duty cycle in metres per second.
+    TRACK_SPEED = 0.2
+
+    # Distance between the tracks in metres.
+    TRACK_WIDTH = 0.13
+
+    # Height of the camera and ultrasonic sensor above the floor in metres.
+    SENSOR_HEIGHT = 0.1
+
+    # Side length of the block in metres.
+    BLOCK_SIZE = 0.03
+
+    # Focal length of the camera in pixels for a 640 pixel wide frame.
+    FOCAL_LEN = 628
+
+    # Half angle of the ultrasonic beam in radians.
+    BEAM_ANGLE = math.radians(15)
+
+    # Maximum range of the ultrasonic sensor in metres.
+    MAX_RANGE = 4
+
+    # Maximum distance from the robot of a block which can be grabbed in metres.
+    GRAB_DIST = 0.2
+
+    # Maximum bearing of a block which can be grabbed in radians.
+    GRAB_BEARING = math.radians(20)
+
+    # Minimum grabber angle which holds a block.
+    GRAB_ANGLE = 80
+
+    # Colour of the floor in BGR.
+    FLOOR_BGR = (90, 100, 110)
+
+    # Colours of the blocks in BGR.
+    BLOCK_BGR = {Entity.RED: (30, 30, 200), Entity.GREEN: (40, 180, 40), Entity.BLUE: (200, 60, 30)}
+
+
+    def __init__(self, entity, blockDist, blockBearing, leftPins, rightPins, trigPin, echoPin, viewChannel, grabberChannel):
+        """
+        Initialise the robot at the origin facing along the x axis and the
+        block on the floor.
+
+        :param entity: colour of the block
+        :param blockDist: distance of the block from the robot in metres
+        :param blockBearing: bearing of the block from the robot in degrees,
+                             positive to the left
+        :param leftPins: engine, backward and forward GPIO pins of the left motor
+        :param rightPins: engine, backward and forward GPIO pins of the right motor
+        :param trigPin: GPIO pin of the ultrasonic trigger
+        :param echoPin: GPIO pin of the ultrasonic echo
+        :param viewChannel: PCA9685 channel of the head servo
+        :param grabberChannel: PCA9685 channel of the grabber servo
+        :raise TypeError: if entity is not an Entity
+        :raise ValueError: if blockDist is not positive
+        """
+        error.checkType(entity, Entity, 'entity', 'Entity')
+        error.checkPositive(blockDist)
+
+        self.entity = entity
+        self.block = (blockDist * math.cos(math.radians(blockBearing)),
+                      blockDist * math.sin(math.radians(blockBearing)))
+        self.held = False
+        self.pose = (0.0, 0.0, 0.0)
+
+        self.leftPins = leftPins
+        self.rightPins = rightPins
+        self.trigPin = trigPin
+        self.echoPin = echoPin
+        self.viewChannel = viewChannel
+        self.grabberChannel = grabberChannel
+
+        self.levels = {}
+        self.duties = {}
+        self.angles = {}
+        self.callbacks = {}
+        self._echo = None
+        self._lastUpdate = time.monotonic()
+        self._lock = threading.RLock()
+
+
+    def setLevel(self, pin, level):
+        """
+        Set the level of a GPIO pin.
+
+        :param pin: GPIO pin
+        :param level: 0 or 1
+        """
+        with self._lock:
+            self._update()
+            if (pin == self.trigPin) and self.levels.get(pin) and not level:
+                self._emit()
+            self.levels[pin] = level
+
+
+    def level(self, pin):
+        """
+        Get the level of a GPIO pin.
+
+        :param pin: GPIO pin
+        :return: 0 or 1
+        """
+        with self._lock:
+            if pin == self.echoPin:
+                return int(self._echo is not None and self._echo[0] <= time.monotonic() < self._echo[1])
+            return self.levels.get(pin, 0)
+
+
+    def setDuty(self, pin, dc):
+        """
+        Set the duty cycle of the PWM of a GPIO pin.
+
+        :param pin: GPIO pin
+        :param dc: duty cycle (0-100)
+        """
+        with self._lock:
+            self._update()
+            self.duties[pin] = dc
+
+
+    def setAngle(self, channel, angle):
+        """
+        Set the angle of a servo, grabbing the block if the grabber closes
+        around it.
+
+        :param channel: PCA9685 channel
+        :param angle: servo angle in degrees, or None if turned off
+        """
+        with self._lock:
+            self._update()
+            self.angles[channel] = angle
+            if (channel == self.grabberChannel) and (angle is not None) and (angle >= self.GRAB_ANGLE):
+                dist, bearing = self._blockView()
+                if (dist <= self.GRAB_DIST) and (abs(bearing) <= self.GRAB_BEARING):
+                    self.held = True
+
+
+    def angle(self, channel):
+        """
+        Get the angle of a servo.
+
+        :param channel: PCA9685 channel
+        :return: servo angle in degrees, or None if turned off
+        """
+        with self._lock:
+            return self.angles.get(channel)
+
+
+    def render(self, width, height):
+        """
+        Render the camera view. The image rows of the camera are flipped, so
+        objects to the right and above are at larger pixel coordinates.
+
+        :param width: frame width in pixels
+        :param height: frame height in pixels
+        :return: BGR image
+        """
+        with self._lock:
+            self._update()
+            dist, bearing = self._blockView()
+            view = self._view()
+            held = self.held
+
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:] = self.FLOOR_BGR
+
+        if held or abs(bearing) >= math.pi / 3:
+            return image
+
+        focal = self.FOCAL_LEN * width / 640
+        drop = self.SENSOR_HEIGHT - self.BLOCK_SIZE / 2
+        depression = math.atan2(drop, dist)
+        x = width / 2 - focal * math.tan(bearing)
+        y = height / 2 + focal * math.tan(view - depression)
+        half = focal * self.BLOCK_SIZE / math.hypot(dist, drop) / 2
+
+        left, right = max(int(x - half), 0), min(int(x + half), width)
+        top, bottom = max(int(y - half), 0), min(int(y + half), height)
+        if (left < right) and (top < bottom):
+            image[top:bottom, left:right] = self.BLOCK_BGR[self.entity]
+        return image
+
+
+    def _view(self):
+        """
+        Get the downward tilt of the head from its servo angle.
+
+        :return: tilt in radians
+        """
+        angle = self.angles.get(self.viewChannel)
+        if angle is None:
+            return 0.0
+        return math.radians(Head.VIEW_RNG * (1 - angle / Head.VIEW_DOM))
+
+
+    def _blockView(self):
+        """
+        Get the block position relative to the robot.
+
+        :return: horizontal distance in metres and bearing in radians,
+                 positive to the left
+        """
+        x, y, heading = self.pose
+        dx = self.block[0] - x
+        dy = self.block[1] - y
+        bearing = math.atan2(dy, dx) - heading
+        bearing = math.atan2(math.sin(bearing), math.cos(bearing))
+        return math.hypot(dx, dy), bearing
+
+
+    def _range(self):
+        """
+        Get the distance measured by the ultrasonic sensor, which is the
+        block if it is in the beam or otherwise the floor.
+
+        :return: distance in metres or None if nothing is in range
+        """
+        view = self._view()
+        dist, bearing = self._blockView()
+        drop = self.SENSOR_HEIGHT - self.BLOCK_SIZE / 2
+
+        if (not self.held) and (abs(bearing) <= self.BEAM_ANGLE) \
+                and (abs(math.atan2(drop, dist) - view) <= self.BEAM_ANGLE):
+            return math.hypot(dist, drop) - self.BLOCK_SIZE / 2
+
+        if view > 0:
+            floor = self.SENSOR_HEIGHT / math.sin(view)
+            if floor <= self.MAX_RANGE:
+                return floor
+        return None
+
+
+    def _emit(self):
+        """
+        Schedule the echo pulse of an ultrasonic trigger pulse.
+        """
+        dist = self._range()
+        if dist is None:
+            self._echo = None
+        else:
+            start = time.monotonic() + ECHO_DELAY
+            self._echo = (start, start + 2 * dist / 343)
+
+            callback = self.callbacks.get(self.echoPin)
+            if callback is not None:
+                threading.Thread(target=self._interrupt, args=(callback, self._echo), daemon=True).start()
+
+
+    def _interrupt(self, callback, echo):
+        """
+        Call the edge callback of the echo pin at both edges of an echo pulse.
+
+        :param callback: function called with the echo pin
+        :param echo: monotonic start and end time of the echo pulse
+        """
+        for edgeTime in echo:
+            _wait(edgeTime - time.monotonic())
+            callback(self.echoPin)
+
+
+    def _speed(self, pins):
+        """
+        Get the speed of a track from the levels and duty cycle of its motor.
+
+        :param pins: engine, backward and forward GPIO pins of the motor
+        :return: speed in metres per second, positive forward
+        """
+        enginePin, backwardPin, forwardPin = pins
+        direction = self.levels.get(forwardPin, 0) - self.levels.get(backwardPin, 0)
+        return direction * self.duties.get(enginePin, 0) / 100 * self.TRACK_SPEED
+
+
+    def _update(self):
+        """
+        Move the robot along its tracks since the last update.
+        """
+        now = time.monotonic()
+        dt = now - self._lastUpdate
+        self._lastUpdate = now
+
+        left = self._speed(self.leftPins)
+        right = self._speed(self.rightPins)
+        speed = (left + right) / 2
+        turn = (right - left) / self.TRACK_WIDTH
+
+        x, y, heading = self.pose
+        if abs(turn) < 1e-9:
+            x += speed * math.cos(heading) * dt
+            y += speed * math.sin(heading) * dt
+        else:
+            radius = speed / turn
+            x += radius * (math.sin(heading + turn * dt) - math.sin(heading))
+            y -= radius * (math.cos(heading + turn * dt) - math.cos(heading))
+            heading += turn * dt
+        self.pose = (x, y, heading)
+
+
+class SimPWM:
+    """A simulated RPi.GPIO software PWM."""
+
+
+    def __init__(self, scene, pin, frequency):
+        """
+        Initialise the PWM of a pin.
+
+        :param scene: simulated scene
+        :param pin: GPIO pin
+        :param frequency: PWM frequency in Hz
+        """
+        self.scene = scene
+        self.pin = pin
+        self.frequency = frequency
+        self.dc = 0
+
+
+    def start(self, dc):
+        """
+        Start the PWM.
+
+        :param dc: duty cycle (0-100)
+        """
+        _wait(PWM_LATENCY)
+        self.dc = dc
+        self.scene.setDuty(self.pin, dc)
+
+
+    def ChangeDutyCycle(self, dc):
+        """
+        Change the duty cycle of the PWM.
+
+        :param dc: duty cycle (0-100)
+        """
+        self.start(dc)
+
+
+    def ChangeFrequency(self, frequency):
+        """
+        Change the frequency of the PWM.
+
+        :param frequency: PWM frequency in Hz
+        """
+        _wait(PWM_LATENCY)
+        self.frequency = frequency
+
+
+    def stop(self):
+        """
+        Stop the PWM.
+        """
+        _wait(PWM_LATENCY)
+        self.dc = 0
+        self.scene.setDuty(self.pin, 0)
+
+
+class SimGPIO:
+    """A simulated RPi.GPIO module driving the pins of a scene."""
+
+
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+
+    def __init__(self, scene):
+        """
+        Initialise the GPIO driver.
+
+        :param scene: simulated scene
+        """
+        self.scene = scene
+        self.PWM = lambda pin, frequency: SimPWM(scene, pin, frequency)
+
+
+    def setwarnings(self, flag):
+        """
+        Warnings are not simulated.
+        """
+        pass
+
+
+    def setmode(self, mode):
+        """
+        Only GPIO numbering is simulated.
+        """
+        pass
+
+
+    def setup(self, channels, direction, initial=LOW):
+        """
+        Setup pins as inputs or outputs.
+
+        :param channels: GPIO pin or list of pins
+        :param direction: IN or OUT
+        :param initial: initial level of outputs
+        """
+        if direction == self.OUT:
+            self.output(channels, initial)
+
+
+    def output(self, channels, value):
+        """
+        Set the level of output pins.
+
+        :param channels: GPIO pin or list of pins
+        :param value: LOW or HIGH
+        """
+        for channel in _channelList(channels):
+            _wait(GPIO_LATENCY)
+            self.scene.setLevel(channel, int(bool(value)))
+
+
+    def input(self, channel):
+        """
+        Get the level of a pin.
+
+        :param channel: GPIO pin
+        :return: LOW or HIGH
+        """
+        _wait(GPIO_LATENCY)
+        return self.scene.level(channel)
+
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        """
+        Call a function at the edges of an input pin. Only the echo pin has
+        edges, which are both passed regardless of the chosen edge.
+
+        :param channel: GPIO pin
+        :param edge: RISING, FALLING or BOTH
+        :param callback: function called with the pin
+        :param bouncetime: ignored
+        """
+        self.scene.callbacks[channel] = callback
+
+
+    def remove_event_detect(self, channel):
+        """
+        Stop calling the function of an input pin.
+
+        :param channel: GPIO pin
+        """
+        self.scene.callbacks.pop(channel, None)
+
+
+    def cleanup(self, channels=None):
+        """
+        Reset pins to low.
+
+        :param channels: GPIO pin or list of pins, by default all pins
+        """
+        if channels is None:
+            channels = list(self.scene.levels)
+        for channel in _channelList(channels):
+            self.scene.setLevel(channel, self.LOW)
+
+
+def _channelList(channels):
+    """
+    Get a list of channels like RPi.GPIO, which accepts a channel or a list.
+
+    :param channels: channel or list of channels
+    :return: list of channels
+    """
+    if isinstance(channels, (list, tuple)):
+        return channels
+    return [channels]
+
+
+class SimPCA9685:
+    """
+    A simulated PCA9685 board, whose registers are written and read in I2C
+    transfers taking the time of the bytes on the bus. The servo angles of
+    the LED registers of each channel are applied to the scene.
+    """
+
+
+    def __init__(self, scene):
+        """
+        Initialise the registers of the board, with every channel off.
+
+        :param scene: simulated scene
+        """
+        self.scene = scene
+        self.memory = bytearray(256)
+        for channel in range(pca9685.CHANNELS):
+            self._setLed(channel, pca9685.OFF_REGISTERS)
+        self.transfers = 0
+
+
+    def _setLed(self, channel, registers):
+        """
+        Set the LED registers of a channel.
+
+        :param channel: PCA9685 channel
+        :param registers: ON_L, ON_H, OFF_L and OFF_H register values
+        """
+        start = pca9685.LED0_ON_L + channel * pca9685.CHANNEL_REGISTERS
+        self.memory[start:start + pca9685.CHANNEL_REGISTERS] = registers
+
+
+    def write(self, register, data):
+        """
+        Write consecutive registers in one transfer, applying the servo angles
+        of the channels written.
+
+        :param register: address of the first register
+        :param data: bytes of the registers
+        """
+        data = bytes(data)
+        _wait(I2C_TRANSFER_LATENCY + (len(data) + 2) * I2C_BYTE_TIME)
+        self.memory[register:register + len(data)] = data
+        self.transfers += 1
+
+        first = max(0, (register - pca9685.LED0_ON_L) // pca9685.CHANNEL_REGISTERS)
+        last = min(pca9685.CHANNELS, -(-(register + len(data) - pca9685.LED0_ON_L) // pca9685.CHANNEL_REGISTERS))
+        for channel in range(first, last):
+            start = pca9685.LED0_ON_L + channel * pca9685.CHANNEL_REGISTERS
+            angle = pca9685.registersAngle(self.memory[start:start + pca9685.CHANNEL_REGISTERS])
+            if angle != self.scene.angle(channel):
+                self.scene.setAngle(channel, angle)
+
+
+    def read(self, register, count):
+        """
+        Read consecutive registers in one transfer.
+
+        :param register: address of the first register
+        :param count: number of registers
+        :return: bytes of the registers
+        """
+        _wait(I2C_TRANSFER_LATENCY + (count + 3) * I2C_BYTE_TIME)
+        self.transfers += 1
+        return bytes(self.memory[register:register + count])
+
+
+class SimCameraSource(FakeFrameSource):
+    """A frame source rendering the camera view of a scene."""
+
+
+    def __init__(self, scene, width, height, framerate):
+        """
+        Initialise the simulated camera.
+
+        :param scene: simulated scene
+        :param width: frame width in pixels
+        :param height: frame height in pixels
+        :param framerate: frames per second
+        :raise ValueError: if framerate is not positive
+        """
+        super().__init__(self._render, framerate)
+        self.scene = scene
+        self.width = width
+        self.height = height
+
+
+    def _render(self, timestamp):
+        """
+        Expose a frame of the scene and read it out.
+
+        :param timestamp: monotonic capture time
+        :return: BGR image
+        """
+        image = self.scene.render(self.width, self.height)
+        _wait(CAMERA_LATENCY)
+        return image
+
+
+class SimBackend(hal.Backend):
+    """Simulated drivers acting on a scene with realistic I/O latencies."""
+
+
+    def __init__(self, scene):
+        """
+        Initialise the simulated drivers.
+
+        :param scene: simulated scene
+        :raise TypeError: if scene is not a Scene
+        """
+        error.checkType(scene, Scene, 'scene', 'Scene')
+
+        self.scene = scene
+        self._gpio = SimGPIO(scene)
+        self._pca9685 = None
+
+
+    def gpio(self):
+        """
+        Get the simulated GPIO driver.
+
+        :return: SimGPIO instance
+        """
+        return self._gpio
+
+
+    def pca9685(self):
+        """
+        Get the simulated PCA9685 board.
+
+        :return: SimPCA9685 instance
+        """
+        if self._pca9685 is None:
+            self._pca9685 = SimPCA9685(self.scene)
+        return self._pca9685
+
+
+    def frameSource(self, width, height, framerate):
+        """
+        Get the simulated camera.
+
+        :param width: frame width in pixels
+        :param height: frame height in pixels
+        :param framerate: frames per second
+        :return: SimCameraSource instance
+        """
+        return SimCameraSource(self.scene, width, height, framerate)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+import error
+
+import sys
+import time
+import json
+import collections
+
+
+# Level of detailed events in the control and vision loops.
+DEBUG = 10
+
+# Level of events marking the progress of actions.
+INFO = 20
+
+# Level of unexpected events which the robot recovers from.
+WARNING = 30
+
+# Level of failures.
+ERROR = 40
+
+# Level above all events, which turns telemetry off.
+OFF = 100
+
+# Names of the levels.
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+# Standard number of events kept in the ring buffer.
+STD_BUFFER_SIZE = 4096
+
+
+# Minimum level of the recorded events.
+_level = WARNING
+
+# Ring buffer of (monotonic time, level, name, fields) events.
+_events = collections.deque(maxlen=STD_BUFFER_SIZE)
+
+# Stream which events are also written to when recorded, or None.
+_echo = None
+
+
+def setLevel(level):
+    """
+    Set the minimum level of the recorded events. Events below it cost one
+    comparison.
+
+    :param level: DEBUG, INFO, WARNING, ERROR or OFF
+    :raise ValueError: if level is not between DEBUG and OFF
+    """
+    global _level
+    error.checkInRange(level, DEBUG, OFF)
+    _level = level
+
+
+def setBufferSize(size):
+    """
+    Set the number of events kept in the ring buffer, keeping the latest ones.
+
+    :param size: number of events
+    :raise ValueError: if size is not positive
+    """
+    global _events
+    error.checkPositive(size)
+    _events = collections.deque(_events, maxlen=size)
+
+
+def setEcho(stream):
+    """
+    Write every recorded event to a stream as well, e.g. sys.stdout to watch
+    the robot live.
+
+    :param stream: text stream, or None to stop echoing
+    """
+    global _echo
+    _echo = stream
+
+
+def enabled(level):
+    """
+    Check if events of a level are recorded, to skip computing their fields.
+
+    :param level: event level
+    :return: True if events of the level are recorded
+    """
+    return level >= _level
+
+
+def event(level, name, **fields):
+    """
+    Record an event if its level is enabled.
+
+    :param level: event level
+    :param name: dotted event name, e.g. 'farFind.found'
+    :param fields: numeric fields of the event
+    """
+    if level < _level:
+        return
+
+    record = (time.monotonic(), level, name, fields)
+    _events.append(record)
+    if _echo is not None:
+        _echo.write(formatEvent(record) + '\n')
+
+
+def debug(name, **fields):
+    """
+    Record a DEBUG event.
+
+    :param name: dotted event name
+    :param fields: numeric fields of the event
+    """
+    if DEBUG >= _level:
+        event(DEBUG, name, **fields)
+
+
+def info(name, **fields):
+    """
+    Record an INFO event.
+
+    :param name: dotted event name
+    :param fields: numeric fields of the event
+    """
+    if INFO >= _level:
+        event(INFO, name, **fields)
+
+
+def warning(name, **fields):
+    """
+    Record a WARNING event.
+
+    :param name: dotted event name
+    :param fields: numeric fields of the event
+    """
+    event(WARNING, name, **fields)
+
+
+def failure(name, **fields):
+    """
+    Record an ERROR event. Not named error, which would shadow the error
+    module of the checks.
+
+    :param name: dotted event name
+    :param fields: fields of the event
+    """
+    event(ERROR, name, **fields)
+
+
+def events(name=None):
+    """
+    Get the events in the ring buffer.
+
+    :param name: only get the events with this name, or None for all events
+    :return: list of (monotonic time, level, name, fields) events, oldest first
+    """
+    return [record for record in list(_events) if (name is None) or (record[2] == name)]
+
+
+def clear():
+    """
+    Remove all the events from the ring buffer.
+    """
+    _events.clear()
+
+
+def formatEvent(record):
+    """
+    Format an event as a JSON line.
+
+    :param record: (monotonic time, level, name, fields) event
+    :return: JSON object of the time, level, name and fields of the event
+    """
+    timestamp, level, name, fields = record
+    return json.dumps({'time': round(timestamp, 6), 'level': LEVEL_NAMES.get(level, level), 'event': name, **fields},
+                      default=str)
+
+
+def dump(stream=None):
+    """
+    Write the events in the ring buffer to a stream as JSON lines.
+
+    :param stream: text stream, by default standard output
+    """
+    if stream is None:
+        stream = sys.stdout
+    for record in events():
+        stream.write(formatEvent(record) + '\n')
+    stream.flush()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import pytest
+
+
+# The modules of the robot import each other by their flat names, as when run from code/,
+# so the tests of those modules import them the same way.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+import sim
+from entity import Entity
+
+
+# Engine, backward and forward GPIO pins of the left and right motor of the simulated robot.
+LEFT_PINS = (17, 18, 27)
+RIGHT_PINS = (4, 14, 15)
+
+# GPIO pins of the ultrasonic trigger and echo of the simulated robot.
+TRIG_PIN = 11
+ECHO_PIN = 8
+
+# PCA9685 channels of the head and arm servos of the simulated robot.
+VIEW_CHANNEL = 11
+ARM_CHANNELS = (12, 13, 14, 15)
+
+
+@pytest.fixture
+def scene(monkeypatch):
+    """A simulated scene with a red block half a metre ahead, driven by the components."""
+    monkeypatch.setattr(hal, '_backend', None)
+    monkeypatch.setattr(hal, '_servoDriver', None)
+    scene = sim.Scene(Entity.RED, 0.5, 0, LEFT_PINS, RIGHT_PINS, TRIG_PIN, ECHO_PIN, VIEW_CHANNEL, ARM_CHANNELS[3])
+    hal.use(sim.SimBackend(scene))
+    return scene
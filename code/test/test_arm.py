@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import hal
+import pca9685
+from arm import Arm
+
+import pytest
+
+
+# PCA9685 channels of the shoulder, elbow, wrist and grabber servos.
+ARM_CHANNELS = (12, 13, 14, 15)
+
+
+@pytest.fixture
+def arm(scene):
+    arm = Arm(*ARM_CHANNELS)
+    arm.setup()
+    yield arm
+    arm.cleanup()
+
+
+def test_gettersOffBus(arm):
+    board = hal.backend().pca9685()
+    arm.shoulder = 60
+    arm.wrist = 30
+    transfers = board.transfers
+
+    assert arm.shoulder == pytest.approx(60)
+    assert arm.elbow == pytest.approx(Arm.ELBOW_MIN_DOM + Arm.ELBOW_INIT_ANGLE * (Arm.ELBOW_MAX_DOM - Arm.ELBOW_MIN_DOM) / Arm.MAX_ANGLE)
+    assert arm.wrist == 30
+    assert arm.inputAngles()['wrist'] == 30
+    assert board.transfers == transfers
+
+
+def test_resync(arm):
+    board = hal.backend().pca9685()
+    # the read back angles only differ from the commanded ones by the resolution of the board
+    assert arm.resync() == {}
+
+    # the wrist servo is driven behind the back of the arm
+    board.write(pca9685.LED0_ON_L + ARM_CHANNELS[2] * pca9685.CHANNEL_REGISTERS, pca9685.angleRegisters(120))
+    assert arm.wrist == pytest.approx(Arm.WRIST_INIT_ANGLE, abs=0.3)
+
+    drifted = arm.resync()
+    assert list(drifted) == ['wrist']
+    assert drifted['wrist'][0] == pytest.approx(Arm.WRIST_INIT_ANGLE, abs=0.3)
+    assert arm.wrist == pytest.approx(120, abs=0.3)
+    assert arm.inputAngles()['wrist'] == pytest.approx(120, abs=0.3)
+
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+from body import Body
+from motor import Motor
+from direction import Direction
+
+import time
+import threading
+import pytest
+
+
+@pytest.fixture
+def body(scene):
+    body = Body(Body.MAX_MOTOR_DC, Motor(*scene.leftPins), Motor(*scene.rightPins))
+    body.setup()
+    yield body
+    body.cleanup()
+
+
+def stopped(scene):
+    """Check if neither track of the scene is driven."""
+    return scene._speed(scene.leftPins) == scene._speed(scene.rightPins) == 0
+
+
+def test_deadline(scene, body):
+    start = time.monotonic()
+    motion = body.start(Direction.FORWARD, 0.1)
+    assert not motion.done()
+    assert scene._speed(scene.leftPins) > 0
+
+    assert motion.wait(1)
+    assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
+    assert not motion.cancelled
+    assert stopped(scene)
+    assert scene.pose[0] > 0
+
+
+def test_stop(scene, body):
+    motion = body.start(Direction.BACKWARD)
+    time.sleep(0.05)
+    assert not motion.done()
+
+    body.stop()
+    assert motion.done()
+    assert motion.cancelled
+    assert stopped(scene)
+    assert scene.pose[0] < 0
+
+
+def test_token(scene, body):
+    token = threading.Event()
+    motion = body.start(Direction.FORWARD, token=token)
+    token.set()
+    assert motion.wait(10 * Body.TOKEN_POLL_TIME)
+    assert stopped(scene)
+
+
+def test_supersede(scene, body):
+    first = body.start(Direction.FORWARD, 1)
+    second = body.start(Direction.BACKWARD, 0.05)
+    assert first.done() and first.superseded
+    assert scene._speed(scene.leftPins) < 0
+
+    # cancelling a superseded motion leaves the current one running
+    first.cancel()
+    assert not second.done()
+    assert second.wait(1)
+    assert stopped(scene)
+
+
+@pytest.mark.parametrize('direction, sign', [(Direction.LEFT, 1), (Direction.RIGHT, -1)])
+def test_turn(scene, body, direction, sign):
+    motion = body.start(direction, 0.1)
+    inner, outer = (scene.leftPins, scene.rightPins) if sign > 0 else (scene.rightPins, scene.leftPins)
+
+    # the inner track turns backwards at a fraction of the outer one
+    assert scene.duties[inner[0]] == pytest.approx(Body.STD_RADIUS * Body.MAX_MOTOR_DC)
+    assert scene.duties[outer[0]] == Body.MAX_MOTOR_DC
+    assert scene._speed(inner) < 0 < scene._speed(outer)
+
+    motion.wait(1)
+    assert sign * scene.pose[2] > 0
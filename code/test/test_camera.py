@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+from camera import CameraService, FakeFrameSource, FrameSource
+
+import time
+import queue
+import pytest
+import numpy as np
+
+
+class QueueSource(FrameSource):
+    """A frame source handing out the frames put on a queue."""
+
+
+    def __init__(self):
+        self.frames = queue.Queue()
+
+
+    def open(self):
+        pass
+
+
+    def read(self):
+        frame = self.frames.get()
+        if isinstance(frame, Exception):
+            raise frame
+        return frame
+
+
+    def close(self):
+        pass
+
+
+def waitLatest(service, image, timeout=1):
+    """Wait for an image to be the latest captured frame."""
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        frame = service.latest()
+        if (frame is not None) and (frame[1] == image):
+            return frame
+        time.sleep(0.001)
+    raise AssertionError(f'{image} not captured')
+
+
+def test_nextAfter():
+    service = CameraService(FakeFrameSource(['a', 'b', 'c'], 200))
+    service.setup()
+    try:
+        start = time.monotonic()
+        timestamp, image = service.nextAfter(start)
+        assert timestamp > start
+        following = service.nextAfter(timestamp)
+        assert following[0] > timestamp
+        assert following[1] == 'abc'[('abc'.index(image) + 1) % 3]
+    finally:
+        service.cleanup()
+
+
+def test_ringBuffer():
+    source = QueueSource()
+    service = CameraService(source, bufferSize=2)
+    service.setup()
+    try:
+        assert service.latest() is None
+        for image in 'abc':
+            source.frames.put(image)
+        timestamp, image = waitLatest(service, 'c')
+
+        # 'a' was overwritten, so the earliest buffered frame is 'b'
+        assert service.nextAfter(0)[1] == 'b'
+        with pytest.raises(TimeoutError):
+            service.nextAfter(timestamp, timeout=0.05)
+    finally:
+        source.frames.put('end')
+        service.cleanup()
+
+
+def test_reusedBuffers():
+    source = QueueSource()
+    # every frame is read into the same buffer
+    source.reusesBuffers = True
+    buffer = np.zeros(4, dtype=np.uint8)
+    service = CameraService(source, bufferSize=2)
+    service.setup()
+    try:
+        buffer[:] = 1
+        source.frames.put(buffer)
+        timestamp, first = service.nextAfter(0)
+        buffer[:] = 2
+        source.frames.put(buffer)
+        timestamp, following = service.nextAfter(timestamp)
+
+        # the frame handed out is a copy, not overwritten by the following one
+        assert not np.shares_memory(first, buffer)
+        assert (first == 1).all()
+        assert (following == 2).all()
+
+        # until the ring buffer wraps around into its slot
+        buffer[:] = 3
+        source.frames.put(buffer)
+        third = service.nextAfter(timestamp)[1]
+        assert np.shares_memory(first, third)
+        assert (first == 3).all()
+        assert (following == 2).all()
+    finally:
+        source.frames.put(buffer)
+        service.cleanup()
+
+
+def test_captureFailure():
+    source = QueueSource()
+    service = CameraService(source)
+    service.setup()
+    try:
+        source.frames.put('a')
+        timestamp, image = waitLatest(service, 'a')
+        failure = OSError('camera unplugged')
+        source.frames.put(failure)
+
+        start = time.monotonic()
+        with pytest.raises(RuntimeError) as raised:
+            service.nextAfter(timestamp, timeout=1)
+        assert raised.value.__cause__ is failure
+        assert time.monotonic() - start < 0.5
+
+        # frames captured before the failure are still served
+        assert service.nextAfter(0)[1] == 'a'
+        with pytest.raises(RuntimeError):
+            service.latest()
+    finally:
+        service.cleanup()
+
+
+def test_cleanupBlockedSource(monkeypatch):
+    monkeypatch.setattr(CameraService, 'STOP_TIMEOUT', 0.05)
+    service = CameraService(QueueSource())
+    service.setup()
+
+    start = time.monotonic()
+    service.cleanup()
+    assert time.monotonic() - start < 0.5
+    assert not service.status
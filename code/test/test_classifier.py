@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+from classifier import ColourClassifier, HSV_RANGES, HSV_CHANNEL_SIZES, labelMask
+from entity import Entity
+
+import itertools
+import cv2
+import numpy as np
+import pytest
+
+
+def boundaryImage(ranges):
+    """Get an HSV image of every combination of the values at and beside the box boundaries."""
+    values = []
+    for channel, size in enumerate(HSV_CHANNEL_SIZES):
+        channelValues = set()
+        for boxes in ranges.values():
+            for boxMin, boxMax in boxes:
+                for value in (boxMin[channel] - 1, boxMin[channel], boxMax[channel], boxMax[channel] + 1):
+                    if 0 <= value < size:
+                        channelValues.add(value)
+        values.append(sorted(channelValues))
+    pixels = np.array(list(itertools.product(*values)), dtype=np.uint8)
+    return pixels.reshape(1, -1, 3)
+
+
+def inRangeMask(hsv, boxes):
+    """Get the mask of the pixels in any of the boxes, as cv2.inRange masks."""
+    mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+    for boxMin, boxMax in boxes:
+        mask |= cv2.inRange(hsv, np.array(boxMin), np.array(boxMax))
+    return mask
+
+
+def test_inRangeBoundaries():
+    hsv = boundaryImage(HSV_RANGES)
+    labels = ColourClassifier(HSV_RANGES).classify(hsv)
+
+    for entity, boxes in HSV_RANGES.items():
+        assert np.array_equal(labelMask(labels, entity), inRangeMask(hsv, boxes))
+    # both red hue bands are red
+    red = labelMask(labels, Entity.RED)
+    assert red[hsv[..., 0] <= 10].any() and red[hsv[..., 0] >= 169].any()
+
+
+def test_overlap():
+    ranges = {Entity.RED: [((0, 0, 0), (20, 255, 255))],
+              Entity.GREEN: [((10, 0, 0), (30, 255, 255))]}
+    hsv = np.array([[[5, 100, 100], [15, 100, 100], [25, 100, 100], [40, 100, 100]]], dtype=np.uint8)
+
+    # the first box has the lowest bit, which decides overlapping pixels
+    labels = ColourClassifier(ranges).classify(hsv)
+    assert labels.tolist() == [[Entity.RED.value, Entity.RED.value, Entity.GREEN.value, 0]]
+
+
+def test_manyBoxes():
+    # ten narrow hue bands of alternating colours
+    entities = list(Entity)
+    ranges = {}
+    for i in range(10):
+        ranges.setdefault(entities[i % len(entities)], []).append(((10 * i, 50, 50), (10 * i + 5, 255, 255)))
+    classifier = ColourClassifier(ranges)
+    hsv = boundaryImage(ranges)
+    labels = classifier.classify(hsv)
+
+    assert classifier.dtype is np.uint16
+    for entity, boxes in ranges.items():
+        assert np.array_equal(labelMask(labels, entity), inRangeMask(hsv, boxes))
+
+
+def test_invalidRanges():
+    with pytest.raises(ValueError):
+        ColourClassifier({Entity.RED: [((0, 0, 0), (180, 255, 255))]})
+    with pytest.raises(ValueError):
+        ColourClassifier({Entity.RED: [((20, 0, 0), (10, 255, 255))]})
+    with pytest.raises(ValueError):
+        ColourClassifier({Entity.RED: [((i, 0, 0), (i, 255, 255)) for i in range(17)]})
+    with pytest.raises(TypeError):
+        ColourClassifier({'red': [((0, 0, 0), (10, 255, 255))]})
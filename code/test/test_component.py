@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import component
+from component import Component, LatencyStats
+
+import pytest
+
+
+class Dummy(Component):
+    """A component with a profiled method and property setter."""
+
+
+    PROFILED = ('work', 'value')
+
+
+    def __init__(self):
+        self._value = 0
+
+
+    def setup(self):
+        pass
+
+
+    def cleanup(self):
+        pass
+
+
+    def work(self, x):
+        return 2 * x
+
+
+    @property
+    def value(self):
+        return self._value
+
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+
+@pytest.fixture(autouse=True)
+def profilingOff():
+    yield
+    component.setProfiling(False)
+    component.resetProfile()
+
+
+def test_wrapping():
+    work = Dummy.__dict__['work']
+    dummy = Dummy()
+    dummy.work(1)
+    assert 'Dummy.work' not in component.profile()
+
+    component.setProfiling(True)
+    assert component.profiling()
+    assert Dummy.__dict__['work'] is not work
+    assert dummy.work(3) == 6
+    dummy.value = 5
+    assert dummy.value == 5
+    profile = component.profile()
+    assert profile['Dummy.work']['count'] == 1
+    assert profile['Dummy.value']['count'] == 1
+
+    # turning profiling off restores the original methods
+    component.setProfiling(False)
+    assert Dummy.__dict__['work'] is work
+    dummy.work(1)
+    assert component.profile()['Dummy.work']['count'] == 1
+
+    component.resetProfile()
+    assert component.profile() == {}
+
+
+def test_subclassWhileProfiling():
+    component.setProfiling(True)
+
+    class Later(Dummy):
+        PROFILED = ('work',)
+
+        def work(self, x):
+            return 3 * x
+
+    assert Later().work(2) == 6
+    assert component.profile()['Later.work']['count'] == 1
+
+
+def test_percentiles():
+    stats = LatencyStats()
+    assert stats.percentile(50) is None
+    for i in range(90):
+        stats.add(0.002)
+    for i in range(10):
+        stats.add(0.5)
+
+    # a percentile is the upper bound of its bucket, at most the longest call
+    assert stats.percentile(50) == pytest.approx(10 ** -2.5)
+    assert stats.percentile(90) == pytest.approx(10 ** -2.5)
+    assert stats.percentile(99) == 0.5
+    snapshot = stats.snapshot()
+    assert snapshot['count'] == 100
+    assert snapshot['buckets'] == [[pytest.approx(10 ** 0.5), 90], [pytest.approx(10 ** 2.75), 10]]
+
+    # calls longer than the last bound fall into the last bucket
+    stats.add(20)
+    assert stats.buckets[-1] == 1
+    assert stats.percentile(100) == 20
+
+    stats.reset()
+    assert stats.count == 0
+    assert stats.percentile(50) is None
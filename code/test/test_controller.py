@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import telemetry
+from controller import AsyncRobot
+from robot import Robot
+from head import Head
+from body import Body
+from arm import Arm
+from motor import Motor
+from ultrasonic import Ultrasonic
+from direction import Direction
+from entity import Entity
+
+import asyncio
+import pytest
+
+
+# PCA9685 channels of the shoulder, elbow, wrist and grabber servos.
+ARM_CHANNELS = (12, 13, 14, 15)
+
+# Image geometry of a search, with the object centred within 5 pixels of (80, 60).
+GEOM = {'centerX': 80, 'centerY': 60, 'threshX': 5, 'threshY': 5}
+
+
+@pytest.fixture
+def robot(scene):
+    head = Head(scene.viewChannel, Ultrasonic(scene.trigPin, scene.echoPin))
+    body = Body(Body.MAX_MOTOR_DC, Motor(*scene.leftPins), Motor(*scene.rightPins))
+    robot = Robot(head, body, Arm(*ARM_CHANNELS))
+    robot.setup()
+    yield robot
+    robot.cleanup()
+
+
+@pytest.fixture
+def events():
+    telemetry.setLevel(telemetry.INFO)
+    telemetry.clear()
+    yield
+    telemetry.setLevel(telemetry.WARNING)
+    telemetry.clear()
+
+
+def test_settle(robot):
+    controller = robot.controller
+    still = asyncio.run(controller.settle())
+    assert asyncio.run(controller.settle()) == still
+
+    # the frames after a head turn are exposed once the servo settled
+    controller.turnHead(robot.head.view + 10)
+    turned = asyncio.run(controller.settle())
+    assert turned >= still + controller.SERVO_SETTLE_TIME
+    assert asyncio.run(controller.settle()) == turned
+
+    # and after a motion once it ended
+    controller.startMove(Direction.FORWARD, 0.05)
+    moved = asyncio.run(controller.settle())
+    assert moved >= turned + 0.05
+    assert asyncio.run(controller.settle()) == moved
+
+    # turning to the same angle does not move the head
+    controller.turnHead(robot.head.view)
+    assert asyncio.run(controller.settle()) == moved
+
+
+def test_centredOnce(robot, events):
+    controller = robot.controller
+    controller.aim('farFind')
+    offCentre = {'area': 100, 'x': 100, 'y': 60}
+    centred = {'area': 100, 'x': 82, 'y': 58}
+
+    controller.steer(offCentre, GEOM)
+    controller.steer(centred, GEOM)
+    controller.steer(offCentre, GEOM)
+    controller.steer(centred, GEOM)
+    assert len(telemetry.events('farFind.centred')) == 1
+
+    # losing the object acquires it anew
+    controller.steer(None, GEOM)
+    controller.steer(centred, GEOM)
+    assert len(telemetry.events('farFind.centred')) == 2
+
+    # as does aiming at it in the next phase
+    controller.aim('closeFind')
+    controller.steer(centred, GEOM)
+    assert len(telemetry.events('closeFind.centred')) == 1
+
+
+def test_syncWrappers(robot, monkeypatch):
+    calls = []
+
+    def fake(phase, result):
+        async def coroutine(*args):
+            await asyncio.sleep(0)
+            calls.append((phase, args))
+            return result
+        return coroutine
+
+    monkeypatch.setattr(robot.controller, 'farFind', fake('farFind', True))
+    monkeypatch.setattr(robot.controller, 'closeFind', fake('closeFind', False))
+    monkeypatch.setattr(robot.controller, 'pickup', fake('pickup', True))
+
+    assert robot.farFind(Entity.RED, 5) is True
+    assert robot.closeFind(Entity.BLUE) is False
+    assert robot.pickup(Entity.GREEN) is True
+    assert calls == [('farFind', (Entity.RED, 5)), ('closeFind', (Entity.BLUE, 15)), ('pickup', (Entity.GREEN,))]
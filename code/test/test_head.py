@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import hal
+import pca9685
+from head import Head, ObjPropEstimator
+from ultrasonic import Ultrasonic
+from entity import Entity
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def head(scene):
+    head = Head(scene.viewChannel, Ultrasonic(scene.trigPin, scene.echoPin))
+    head.setup()
+    yield head
+    head.cleanup()
+
+
+def test_gettersOffBus(head):
+    board = hal.backend().pca9685()
+    head.view = 20
+    transfers = board.transfers
+
+    assert head.view == 20
+    assert head.viewInput == pytest.approx(Head.VIEW_DOM * (1 - 20 / Head.VIEW_RNG))
+    assert board.transfers == transfers
+
+
+def test_resync(head, scene):
+    board = hal.backend().pca9685()
+    head.view = 30
+    assert head.resync() is None
+
+    # the view servo is driven behind the back of the head
+    board.write(pca9685.LED0_ON_L + scene.viewChannel * pca9685.CHANNEL_REGISTERS, pca9685.angleRegisters(20))
+    assert head.view == 30
+
+    commanded, read = head.resync()
+    assert commanded == pytest.approx(Head.VIEW_DOM / 2, abs=0.3)
+    assert read == pytest.approx(20, abs=0.3)
+    assert head.view == round(Head.VIEW_RNG * (1 - read / Head.VIEW_DOM))
+    assert head.viewInput == read
+
+
+class CountingCamera:
+    """A camera handing out blank frames, counting them."""
+
+
+    def __init__(self):
+        self.status = True
+        self.count = 0
+
+
+    def nextAfter(self, timestamp):
+        self.count += 1
+        return timestamp + 1, np.zeros((2, 2, 3), dtype=np.uint8)
+
+
+# Properties of a block measured consistently, of a wild blob, and of a blob between them.
+BLOCK = {'area': 400, 'x': 50, 'y': 60}
+WILD = {'area': 5000, 'x': 150, 'y': 10}
+BETWEEN = {'area': 2000, 'x': 100, 'y': 35}
+
+
+def test_estimatorAgrees():
+    estimator = ObjPropEstimator(10)
+    estimator.add(BLOCK)
+    estimator.add(BLOCK)
+    assert not estimator.done()
+    estimator.add(BLOCK)
+    assert estimator.done()
+    assert estimator.estimate() == BLOCK
+
+
+def test_estimatorWildBlob():
+    estimator = ObjPropEstimator(10)
+    for obj in (BLOCK, WILD, BLOCK):
+        estimator.add(obj)
+
+    # the median ignores the wild blob, so measuring stops after minChecks
+    assert estimator.done()
+    assert estimator.estimate() == BLOCK
+
+
+def test_estimatorMisses():
+    estimator = ObjPropEstimator(10)
+    estimator.add(None)
+    estimator.add(None)
+    assert not estimator.done()
+    estimator.add(None)
+    assert estimator.done()
+    assert estimator.estimate() is None
+
+
+def test_estimatorClamped():
+    estimator = ObjPropEstimator(2, minChecks=5)
+    assert estimator.minChecks == 2
+    estimator.add(None)
+    estimator.add(None)
+    assert estimator.done()
+
+
+def test_objCamPropMaxChecks(scene, monkeypatch):
+    # measurements which never agree
+    measurements = iter([BLOCK, WILD, BETWEEN] * 10)
+    monkeypatch.setattr('head.findObjProp', lambda mask: next(measurements))
+    camera = CountingCamera()
+
+    # the estimator takes no more measurements than it has room for
+    obj = Head(scene.viewChannel, Ultrasonic(scene.trigPin, scene.echoPin), camera=camera).objCamProp(Entity.RED, 6)
+    assert camera.count == 6
+    assert obj == BETWEEN
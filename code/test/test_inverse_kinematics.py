@@ -2,11 +2,12 @@
 
 from code import inverse_kinematics
 import pytest
+import numpy as np
 
 
-TEST_SET_1 = [((-0.175,-0.035), (150.69, 58.898)),
-              ((-0.099,0.143), (81.119, 62.947)),
-              ((0.042,-0.167), (-122.471, 66.98)),
+TEST_SET_1 = [((-0.175,-0.035), (170.417, 32.032)),
+              ((-0.099,0.143), (97.302, 41.824)),
+              ((0.042,-0.167), (-105.413, 45.015)),
               ((-0.207,0.047), None), # Too far
               ((0,0),None)] # Too close
 
@@ -22,3 +23,40 @@ def test_calcAngles():
 def test_transPos():
     for ((param1, param2), sol) in TEST_SET_2:
         assert inverse_kinematics.transPos(param1, param2) == sol
+
+
+TEST_SET_3 = [(-0.175,-0.035), (-0.099,0.143), (0.042,-0.167), (0.1,0.1), (-0.06,0.03)]
+
+TEST_SET_4 = [(-0.207,0.047), (0,0), (0.01,-0.02)] # Too far or too close
+
+
+def test_calcAnglesBatch():
+    angles, valid = inverse_kinematics.calcAnglesBatch(TEST_SET_3)
+    assert valid.all()
+
+    # Forward kinematics of both solutions reach the object position
+    shoulder = np.radians(angles[..., 0])
+    elbow = np.radians(angles[..., 1])
+    xObj = inverse_kinematics.S_LEN*np.cos(shoulder) + inverse_kinematics.E_LEN*np.cos(shoulder + elbow)
+    yObj = inverse_kinematics.S_LEN*np.sin(shoulder) + inverse_kinematics.E_LEN*np.sin(shoulder + elbow)
+    objPositions = np.repeat(np.array(TEST_SET_3)[:, None, :], 2, axis=1)
+    assert np.allclose(np.stack((xObj, yObj), axis=-1), objPositions)
+
+    _, valid = inverse_kinematics.calcAnglesBatch(TEST_SET_4)
+    assert not valid.any()
+
+
+def test_calcAnglesBatchDomains():
+    angles, valid = inverse_kinematics.calcAnglesBatch(TEST_SET_3, (5, 158), (5, 140))
+    inDomain = (angles[..., 0] >= 5) & (angles[..., 0] <= 158) & (angles[..., 1] >= 5) & (angles[..., 1] <= 140)
+    assert (valid == inDomain).all()
+    assert valid.any() and not valid.all()
+
+
+def test_calcAnglesWrapsBatch():
+    angles, _ = inverse_kinematics.calcAnglesBatch(TEST_SET_3)
+    for objPos, (shoulderAngle, elbowAngle) in zip(TEST_SET_3, angles[:, 0]):
+        assert inverse_kinematics.calcAngles(objPos) == (round(shoulderAngle, inverse_kinematics.PRECISION),
+                                                         round(elbowAngle, inverse_kinematics.PRECISION))
+    for objPos in TEST_SET_4:
+        assert inverse_kinematics.calcAngles(objPos) is None
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import lazy
+
+import sys
+import pytest
+
+
+def test_missing():
+    missing = lazy.module('no_such_module_for_the_robot')
+    assert isinstance(missing, lazy._MissingModule)
+    assert 'no_such_module_for_the_robot' not in sys.modules
+
+    with pytest.raises(ModuleNotFoundError) as info:
+        missing.anything
+    assert info.value.name == 'no_such_module_for_the_robot'
+
+
+def test_firstAccess(tmp_path, monkeypatch):
+    # the module counts its executions in a module which is already imported
+    (tmp_path / 'lazily_loaded.py').write_text('import lazy\nlazy.executions += 1\nanswer = 42\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(lazy, 'executions', 0, raising=False)
+
+    loaded = lazy.module('lazily_loaded')
+    assert lazy.executions == 0
+    assert sys.modules['lazily_loaded'] is loaded
+    assert lazy.module('lazily_loaded') is loaded
+
+    assert loaded.answer == 42
+    assert lazy.executions == 1
+    assert loaded.answer == 42
+    assert lazy.executions == 1
+    del sys.modules['lazily_loaded']
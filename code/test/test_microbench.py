@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import microbench
+
+import numpy as np
+import pytest
+
+
+def test_summarise():
+    latencies = np.full(100, 0.002)
+    latencies[-1] = 0.012
+    summary = microbench.summarise(latencies)
+
+    assert summary['p50'] == pytest.approx(2000)
+    assert summary['p99'] > 2000
+    assert summary['mean'] == pytest.approx(2100)
+    assert summary['fps'] == pytest.approx(1 / 0.0021)
+
+
+def test_regressions():
+    baseline = {name: microbench.summarise(np.full(10, 0.001)) for name in ('classify', 'ik', 'scene')}
+    results = {'classify': microbench.summarise(np.full(10, 0.00124)),
+               'ik': microbench.summarise(np.full(10, 0.0013)),
+               'scene': microbench.summarise(np.full(10, 0.0005)),
+               'new': microbench.summarise(np.full(10, 0.01))}
+
+    # only kernels over the tolerance and in the baseline regress
+    slow = microbench.regressions(results, baseline, tolerance=0.25)
+    assert [name for name, latency, baseLatency in slow] == ['ik']
+    assert slow[0][1:] == pytest.approx((1300, 1000))
+    slow = microbench.regressions(results, baseline, tolerance=0.2)
+    assert [name for name, latency, baseLatency in slow] == ['classify', 'ik']
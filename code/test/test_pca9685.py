@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import pca9685
+from pca9685 import ServoDriver
+
+import pytest
+
+
+class FakeRegisters:
+    """The registers of a board in memory, recording every write."""
+
+
+    def __init__(self):
+        self.memory = bytearray(256)
+        self.writes = []
+
+
+    def write(self, register, data):
+        data = bytes(data)
+        self.memory[register:register + len(data)] = data
+        self.writes.append((register, data))
+
+
+    def read(self, register, count):
+        return bytes(self.memory[register:register + count])
+
+
+def channelRegister(channel):
+    """Get the first LED register of a channel."""
+    return pca9685.LED0_ON_L + channel * pca9685.CHANNEL_REGISTERS
+
+
+def test_init():
+    registers = FakeRegisters()
+    ServoDriver(registers)
+
+    # 25 MHz / (4096 * 50 Hz) - 1, written while asleep
+    assert registers.writes[:3] == [(pca9685.MODE1, bytes((pca9685.MODE1_SLEEP,))),
+                                    (pca9685.PRE_SCALE, bytes((121,))),
+                                    (pca9685.MODE1, bytes((pca9685.MODE1_AI,)))]
+    assert registers.writes[-1] == (pca9685.LED0_ON_L, pca9685.OFF_REGISTERS * pca9685.CHANNELS)
+
+
+def test_roundTrip():
+    # a count of the 4096 steps of 20 ms is 0.59 degrees
+    for angle in range(0, pca9685.ACTUATION_RANGE + 1, 5):
+        assert pca9685.registersAngle(pca9685.angleRegisters(angle)) == pytest.approx(angle, abs=0.3)
+    assert pca9685.angleRegisters(None) == pca9685.OFF_REGISTERS
+    assert pca9685.registersAngle(pca9685.OFF_REGISTERS) is None
+    with pytest.raises(ValueError):
+        pca9685.angleRegisters(181)
+
+
+def test_nestedFrame():
+    registers = FakeRegisters()
+    driver = ServoDriver(registers)
+    registers.writes.clear()
+
+    with driver.frame():
+        driver.servo[3].angle = 90
+        with driver.frame():
+            driver.servo[5].angle = 10
+        assert registers.writes == []
+        driver.servo[5].angle = 20
+
+    # one write spanning channels 3 to 5, rewriting channel 4 as it was
+    assert driver.writes == 1
+    assert registers.writes == [(channelRegister(3), pca9685.angleRegisters(90) + pca9685.OFF_REGISTERS +
+                                 pca9685.angleRegisters(20))]
+    assert driver.servo[3].angle == pytest.approx(90, abs=0.3)
+    assert driver.servo[4].angle is None
+    assert driver.servo[5].angle == pytest.approx(20, abs=0.3)
+
+
+def test_span():
+    registers = FakeRegisters()
+    driver = ServoDriver(registers)
+    driver.servo[6].angle = 45
+    registers.writes.clear()
+
+    with driver.frame():
+        driver.servo[8].angle = 135
+        driver.servo[4].angle = 0
+
+    # channels between the first and last set are rewritten with their current registers
+    (register, data), = registers.writes
+    assert register == channelRegister(4)
+    assert data == pca9685.angleRegisters(0) + pca9685.OFF_REGISTERS + pca9685.angleRegisters(45) + \
+        pca9685.OFF_REGISTERS + pca9685.angleRegisters(135)
+
+
+def test_outsideFrame():
+    registers = FakeRegisters()
+    driver = ServoDriver(registers)
+    registers.writes.clear()
+
+    driver.servo[2].angle = 60
+    driver.servo[2].angle = None
+    assert registers.writes == [(channelRegister(2), pca9685.angleRegisters(60)),
+                                (channelRegister(2), pca9685.OFF_REGISTERS)]
+
+
+def test_frameRaises():
+    registers = FakeRegisters()
+    driver = ServoDriver(registers)
+    registers.writes.clear()
+
+    with pytest.raises(ValueError):
+        with driver.frame():
+            driver.servo[1].angle = 30
+            driver.servo[2].angle = 200
+
+    # the angles set before the exception are committed, and later sets are written at once
+    assert registers.writes == [(channelRegister(1), pca9685.angleRegisters(30))]
+    driver.servo[2].angle = 40
+    assert driver.writes == 2
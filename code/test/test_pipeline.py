@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+from pipeline import VisionPipeline
+from camera import CameraService, FakeFrameSource
+from head import Head
+from entity import Entity
+from sim import Scene
+
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import pytest
+
+
+# Side of the red block in the frames in pixels.
+BLOCK_SIZE = 64
+
+
+def blockFrame():
+    """Draw a red block in the middle of the floor."""
+    image = np.empty((Head.IMG_HEIGHT, Head.IMG_WIDTH, 3), dtype=np.uint8)
+    image[:] = Scene.FLOOR_BGR
+    top, left = (Head.IMG_HEIGHT - BLOCK_SIZE) // 2, (Head.IMG_WIDTH - BLOCK_SIZE) // 2
+    image[top:top + BLOCK_SIZE, left:left + BLOCK_SIZE] = Scene.BLOCK_BGR[Entity.RED]
+    return image
+
+
+@pytest.fixture
+def camera():
+    camera = CameraService(FakeFrameSource([blockFrame()], 100))
+    camera.setup()
+    yield camera
+    camera.cleanup()
+
+
+def test_notSetup(camera):
+    pipeline = VisionPipeline(camera, 1)
+    pipeline.cleanup()
+    assert not pipeline.status
+
+
+def test_segment(camera):
+    pipeline = VisionPipeline(camera, 2)
+    pipeline.setup()
+    name = pipeline._memory.name
+    numSlots = pipeline._shape[0]
+    try:
+        timestamp, obj = pipeline.nextAfter(time.monotonic(), Entity.RED, timeout=10)
+        assert obj['area'] == BLOCK_SIZE ** 2
+        assert pipeline.nextAfter(timestamp, Entity.GREEN)[1] is None
+
+        # only frames segmented at the new level are handed out once it changes
+        pipeline.level = 2
+        for i in range(5):
+            timestamp, obj = pipeline.nextAfter(timestamp, Entity.RED)
+            assert obj['area'] == pytest.approx(BLOCK_SIZE ** 2 / 16, rel=0.2)
+
+        # the slots are reused for many more frames than there are
+        deadline = time.monotonic() + 10
+        while (sum(pipeline._segmented.values()) <= 2 * numSlots) and (time.monotonic() < deadline):
+            timestamp = pipeline.nextAfter(timestamp, Entity.RED)[0]
+        stats = pipeline.stats()
+        assert len(stats['workerFps']) == 2
+        assert all(fps > 0 for fps in stats['workerFps'])
+        assert stats['segmentFps'] == pytest.approx(sum(stats['workerFps']))
+        assert stats['latencyP50'] > 0
+    finally:
+        pipeline.cleanup()
+
+    # every slot is free again and the shared memory is gone
+    assert sorted(pipeline._free) == list(range(numSlots))
+    assert sum(pipeline._segmented.values()) > 2 * numSlots
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_dropStale():
+    # a camera far faster than a worker segmenting full resolution frames
+    camera = CameraService(FakeFrameSource([blockFrame()], 1000))
+    pipeline = VisionPipeline(camera, 1, queueSize=1)
+    pipeline.setup()
+    try:
+        timestamp = pipeline.nextAfter(time.monotonic(), Entity.RED, timeout=10)[0]
+        for i in range(10):
+            timestamp = pipeline.nextAfter(timestamp, Entity.RED)[0]
+        # queued frames are replaced by newer ones instead of waiting behind them
+        assert pipeline.stats()['latencyP99'] < 500
+    finally:
+        pipeline.cleanup()
+        camera.cleanup()
+
+    # every frame is either segmented or dropped for a newer one
+    assert pipeline._dropped > 0
+    assert pipeline._captured == pipeline._dropped + sum(pipeline._segmented.values())
+    assert sorted(pipeline._free) == list(range(pipeline._shape[0]))
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+from code import planner
+import os
+import random
+
+
+PDDL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pddl')
+
+with open(os.path.join(PDDL_DIR, 'domain.pddl')) as file:
+    DOMAIN = file.read()
+
+with open(os.path.join(PDDL_DIR, 'problem.pddl')) as file:
+    PROBLEM = file.read()
+
+
+def randomProblem(number, seed):
+    """
+    Generate a problem moving random stacks of blocks into other random stacks.
+    """
+    rng = random.Random(seed)
+    names = [f'b{i}' for i in range(number)]
+
+    def stacks():
+        order = names[:]
+        rng.shuffle(order)
+        result = []
+        for name in order:
+            if result and rng.random() < 0.6:
+                result[-1].append(name)
+            else:
+                result.append([name])
+        return result
+
+    def atoms(stacks, clear):
+        result = []
+        for stack in stacks:
+            result.append(f'(On {stack[0]} Table)')
+            result += [f'(On {top} {bottom})' for bottom, top in zip(stack, stack[1:])]
+            if clear:
+                result.append(f'(Clear {stack[-1]})')
+        return ' '.join(result)
+
+    return (f'(define (problem random) (:domain blocks-world) (:objects {" ".join(names)} - block) '
+            f'(:init {atoms(stacks(), True)}) (:goal (and {atoms(stacks(), False)})))')
+
+
+def test_parseDomain():
+    domain = planner.parseDomain(DOMAIN)
+    assert domain.constants == {'table': 'table'}
+    assert [action.name for action in domain.actions] == ['pickup', 'drop', 'drop-on-table']
+    # the loosely written '?b -block' is a block parameter
+    assert domain.actions[1].parameters == [('?b', 'block'), ('?y', 'block')]
+    assert (False, ('=', '?b', '?y')) in domain.actions[1].precondition
+
+
+def test_solve():
+    steps = planner.solve(DOMAIN, PROBLEM)
+    assert steps == [('pickup', ('a', 'table')), ('pickup', ('b', 'table')),
+                     ('drop', ('b', 'c')), ('drop', ('a', 'b'))]
+
+
+def test_plan():
+    domain = planner.parseDomain(DOMAIN)
+    for number in (10, 20, 30):
+        task = planner.ground(domain, planner.parseProblem(randomProblem(number, number)))
+        steps = planner.plan(task)
+        assert steps is not None
+        assert task.validate(steps)
+
+
+def test_unsolvable():
+    problem = planner.parseProblem(PROBLEM)
+    # the table is never on a block
+    problem.goal.append(('on', 'table', 'a'))
+    task = planner.ground(planner.parseDomain(DOMAIN), problem)
+    assert planner.plan(task) is None
+
+
+def test_plannerMemo():
+    problem = planner.parseProblem(randomProblem(20, 1))
+    memo = planner.Planner(DOMAIN)
+    steps = memo.plan(problem.objects, problem.init, problem.goal)
+    assert memo.plan(problem.objects, reversed(problem.init), problem.goal) == steps
+    assert (memo.hits, memo.misses) == (1, 1)
+
+    # states passed through by a plan are memoised too
+    key, task = memo.task(problem.objects, problem.init, problem.goal)
+    state = task.init
+    for action in steps[:5]:
+        state = action.apply(state)
+    assert memo.plan(problem.objects, task.atoms(state), problem.goal) == steps[5:]
+    assert memo.hits == 2
+
+
+def test_repair():
+    problem = planner.parseProblem(randomProblem(20, 2))
+    task = planner.ground(planner.parseDomain(DOMAIN), problem)
+    steps = planner.plan(task)
+
+    # a picked up block falls onto the table
+    index = next(i for i, action in enumerate(steps) if action.name == 'pickup' and i > 0)
+    state = task.init
+    for action in steps[:index + 1]:
+        state = action.apply(state)
+    state |= task.state([('on', steps[index].args[0], 'table')])
+    repaired = planner.repair(task, steps[index + 1:], state)
+    assert repaired == steps[index + 1:]
+
+    # blocks are knocked over, so the plan no longer holds
+    state = task.init
+    for block in problem.objects:
+        state |= task.state([('on', block, 'table'), ('clear', block)])
+    repaired = planner.repair(task, steps, state)
+    assert task.validate(repaired, state)
+
+
+def test_repairBridge():
+    problem = planner.parseProblem(randomProblem(20, 3))
+    task = planner.ground(planner.parseDomain(DOMAIN), problem)
+    steps = planner.plan(task)
+
+    # every block is knocked onto the table, so no suffix of the plan holds
+    state = task.state([atom for block in problem.objects for atom in (('on', block, 'table'), ('clear', block))])
+    conditions = planner.regress(task, steps)
+    assert not any((condition is not None) and (state & condition[0] == condition[0]) and not (state & condition[1])
+                   for condition in conditions)
+
+    repaired = planner.repair(task, steps, state)
+    assert task.validate(repaired, state)
+
+
+def test_popcount():
+    assert planner.popcount(0) == 0
+    assert planner.popcount(0b1011) == 3
+    assert planner.popcount(1 << 200 | 1) == 2
+
+
+def test_plannerRepair():
+    problem = planner.parseProblem(randomProblem(20, 4))
+    memo = planner.Planner(DOMAIN)
+    steps = memo.plan(problem.objects, problem.init, problem.goal)
+    assert (memo.hits, memo.misses) == (0, 1)
+
+    # a state passed through by the plan is memoised
+    key, task = memo.task(problem.objects, problem.init, problem.goal)
+    state = steps[0].apply(task.init)
+    assert memo.repair(problem.objects, task.atoms(state), problem.goal, steps[1:]) == steps[1:]
+    assert (memo.hits, memo.misses) == (1, 1)
+
+    # a picked up block falls onto the table, and the rest of the plan is reused
+    index = next(i for i, action in enumerate(steps) if action.name == 'pickup' and i > 0)
+    state = task.init
+    for action in steps[:index + 1]:
+        state = action.apply(state)
+    state |= task.state([('on', steps[index].args[0], 'table')])
+    atoms = task.atoms(state)
+    repaired = memo.repair(problem.objects, atoms, problem.goal, steps[index + 1:])
+    assert task.validate(repaired, state)
+    assert (memo.hits, memo.misses) == (1, 2)
+
+    # the repaired plan is memoised too
+    assert memo.plan(problem.objects, atoms, problem.goal) == repaired
+    assert (memo.hits, memo.misses) == (2, 2)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import hal
+import recorder
+import replay
+import benchmark
+from recorder import LogWriter, LogReader
+from entity import Entity
+
+import os
+import json
+import numpy as np
+import pytest
+
+
+def frameParts(image):
+    """Get the payload parts of a frame, as recorder.frame appends them."""
+    channels = image.shape[2] if image.ndim > 2 else 1
+    return [recorder.FRAME_HEADER.pack(image.shape[0], image.shape[1], channels), image]
+
+
+def test_roundTrip(tmp_path):
+    path = str(tmp_path / 'search.log')
+    colour = np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3)
+    # 7 bytes, so the next record is aligned past padding
+    grey = np.arange(7, dtype=np.uint8).reshape(1, 7)
+
+    log = LogWriter(path)
+    log.append(recorder.META, json.dumps({'entity': 'RED'}).encode(), 1.0)
+    log.append(recorder.FRAME, frameParts(colour), 2.0)
+    log.append(recorder.FRAME, frameParts(grey), 3.0)
+    log.append(recorder.DISTANCES, np.array([0.25, 0.5]), 4.0)
+    log.append(recorder.COMMAND, json.dumps({'name': 'body.stop'}).encode(), 5.0)
+    log.close()
+    # appending to a closed log does nothing
+    log.append(recorder.COMMAND, b'{}')
+
+    reader = LogReader(path)
+    records = list(reader.records())
+    assert [(kind, timestamp) for kind, timestamp, payload in records] == \
+        [(recorder.META, 1.0), (recorder.FRAME, 2.0), (recorder.FRAME, 3.0), (recorder.DISTANCES, 4.0),
+         (recorder.COMMAND, 5.0)]
+    assert np.array_equal(records[1][2], colour)
+    assert records[2][2].shape == (1, 7)
+    assert np.array_equal(records[2][2], grey)
+    assert records[3][2].tolist() == [0.25, 0.5]
+    assert records[4][2] == {'name': 'body.stop'}
+    assert reader.meta() == {'entity': 'RED'}
+    assert reader.duration() == 4.0
+    assert [kind for kind, timestamp, payload in reader.records(recorder.FRAME)] == [recorder.FRAME] * 2
+    # the frames and distances are views of the map, which must be released first
+    del records
+    reader.close()
+
+
+def test_truncated(tmp_path):
+    path = str(tmp_path / 'cut.log')
+    log = LogWriter(path)
+    log.append(recorder.COMMAND, b'{"name": "head.view"}', 1.0)
+    log.append(recorder.DISTANCES, np.zeros(16), 2.0)
+    log.close()
+
+    # cut off in the middle of the last payload, as if recording was interrupted
+    os.truncate(path, os.path.getsize(path) - 8)
+    reader = LogReader(path)
+    assert [payload for kind, timestamp, payload in reader.records()] == [{'name': 'head.view'}]
+    reader.close()
+
+
+def test_notLog(tmp_path):
+    path = tmp_path / 'other.log'
+    path.write_bytes(b'not a log')
+    with pytest.raises(ValueError):
+        LogReader(str(path))
+
+
+def test_growth(tmp_path):
+    path = str(tmp_path / 'grown.log')
+    log = LogWriter(path, chunkSize=64)
+    payloads = [bytes([i]) * (10 * i + 1) for i in range(10)]
+    for i, payload in enumerate(payloads):
+        log.append(recorder.COMMAND, payload, float(i))
+    # the file grew by several chunks, and by more than a chunk for a large record
+    assert log._capacity > 4 * 64
+    log.append(recorder.DISTANCES, np.ones(100), 10.0)
+    assert log._capacity >= log._offset
+    log.close()
+
+    reader = LogReader(path)
+    kinds = [kind for kind, offset, length, timestamp in reader.index]
+    assert kinds == [recorder.COMMAND] * 10 + [recorder.DISTANCES]
+    assert [bytes(reader._map[offset:offset + length]) for kind, offset, length, timestamp in reader.index[:10]] == \
+        payloads
+    assert list(reader.records(recorder.DISTANCES))[0][2].tolist() == [1.0] * 100
+    reader.close()
+
+
+def test_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(hal, '_backend', None)
+    monkeypatch.setattr(hal, '_servoDriver', None)
+    path = str(tmp_path / 'search.log')
+
+    done = benchmark.run(Entity.RED, 0.3, 0, record=path)[0]
+    assert done
+    assert not recorder.recording()
+    previous = hal.backend()
+
+    summary = replay.replay(path)
+    assert summary['diverged'] is None
+    assert summary['results'] == {phase: True for phase in benchmark.PHASES}
+    assert summary['frames'] > 0
+    # the backend chosen before the replay is chosen again
+    assert hal.backend() is previous
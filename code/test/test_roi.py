@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import head
+from head import RoiFinder
+from entity import Entity
+from sim import Scene
+
+import numpy as np
+
+
+# Size of the images in pixels.
+WIDTH = 320
+HEIGHT = 240
+
+
+def blockImage(*boxes):
+    """Draw red blocks, each (x, y, width, height), on the floor."""
+    image = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    image[:] = Scene.FLOOR_BGR
+    for x, y, w, h in boxes:
+        image[y:y + h, x:x + w] = Scene.BLOCK_BGR[Entity.RED]
+    return image
+
+
+def spiedFinder(monkeypatch):
+    """Get a finder recording the shapes of the images it searches."""
+    finder = RoiFinder()
+    searched = []
+    search = finder._search
+
+    def spy(image, colour):
+        searched.append(image.shape[:2])
+        return search(image, colour)
+
+    monkeypatch.setattr(finder, '_search', spy)
+    return finder, searched
+
+
+def test_followBlob(monkeypatch):
+    finder, searched = spiedFinder(monkeypatch)
+    assert finder.find(blockImage((100, 100, 20, 20)), Entity.RED) == {'area': 400, 'x': 110, 'y': 110}
+    assert finder.window == (80, 80, 140, 140)
+
+    # only the window is searched, and it moves with the block
+    assert finder.find(blockImage((104, 98, 20, 20)), Entity.RED) == {'area': 400, 'x': 114, 'y': 108}
+    assert searched == [(HEIGHT, WIDTH), (60, 60)]
+    assert finder.window == (84, 78, 144, 138)
+
+
+def test_blobLeavesWindow(monkeypatch):
+    finder, searched = spiedFinder(monkeypatch)
+    finder.find(blockImage((100, 100, 20, 20)), Entity.RED)
+
+    # the blob continues past the window, so the whole image is searched for all of it
+    obj = finder.find(blockImage((90, 90, 100, 40)), Entity.RED)
+    assert obj == {'area': 4000, 'x': 140, 'y': 110}
+    assert searched == [(HEIGHT, WIDTH), (60, 60), (HEIGHT, WIDTH)]
+
+
+def test_lost():
+    finder = RoiFinder()
+    finder.find(blockImage((100, 100, 20, 20)), Entity.RED)
+    assert finder.find(blockImage(), Entity.RED) is None
+    assert finder.window is None
+
+
+def test_largestBlob():
+    mask = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+    assert head.largestBlob(mask) is None
+
+    mask[10:20, 10:20] = 255
+    mask[50:80, 100:110] = 255
+    assert head.largestBlob(mask) == (100, 50, 10, 30)
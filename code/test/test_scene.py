@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import scene
+from entity import Entity
+
+import numpy as np
+
+
+# Size of the label images in pixels.
+WIDTH = 160
+HEIGHT = 120
+
+
+def labelImage(*blocks):
+    """Draw blocks, each (entity, x, y, width, height), into a label image."""
+    labels = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+    for entity, x, y, w, h in blocks:
+        labels[y:y + h, x:x + w] = entity.value
+    return labels
+
+
+def infer(labels):
+    """Infer the stacks, their names and the facts of a label image."""
+    stacks = scene.groupStacks(scene.detectBlocks(labels))
+    names = scene.blockNames(stacks)
+    return stacks, names, scene.stackFacts(names)
+
+
+def test_twoStacks():
+    red = (Entity.RED, 10, 80, 20, 20)
+    green = (Entity.GREEN, 12, 60, 20, 20)
+    blue = (Entity.BLUE, 80, 80, 20, 20)
+    # a speck is not a block
+    speck = (Entity.BLUE, 120, 10, 5, 5)
+    stacks, names, (objects, atoms) = infer(labelImage(red, green, blue, speck))
+
+    assert stacks == [[red, green], [blue]]
+    assert names == [['red', 'green'], ['blue']]
+    assert objects == {'red': 'block', 'green': 'block', 'blue': 'block'}
+    assert sorted(atoms) == sorted([('on', 'red', 'table'), ('on', 'green', 'red'), ('clear', 'green'),
+                                    ('on', 'blue', 'table'), ('clear', 'blue')])
+
+
+def test_splitTallBlob():
+    stacks, names, (objects, atoms) = infer(labelImage((Entity.RED, 40, 40, 20, 60)))
+
+    # three red blocks on top of each other are one blob
+    assert stacks == [[(Entity.RED, 40, 80, 20, 20), (Entity.RED, 40, 60, 20, 20), (Entity.RED, 40, 40, 20, 20)]]
+    assert names == [['red', 'red2', 'red3']]
+    assert sorted(atoms) == sorted([('on', 'red', 'table'), ('on', 'red2', 'red'), ('on', 'red3', 'red2'),
+                                    ('clear', 'red3')])
+
+
+def test_nonOverlapping():
+    red = (Entity.RED, 10, 80, 20, 20)
+    # touches the top of the red block, but barely overlaps it
+    green = (Entity.GREEN, 28, 60, 20, 20)
+    stacks, names, (objects, atoms) = infer(labelImage(red, green))
+
+    assert stacks == [[red], [green]]
+    assert ('on', 'green', 'table') in atoms
+    assert ('clear', 'red') in atoms
+
+
+def test_minArea():
+    labels = labelImage((Entity.GREEN, 10, 10, 7, 7))
+    # the minimum area scales with the pixels of a pyramid level, not rounded down
+    assert scene.detectBlocks(labels, minArea=scene.STD_MIN_AREA / 4 ** 2) == [(Entity.GREEN, 10, 10, 7, 7)]
+    assert scene.detectBlocks(labels, minArea=scene.STD_MIN_AREA / 4 ** 3) == [(Entity.GREEN, 10, 10, 7, 7)]
+    assert scene.detectBlocks(labelImage((Entity.GREEN, 10, 10, 1, 3)), minArea=scene.STD_MIN_AREA / 4 ** 3) == []
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import telemetry
+
+import io
+import json
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def freshTelemetry():
+    telemetry.clear()
+    yield
+    telemetry.setLevel(telemetry.WARNING)
+    telemetry.setBufferSize(telemetry.STD_BUFFER_SIZE)
+    telemetry.setEcho(None)
+    telemetry.clear()
+
+
+def test_levels():
+    telemetry.setLevel(telemetry.INFO)
+    telemetry.debug('search.frame', x=1)
+    telemetry.info('search.found', x=2)
+    telemetry.warning('search.lost')
+    telemetry.failure('search.failed', error='timeout')
+
+    assert [record[2] for record in telemetry.events()] == ['search.found', 'search.lost', 'search.failed']
+    assert [record[1] for record in telemetry.events()] == [telemetry.INFO, telemetry.WARNING, telemetry.ERROR]
+    assert telemetry.events('search.found')[0][3] == {'x': 2}
+    assert not telemetry.enabled(telemetry.DEBUG)
+
+    telemetry.setLevel(telemetry.OFF)
+    telemetry.failure('search.failed')
+    assert len(telemetry.events()) == 3
+
+    with pytest.raises(ValueError):
+        telemetry.setLevel(telemetry.OFF + 1)
+
+
+def test_overflow():
+    telemetry.setLevel(telemetry.DEBUG)
+    telemetry.setBufferSize(3)
+    for i in range(5):
+        telemetry.debug('tick', i=i)
+    assert [record[3]['i'] for record in telemetry.events()] == [2, 3, 4]
+
+    # shrinking keeps the latest events
+    telemetry.setBufferSize(2)
+    assert [record[3]['i'] for record in telemetry.events()] == [3, 4]
+
+
+def test_echo():
+    stream = io.StringIO()
+    telemetry.setEcho(stream)
+    telemetry.warning('arm.stuck', joint='elbow', angle=12.5)
+
+    line = json.loads(stream.getvalue())
+    assert line['level'] == 'WARNING'
+    assert line['event'] == 'arm.stuck'
+    assert line['joint'] == 'elbow'
+    assert line['angle'] == 12.5
+    assert line['time'] == round(telemetry.events()[0][0], 6)
+
+    dumped = io.StringIO()
+    telemetry.dump(dumped)
+    assert dumped.getvalue() == stream.getvalue()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import tracker
+
+import pytest
+
+
+FRAME_TIME = 1 / 32
+
+
+def test_constantVelocity():
+    target = tracker.TargetTracker(10)
+    for i in range(20):
+        target.update(i * FRAME_TIME, {'area': 400, 'x': 100 + 64 * i * FRAME_TIME, 'y': 50})
+
+    # moving at 64 pixels per second
+    estimate = target.predict(20 * FRAME_TIME)
+    assert abs(estimate['x'] - (100 + 64 * 20 * FRAME_TIME)) <= 2
+    assert abs(estimate['y'] - 50) <= 1
+
+
+def test_coast():
+    target = tracker.TargetTracker(10, maxCoast=0.2)
+    target.update(0, {'area': 400, 'x': 100, 'y': 50})
+    assert target.update(0.1, None) == {'area': 400, 'x': 100, 'y': 50}
+    assert target.update(0.3, None) is None
+    assert not target.tracking
+
+    # picked up again at once
+    assert target.update(0.4, {'area': 300, 'x': 20, 'y': 30}) == {'area': 300, 'x': 20, 'y': 30}
+
+
+def test_outlier():
+    target = tracker.TargetTracker(10)
+    for i in range(5):
+        target.update(i * FRAME_TIME, {'area': 400, 'x': 100, 'y': 50})
+    estimate = target.update(5 * FRAME_TIME, {'area': 5000, 'x': 300, 'y': 200})
+    assert estimate == {'area': 400, 'x': 100, 'y': 50}
+
+
+def test_control():
+    target = tracker.TargetTracker(10, maxCoast=2)
+    target.update(0, {'area': 400, 'x': 100, 'y': 50})
+
+    # turning right at 20 degrees per second for half a second, and tilting up 2 degrees
+    target.turn(-20, 0.5, 0)
+    target.tilt(-2)
+    estimate = target.predict(1)
+    assert estimate['x'] == 100 - 10 * 20 * 0.5
+    assert estimate['y'] == 50 - 10 * 2
+
+
+def test_invalidParameters():
+    with pytest.raises(ValueError):
+        tracker.TargetTracker(0)
+    with pytest.raises(ValueError):
+        tracker.TargetTracker(10, maxCoast=-1)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+from trajectory import Trajectory
+
+import numpy as np
+import pytest
+
+
+# Seconds between the samples of a trajectory.
+STEP = 0.0005
+
+
+def derivatives(path):
+    """Get the joint angles, velocities and accelerations sampled along a trajectory."""
+    times = np.arange(0, path.duration + STEP, STEP)
+    angles = np.array([path.sample(t) for t in times])
+    vel = np.diff(angles, axis=0) / STEP
+    acc = np.diff(vel, axis=0) / STEP
+    return angles, vel, acc
+
+
+def test_trapezoid():
+    path = Trajectory(('shoulder', 'elbow'), (0, 10), (90, 40), 450, 3000)
+    angles, vel, acc = derivatives(path)
+
+    # cruises at the velocity limit of the joint moving furthest
+    assert path.accTime < path.duration / 2
+    assert path.duration == pytest.approx(90 / 450 + 450 / 3000)
+    assert np.abs(vel[:, 0]).max() == pytest.approx(450, rel=1e-3)
+    assert np.abs(vel[:, 0]).max() <= 450 * (1 + 1e-6)
+    assert np.abs(acc).max() <= 3000 * 1.01
+    assert angles[-1] == pytest.approx([90, 40])
+
+
+def test_triangle():
+    path = Trajectory(('wrist',), (100,), (90,), 450, 3000)
+    angles, vel, acc = derivatives(path)
+
+    # decelerates as soon as it stops accelerating, below the velocity limit
+    assert path.accTime == pytest.approx(path.duration / 2)
+    assert path.duration == pytest.approx(2 * np.sqrt(10 / 3000))
+    assert np.abs(vel).max() < 450
+    assert np.abs(acc).max() <= 3000 * 1.01
+    assert angles[-1] == pytest.approx([90])
+
+
+def test_synchronised():
+    path = Trajectory(('shoulder', 'elbow', 'grabber'), (0, 0, 50), (90, 30, 50), (450, 100, 450), 3000)
+
+    # the elbow limits the velocity and the shoulder the acceleration, and every
+    # joint moves in proportion
+    assert path.duration == pytest.approx(30 / 100 + (100 / 30) / (3000 / 90))
+    for t in np.linspace(0, path.duration, 20):
+        shoulder, elbow, grabber = path.sample(t)
+        assert shoulder == pytest.approx(3 * elbow)
+        assert grabber == 50
+
+    times, angles = path.setpoints(50)
+    assert times[-1] == path.duration
+    assert angles[-1] == pytest.approx([90, 30, 50])
+
+
+def test_stationary():
+    path = Trajectory(('wrist',), (45,), (45,), 450, 3000)
+    assert path.duration == 0
+    assert path.sample(1) == pytest.approx([45])
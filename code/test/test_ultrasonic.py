@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import hal
+from ultrasonic import Ultrasonic
+
+import math
+import time
+import pytest
+
+
+def test_distance(scene):
+    sensor = Ultrasonic(scene.trigPin, scene.echoPin)
+    sensor.setup()
+    try:
+        dist = sensor.filteredDist(timeout=2)
+    finally:
+        sensor.cleanup()
+
+    assert dist == pytest.approx(scene._range() + Ultrasonic.ERR_CORR, abs=0.01)
+
+
+def test_missed(scene):
+    scene.block = (10, 0)
+    sensor = Ultrasonic(scene.trigPin, scene.echoPin)
+    sensor.setup()
+    try:
+        assert sensor.distance(timeout=0.2) is None
+    finally:
+        sensor.cleanup()
+
+    assert sensor.missed > 0
+
+
+def test_invalidPulses(scene, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    sensor = Ultrasonic(scene.trigPin, scene.echoPin)
+
+    def edge(timestamp, level):
+        now[0] = timestamp
+        scene._echo = (timestamp, math.inf) if level else None
+        sensor._edge(scene.echoPin)
+
+    sensor._newPing()
+    edge(1.0, 1)
+    edge(1.005, 0)
+    assert sensor._echoPulse(0) == (1.0, 1.005)
+
+    # longer than an echo from the maximum range
+    sensor._newPing()
+    edge(2.0, 1)
+    edge(2.03, 0)
+    assert sensor._echoPulse(0) is None
+
+    # a falling edge before the pulse is skipped
+    sensor._newPing()
+    edge(3.0, 0)
+    assert sensor._echoPulse(0) is None
+    edge(3.001, 1)
+    edge(3.004, 0)
+    assert sensor._echoPulse(0) == (3.001, 3.004)
+
+    # edges timestamped out of order
+    sensor._newPing()
+    edge(4.0, 1)
+    edge(3.99, 0)
+    assert sensor._echoPulse(0) is None
+
+    # an edge of the last ping, handled after the next ping started
+    gpio = hal.backend().gpio()
+    read = gpio.input
+    def lateInput(channel):
+        sensor._newPing()
+        return read(channel)
+    monkeypatch.setattr(gpio, 'input', lateInput)
+    edge(5.0, 1)
+    assert sensor._edges == []
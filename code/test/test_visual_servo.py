@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import visual_servo
+
+import pytest
+
+
+def test_proportional():
+    pid = visual_servo.Pid((2, 0, 0), 1)
+    assert pid.update(0.25, 0) == 0.5
+    assert pid.update(-0.25, 1) == -0.5
+
+
+def test_saturation():
+    pid = visual_servo.Pid((2, 1, 0), 1)
+    assert pid.update(2, 0) == 1
+    for i in range(1, 10):
+        assert pid.update(2, i) == 1
+
+    # the integral does not wind up while saturated
+    assert pid.integral == 0
+    assert pid.update(0.1, 10) == pytest.approx(0.2 + 0.1)
+
+
+def test_derivative():
+    pid = visual_servo.Pid((0, 0, 0.5), 10)
+    pid.update(0, 0)
+    assert pid.update(1, 0.5) == pytest.approx(1)
+
+
+def test_presets():
+    for gains in visual_servo.GAIN_PRESETS.values():
+        visual_servo.Pid(gains['turn'], gains['turnLimit'])
+        visual_servo.Pid(gains['tilt'], gains['tiltLimit'])
+    with pytest.raises(ValueError):
+        visual_servo.Pid((1, -1, 0), 1)
+    with pytest.raises(ValueError):
+        visual_servo.Pid((1, 0, 0), 0)
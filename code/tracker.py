@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+import error
+
+import numpy as np
+
+
+# Object properties tracked: pixel area, center horizontal pixel, center vertical pixel.
+OBJ_PROPS = ['area', 'x', 'y']
+
+# Number of tracked properties, whose velocities are tracked too.
+NUM_PROPS = len(OBJ_PROPS)
+
+# Standard number of seconds the target is predicted without detections before it is lost.
+STD_MAX_COAST = 0.5
+
+# Standard standard deviation of the acceleration of the position in pixels per second squared.
+STD_POS_ACCEL = 400
+
+# Standard standard deviation of the acceleration of the area relative to the area per second squared.
+STD_AREA_ACCEL = 2
+
+# Standard standard deviation of detected positions in pixels.
+STD_POS_NOISE = 2
+
+# Standard standard deviation of detected areas relative to the area.
+STD_AREA_NOISE = 0.1
+
+# Squared Mahalanobis distance of detections which are rejected as outliers (99% of 3 degrees of freedom).
+GATE = 11.34
+
+
+class TargetTracker:
+    """
+    A constant-velocity Kalman filter of the image area and position of a
+    target. The turns of the body and the tilts of the head which are
+    commanded are control inputs, which shift the predicted position, so the
+    target is predicted between frames and coasted through missed detections.
+    The head angle is not part of the state, only its changes are inputs, so
+    positions are in the image of the current view and every tilt must be
+    passed to the tracker.
+    """
+
+
+    def __init__(self, pixelsPerDegree, maxCoast=STD_MAX_COAST, posAccel=STD_POS_ACCEL,
+                 areaAccel=STD_AREA_ACCEL, posNoise=STD_POS_NOISE, areaNoise=STD_AREA_NOISE):
+        """
+        Initialise the tracker without a target.
+
+        :param pixelsPerDegree: pixels the image shifts by when the body turns
+                                or the head tilts by a degree
+        :param maxCoast: number of seconds the target is predicted without
+                         detections before it is lost
+        :param posAccel: standard deviation of the acceleration of the
+                         position in pixels per second squared
+        :param areaAccel: standard deviation of the acceleration of the area
+                          relative to the area per second squared
+        :param posNoise: standard deviation of detected positions in pixels
+        :param areaNoise: standard deviation of detected areas relative to the
+                          area
+        :raise ValueError: if a parameter is not positive
+        """
+        for param in (pixelsPerDegree, maxCoast, posAccel, areaAccel, posNoise, areaNoise):
+            error.checkPositive(param)
+
+        self.pixelsPerDegree = pixelsPerDegree
+        self.maxCoast = maxCoast
+        self.posAccel = posAccel
+        self.areaAccel = areaAccel
+        self.posNoise = posNoise
+        self.areaNoise = areaNoise
+        self.reset()
+
+
+    def reset(self):
+        """
+        Forget the target and the commands.
+        """
+        # state of area, x and y followed by their velocities, and its covariance
+        self.state = None
+        self.covariance = None
+        self.timestamp = None
+        self.lastSeen = None
+        self._turnRate = 0
+        self._turnUntil = None
+        self._tilt = 0
+
+
+    @property
+    def tracking(self):
+        """
+        Check if a target is tracked.
+
+        :return: True if the target was detected within the coasting time
+        """
+        return self.state is not None
+
+
+    def turn(self, rate, until, timestamp):
+        """
+        Set the body turn commanded from a time on.
+
+        :param rate: turning rate in degrees per second, anticlockwise positive
+        :param until: monotonic time the turn ends
+        :param timestamp: monotonic time the turn starts
+        """
+        self._advance(timestamp)
+        self._turnRate = rate
+        self._turnUntil = until
+
+
+    def tilt(self, degrees):
+        """
+        Add a head tilt commanded, applied at the next prediction as the servo
+        turns quickly.
+
+        :param degrees: change of the view angle in degrees
+        """
+        self._tilt += degrees
+
+
+    def _advance(self, timestamp):
+        """
+        Predict the target at a time, applying the commands since the last
+        prediction.
+
+        :param timestamp: monotonic time, not before the last prediction
+        """
+        if self.state is None:
+            self._tilt = 0
+            return
+
+        dt = max(0.0, timestamp - self.timestamp)
+        turned = 0.0
+        if self._turnUntil is not None:
+            turned = self._turnRate * max(0.0, min(timestamp, self._turnUntil) - self.timestamp)
+
+        transition = np.eye(2 * NUM_PROPS)
+        transition[:NUM_PROPS, NUM_PROPS:] = np.eye(NUM_PROPS) * dt
+        self.state = transition @ self.state
+        # turning anticlockwise moves the target to larger x, tilting down to larger y
+        self.state[1] += turned * self.pixelsPerDegree
+        self.state[2] += self._tilt * self.pixelsPerDegree
+        self._tilt = 0
+
+        # white noise acceleration
+        accel = np.array([self.areaAccel * max(self.state[0], 1), self.posAccel, self.posAccel]) ** 2
+        noise = np.zeros((2 * NUM_PROPS, 2 * NUM_PROPS))
+        idx = np.arange(NUM_PROPS)
+        noise[idx, idx] = accel * dt ** 4 / 4
+        noise[idx, idx + NUM_PROPS] = noise[idx + NUM_PROPS, idx] = accel * dt ** 3 / 2
+        noise[idx + NUM_PROPS, idx + NUM_PROPS] = accel * dt ** 2
+        self.covariance = transition @ self.covariance @ transition.T + noise
+        self.timestamp = max(self.timestamp, timestamp)
+
+
+    def predict(self, timestamp):
+        """
+        Predict the target at a time.
+
+        :param timestamp: monotonic time
+        :return: dictionary of the predicted object properties, or None if no
+                 target is tracked
+        """
+        self._advance(timestamp)
+        if (self.state is not None) and (timestamp - self.lastSeen > self.maxCoast):
+            self.state = None
+        return self.estimate()
+
+
+    def update(self, timestamp, obj):
+        """
+        Correct the prediction with the detection of a frame. Detections far
+        from the prediction are rejected as outliers, and missing detections
+        coast the target.
+
+        :param timestamp: monotonic capture time of the frame
+        :param obj: dictionary of the detected object properties, or None
+        :return: dictionary of the estimated object properties, or None if no
+                 target is tracked
+        """
+        self.predict(timestamp)
+        if not obj:
+            return self.estimate()
+
+        measured = np.array([obj[prop] for prop in OBJ_PROPS], dtype=np.float64)
+        if self.state is None:
+            self._start(timestamp, measured)
+            return self.estimate()
+
+        measurementNoise = np.diag(np.array([self.areaNoise * measured[0], self.posNoise, self.posNoise]) ** 2)
+        residual = measured - self.state[:NUM_PROPS]
+        innovation = self.covariance[:NUM_PROPS, :NUM_PROPS] + measurementNoise
+        if residual @ np.linalg.solve(innovation, residual) > GATE:
+            # a lost target is picked up again wherever it appears
+            if timestamp - self.lastSeen > self.maxCoast / 2:
+                self._start(timestamp, measured)
+            return self.estimate()
+
+        gain = np.linalg.solve(innovation, self.covariance[:NUM_PROPS]).T
+        self.state = self.state + gain @ residual
+        self.covariance = self.covariance - gain @ self.covariance[:NUM_PROPS]
+        self.lastSeen = timestamp
+        return self.estimate()
+
+
+    def _start(self, timestamp, measured):
+        """
+        Start tracking a target at rest at a detection.
+
+        :param timestamp: monotonic capture time of the detection
+        :param measured: array of the detected area, x and y
+        """
+        self.state = np.concatenate((measured, np.zeros(NUM_PROPS)))
+        variances = np.array([self.areaNoise * measured[0], self.posNoise, self.posNoise]) ** 2
+        velocities = np.array([self.areaAccel * measured[0], self.posAccel, self.posAccel]) ** 2 * self.maxCoast ** 2
+        self.covariance = np.diag(np.concatenate((variances, velocities)))
+        self.timestamp = timestamp
+        self.lastSeen = timestamp
+
+
+    def estimate(self):
+        """
+        Get the estimated object properties.
+
+        :return: dictionary of the object properties rounded to pixels, or None
+                 if no target is tracked
+        """
+        if self.state is None:
+            return None
+        return {prop: int(round(val)) for prop, val in zip(OBJ_PROPS, self.state[:NUM_PROPS])}
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import error
+import lazy
+
+import math
+import time
+np = lazy.module('numpy')
+
+
+# Standard number of setpoints per second, the update rate of hobby servos.
+STD_RATE = 50
+
+
+class Trajectory:
+    """
+    A time parameterised trajectory of several joints from a start to a goal
+    position. All joints follow the same trapezoidal velocity profile scaled
+    to their angle difference, so they arrive together without overshooting
+    and no joint exceeds its velocity or acceleration limit.
+    """
+
+
+    def __init__(self, joints, start, goal, maxVel, maxAcc):
+        """
+        Initialise the trajectory with the slowest profile needed by any joint.
+
+        :param joints: names of the joints
+        :param start: start angle of each joint in degrees
+        :param goal: goal angle of each joint in degrees
+        :param maxVel: maximum velocity of each joint (or of all joints) in
+                       degrees per second
+        :param maxAcc: maximum acceleration of each joint (or of all joints) in
+                       degrees per second squared
+        :raise ValueError: if the joints, start and goal lengths differ, or a
+                           limit is not positive
+        """
+        self.joints = tuple(joints)
+        self.start = np.asarray(start, dtype=float)
+        self.goal = np.asarray(goal, dtype=float)
+        error.checkInRange(len(self.start), len(self.joints), len(self.joints))
+        error.checkInRange(len(self.goal), len(self.joints), len(self.joints))
+
+        maxVel = np.broadcast_to(np.asarray(maxVel, dtype=float), self.start.shape)
+        maxAcc = np.broadcast_to(np.asarray(maxAcc, dtype=float), self.start.shape)
+        for limit in np.concatenate((maxVel, maxAcc)):
+            error.checkPositive(limit)
+
+        self.delta = self.goal - self.start
+        dist = np.abs(self.delta)
+        moving = dist > 0
+
+        if not moving.any():
+            self.vel = self.acc = math.inf
+            self.accTime = self.duration = 0.0
+            return
+
+        # Limits of the normalised profile going from 0 to 1.
+        self.vel = float(np.min(maxVel[moving] / dist[moving]))
+        self.acc = float(np.min(maxAcc[moving] / dist[moving]))
+
+        if self.vel ** 2 / self.acc <= 1:
+            # accelerate, cruise and decelerate
+            self.accTime = self.vel / self.acc
+            self.duration = 1 / self.vel + self.accTime
+        else:
+            # accelerate and decelerate without reaching the maximum velocity
+            self.accTime = math.sqrt(1 / self.acc)
+            self.vel = self.acc * self.accTime
+            self.duration = 2 * self.accTime
+
+
+    def progress(self, t):
+        """
+        Get the normalised position of the profile at given times.
+
+        :param t: seconds since the start of the trajectory (number or array)
+        :return: progress from 0 at the start to 1 at the goal
+        """
+        t = np.clip(np.asarray(t, dtype=float), 0, self.duration)
+        if self.duration == 0:
+            return np.ones_like(t)
+
+        decTime = self.duration - self.accTime
+        accel = 0.5 * self.acc * t ** 2
+        cruise = 0.5 * self.acc * self.accTime ** 2 + self.vel * (t - self.accTime)
+        decel = 1 - 0.5 * self.acc * (self.duration - t) ** 2
+        return np.clip(np.where(t < self.accTime, accel, np.where(t < decTime, cruise, decel)), 0, 1)
+
+
+    def sample(self, t):
+        """
+        Get the joint angles at a given time.
+
+        :param t: seconds since the start of the trajectory
+        :return: array of the angle of each joint in degrees
+        """
+        return self.start + self.delta * self.progress(t)
+
+
+    def setpoints(self, rate=STD_RATE):
+        """
+        Get the setpoints of the trajectory at a fixed rate, ending at the goal.
+
+        :param rate: setpoints per second
+        :return: array of setpoint times in seconds and array of the joint
+                 angles at each setpoint
+        :raise ValueError: if rate is not positive
+        """
+        error.checkPositive(rate)
+
+        times = np.arange(1, math.ceil(self.duration * rate) + 1) / rate
+        times[-1:] = self.duration
+        return times, self.start + np.outer(self.progress(times), self.delta)
+
+
+def stream(trajectories, write, rate=STD_RATE):
+    """
+    Stream the setpoints of consecutive trajectories on the monotonic clock.
+    When the writer falls behind, late setpoints are skipped instead of
+    delaying the trajectory.
+
+    :param trajectories: list of trajectories executed one after another
+    :param write: function writing a dictionary of joint name to angle
+    :param rate: setpoints per second
+    :raise ValueError: if rate is not positive
+    """
+    startTime = time.monotonic()
+
+    for trajectory in trajectories:
+        times, angles = trajectory.setpoints(rate)
+
+        i = 0
+        while i < len(times):
+            delay = startTime + times[i] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # skip to the latest setpoint that is due
+                late = np.searchsorted(times, time.monotonic() - startTime, side='right') - 1
+                i = max(i, min(late, len(times) - 1))
+
+            write(dict(zip(trajectory.joints, angles[i])))
+            i += 1
+
+        startTime += trajectory.duration
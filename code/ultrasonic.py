@@ -1,31 +1,54 @@
 # -*- coding: utf-8 -*-
 
 import error
+import telemetry
+import recorder
 from component import Component
+from hal import GPIO
 
 import time
-import RPi.GPIO as GPIO
+import threading
+import statistics
+import collections
 
 class Ultrasonic(Component):
-    """A class for controlling the ultrasonic sensor of the robot."""
+    """
+    A class for controlling the ultrasonic sensor of the robot. A background
+    thread pings the sensor periodically and times the echo pulse from its
+    edge interrupts, publishing a median filtered distance stream.
+    """
 
 
+    # Methods whose latencies are profiled.
+    PROFILED = ('distance', 'filteredDist', 'meanAdjDist')
+
     # Speed of sound in metres per second assuming standard conditions.
     SOUND_SPEED = 343
 
     # Duration that the ultrasonic sensor emits sound waves in seconds.
     EMIT_TIME = 0.000015
 
-    # Refactory period, so that sensor does not pick up old emissions
-    # when used repeatedly.
-    REF_TIME = 0.000005
-
     # Error correction for ultrasonic sensor in metres.
     ERR_CORR = 0.016
 
     # The max amount of seconds to wait for response in echoPin.
     REP_LIM = 0.05
 
+    # The max amount of seconds of an echo pulse (4 metres there and back).
+    MAX_ECHO_TIME = 0.025
+
+    # Seconds between pings, so that echoes of the last ping have died down.
+    SAMPLE_PERIOD = 0.06
+
+    # Number of latest distances the filtered distance is the median of.
+    FILTER_SIZE = 5
+
+    # Minimum number of distances for a filtered distance.
+    FILTER_MIN = 3
+
+    # Standard number of seconds to wait for distances.
+    STD_TIMEOUT = 1
+
 
     def __init__(self, trigPin, echoPin):
         error.checkGPIO(trigPin)
@@ -35,74 +58,226 @@ class Ultrasonic(Component):
         self.trigPin = trigPin
         self.echoPin = echoPin
 
+        self.missed = 0
+        self._samples = collections.deque(maxlen=self.FILTER_SIZE)
+        self._count = 0
+        self._newSample = threading.Condition()
+        self._echoed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        # sequence number of the current ping, and the (level, monotonic time)
+        # of its echo edges, guarded by the lock
+        self._lock = threading.Lock()
+        self._ping = 0
+        self._edges = []
+
 
     def setup(self):
         """
-        Setup the ultrasonic sensor for use.
+        Setup the ultrasonic sensor for use and start sampling.
         """
         GPIO.setwarnings(False)
         # Set to GPIO numbering
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self.trigPin, GPIO.OUT, initial=GPIO.LOW)
         GPIO.setup(self.echoPin, GPIO.IN)
+        GPIO.add_event_detect(self.echoPin, GPIO.BOTH, callback=self._edge)
+
+        self._samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
         self.status = True
 
 
     def cleanup(self):
         """
-        Cleanup the ultrasonic sensor.
+        Stop sampling and cleanup the ultrasonic sensor.
         """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            GPIO.remove_event_detect(self.echoPin)
         GPIO.cleanup([self.trigPin, self.echoPin])
         self.status = False
 
 
-    def distance(self):
+    def _edge(self, channel):
+        """
+        Timestamp an edge of the echo pulse with its level, unless a new ping
+        started since the edge.
+
+        :param channel: GPIO pin of the edge
+        """
+        timestamp = time.monotonic()
+        ping = self._ping
+        level = GPIO.input(channel)
+
+        with self._lock:
+            if ping != self._ping:
+                return
+            self._edges.append((level, timestamp))
+            if self._pulse() is not None:
+                self._echoed.set()
+
+
+    def _pulse(self):
         """
-        Get the distance from an object to the front of the robot.
+        Get the echo pulse of the current ping from its edges, skipping a
+        falling edge before the first rising one. Call with the lock held.
 
+        :return: monotonic times of the rising and falling edge of the pulse,
+                 or None if there is no complete pulse yet
+        """
+        rise = None
+        for level, timestamp in self._edges:
+            if level and (rise is None):
+                rise = timestamp
+            elif (not level) and (rise is not None):
+                return rise, timestamp
+        return None
+
+
+    def _newPing(self):
+        """
+        Start a new ping, discarding the edges of the last one.
+        """
+        with self._lock:
+            self._ping += 1
+            self._edges = []
+            self._echoed.clear()
+
+
+    def _echoPulse(self, timeout):
+        """
+        Wait for the echo pulse of the current ping. Pulses whose edges are
+        out of order or which are longer than MAX_ECHO_TIME are discarded.
+
+        :param timeout: maximum number of seconds to wait
+        :return: monotonic times of the rising and falling edge of the pulse,
+                 or None if there is no valid pulse in time
+        """
+        self._echoed.wait(timeout)
+        with self._lock:
+            pulse = self._pulse()
+
+        if (pulse is None) or not (0 < pulse[1] - pulse[0] <= self.MAX_ECHO_TIME):
+            return None
+        return pulse
+
+
+    def _sample(self):
+        """
+        Ping the sensor every sample period until stopped.
+        """
+        while not self._stop.is_set():
+            pingStart = time.monotonic()
+            self._newPing()
+
+            GPIO.output(self.trigPin, GPIO.HIGH)
+            time.sleep(self.EMIT_TIME)
+            GPIO.output(self.trigPin, GPIO.LOW)
+
+            pulse = self._echoPulse(self.REP_LIM + self.MAX_ECHO_TIME)
+            if pulse is not None:
+                rise, fall = pulse
+                self._publish(fall, (fall - rise) * self.SOUND_SPEED / 2)
+            else:
+                self.missed += 1
+                telemetry.debug('ultrasonic.missed')
+
+            self._stop.wait(pingStart + self.SAMPLE_PERIOD - time.monotonic())
+
+
+    def _publish(self, timestamp, dist):
+        """
+        Add a distance to the stream.
+
+        :param timestamp: monotonic time of the end of the echo
+        :param dist: distance in metres
+        """
+        with self._newSample:
+            self._samples.append((timestamp, dist))
+            self._count += 1
+            self._newSample.notify_all()
+
+
+    def _waitSamples(self, number, since, timeout):
+        """
+        Wait for distances measured after a given time.
+
+        :param number: number of distances to wait for
+        :param since: monotonic time the distances must be measured after
+        :param timeout: maximum number of seconds to wait
+        :return: list of at most FILTER_SIZE latest distances measured after
+                 since, which is shorter than number if timed out
+        """
+        with self._newSample:
+            fresh = lambda: [dist for (timestamp, dist) in self._samples if timestamp > since]
+            self._newSample.wait_for(lambda: len(fresh()) >= number, timeout)
+            samples = fresh()
+
+        recorder.distances(samples)
+        return samples
+
+
+    def distance(self, timeout=STD_TIMEOUT):
+        """
+        Get the next distance from an object to the front of the robot.
+
+        :param timeout: maximum number of seconds to wait for an echo
         :return: the recorded distance of an object in front of the ultrasonic
-                 sensor in metres
+                 sensor in metres, or None if there is no echo in time
         :raise ValueError: if the ultrasonic sensor is off
         """
         error.checkComponent(self, 'Ultrasonic sensor')
 
-        GPIO.output(self.trigPin, GPIO.LOW)
-        time.sleep(self.REF_TIME)
-        GPIO.output(self.trigPin, GPIO.HIGH)
-        time.sleep(self.EMIT_TIME)
-        GPIO.output(self.trigPin, GPIO.LOW)
-
-        noRep = False
-        repStart = time.time()
-        while not GPIO.input(self.echoPin):
-            if time.time() - repStart >= self.REP_LIM:
-                noRep = True
-                break
+        samples = self._waitSamples(1, time.monotonic(), timeout)
+        if samples:
+            return samples[-1]
+        return None
+
+
+    def filteredDist(self, since=None, timeout=STD_TIMEOUT):
+        """
+        Get the error-adjusted median of the latest distances of an object
+        to the front of the robot.
 
-        if noRep:
+        :param since: monotonic time the distances must be measured after,
+                      e.g. after the robot last moved, or None for any time
+        :param timeout: maximum number of seconds to wait for enough distances
+        :return: filtered distance of an object in metres, or None if there
+                 are not enough echoes in time
+        :raise ValueError: if the ultrasonic sensor is off
+        """
+        error.checkComponent(self, 'Ultrasonic sensor')
+
+        samples = self._waitSamples(self.FILTER_MIN, -1 if since is None else since, timeout)
+        if len(samples) < self.FILTER_MIN:
             return None
-        else:
-            startTime = time.time()
-            while GPIO.input(self.echoPin):
-                pass
-            endTime = time.time()
-            return (endTime - startTime) * self.SOUND_SPEED / 2
+        return statistics.median(samples) + self.ERR_CORR
 
 
-    def meanAdjDist(self, numOfChecks):
+    def meanAdjDist(self, numOfChecks, timeout=STD_TIMEOUT):
         """
         Get the mean error-adjusted distance of an object to the front
         of the robot.
 
         :param numOfChecks: number of times that the distance is recorded for the
                             mean
-        :return: mean error-adjusted distance of an object in metres
+        :param timeout: maximum number of seconds to wait for each distance
+        :return: mean error-adjusted distance of an object in metres, or None
+                 if there are no echoes in time
         :raise ValueError: if the ultrasonic sensor is off
         """
         data = []
         while len(data) < numOfChecks:
-            dist = self.distance()
-            if dist:
-                data.append(dist)
+            dist = self.distance(timeout)
+            if dist is None:
+                break
+            data.append(dist)
 
-        return sum(data) / numOfChecks + self.ERR_CORR
+        if not data:
+            return None
+        return sum(data) / len(data) + self.ERR_CORR
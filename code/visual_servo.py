@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import error
+
+
+# Gain presets of the visual servo. Errors are the pixel offsets of the object from the
+# image centre relative to half the image size. The body turn gains give seconds of turning
+# and its limit the longest turn, the head tilt gains give degrees and its limit the
+# largest tilt.
+GAIN_PRESETS = {
+    'gentle': {'turn': (0.08, 0, 0), 'turnLimit': 0.15,
+               'tilt': (8, 0, 0), 'tiltLimit': 6},
+    'standard': {'turn': (0.15, 0.05, 0.005), 'turnLimit': 0.2,
+                 'tilt': (14, 2, 0.2), 'tiltLimit': 10},
+    'fast': {'turn': (0.2, 0.1, 0.01), 'turnLimit': 0.3,
+             'tilt': (18, 4, 0.3), 'tiltLimit': 15},
+}
+
+
+class Pid:
+    """
+    A PID controller whose output saturates at a limit. The integral is held
+    while the output saturates, so it does not wind up.
+    """
+
+
+    def __init__(self, gains, limit):
+        """
+        Initialise the controller without history.
+
+        :param gains: proportional, integral and derivative gains
+        :param limit: largest magnitude of the output
+        :raise ValueError: if a gain is negative or the limit is not positive
+        """
+        for gain in gains:
+            error.checkInRange(gain, 0, float('inf'))
+        error.checkPositive(limit)
+
+        self.kp, self.ki, self.kd = gains
+        self.limit = limit
+        self.reset()
+
+
+    def reset(self):
+        """
+        Forget the integral and the last error.
+        """
+        self.integral = 0
+        self._last = None
+
+
+    def update(self, error, timestamp):
+        """
+        Get the output for an error.
+
+        :param error: error at the time
+        :param timestamp: monotonic time of the error
+        :return: output between -limit and limit
+        """
+        derivative = 0
+        integral = self.integral
+        if self._last is not None:
+            lastError, lastTime = self._last
+            dt = timestamp - lastTime
+            if dt > 0:
+                derivative = (error - lastError) / dt
+                integral += error * dt
+        self._last = (error, timestamp)
+
+        output = self.kp * error + self.ki * integral + self.kd * derivative
+        if abs(output) <= self.limit:
+            self.integral = integral
+        return max(-self.limit, min(self.limit, output))